@@ -0,0 +1,261 @@
+"""
+Precomputed exam-to-bank compatibility matrix.
+Every (exam, public question bank) pair that passes the matching rules of
+find_compatible_question_banks is stored in ExamBankCompatibility together
+with its calculate_match_score score and get_match_reasons reasons, so
+suggestions are an indexed top-k lookup instead of an OR query plus Python
+scoring. The matrix is computed a block of exams at a time with NumPy over
+integer-coded columns; without NumPy the scalar helpers run per pair.
+"""
+
+from typing import Iterable, List
+
+from django.db import transaction
+
+from exams.models import Exam
+from questions.models import ExamBankCompatibility, QuestionBank
+from questions.tagging import normalize_tag
+
+from .exam_utils import calculate_match_score, get_match_reasons
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+# Fields matched by exact equality, and by case-insensitive containment
+EQUALITY_FIELDS = ('exam_type', 'category', 'difficulty_level', 'target_audience', 'language')
+CONTAINMENT_FIELDS = ('subject', 'topic', 'state_specific')
+MATCH_FIELDS = EQUALITY_FIELDS + CONTAINMENT_FIELDS + ('tags',)
+
+EXAM_FIELDS = ('id',) + MATCH_FIELDS
+BANK_FIELDS = ('id', 'is_public') + MATCH_FIELDS
+
+# Weights of calculate_match_score in the order it adds them, so sums are identical
+SCORE_WEIGHTS = (
+    ('exam_type', 0.2),
+    ('category', 0.15),
+    ('subject', 0.15),
+    ('topic', 0.1),
+    ('tags', 0.2),
+    ('difficulty_level', 0.1),
+    ('target_audience', 0.05),
+    ('language', 0.05),
+)
+
+
+def _tags(instance):
+    return instance.tags if isinstance(instance.tags, list) else []
+
+
+def is_compatible(exam, question_bank):
+    """
+    Whether a bank matches an exam on any criterion the exam sets; an exam
+    without criteria matches every bank.
+    """
+    has_criteria = False
+    for field in EQUALITY_FIELDS:
+        value = getattr(exam, field)
+        if value:
+            has_criteria = True
+            if value == getattr(question_bank, field):
+                return True
+
+    for field in CONTAINMENT_FIELDS:
+        value = getattr(exam, field)
+        if value:
+            has_criteria = True
+            if value.lower() in (getattr(question_bank, field) or '').lower():
+                return True
+
+    if _tags(exam):
+        has_criteria = True
+        bank_tags = {normalize_tag(tag) for tag in _tags(question_bank)}
+        if any(normalize_tag(tag) in bank_tags for tag in _tags(exam)):
+            return True
+
+    return not has_criteria
+
+
+class CompatibilityMatrix:
+    """Compatible pairs and match scores of a block of exams against a set of banks"""
+
+    def __init__(self, exams: Iterable, banks: Iterable):
+        self.exams = list(exams)
+        self.banks = list(banks)
+
+    def pairs(self):
+        """Yield (exam, bank, score) for every compatible pair"""
+        if not self.exams or not self.banks:
+            return
+        if not NUMPY_AVAILABLE:
+            for exam in self.exams:
+                for bank in self.banks:
+                    if is_compatible(exam, bank):
+                        yield exam, bank, calculate_match_score(exam, bank)
+            return
+
+        compatible, scores = self._compute()
+        for exam_index, bank_index in np.argwhere(compatible).tolist():
+            yield self.exams[exam_index], self.banks[bank_index], float(scores[exam_index, bank_index])
+
+    @staticmethod
+    def _codes(values, vocabulary):
+        return np.fromiter(
+            (vocabulary.setdefault(value, len(vocabulary)) for value in values),
+            dtype=np.int32, count=len(values),
+        )
+
+    def _equality(self, field):
+        """(exam value set, bank value set, values equal) for an exactly matched field"""
+        vocabulary = {'': 0}
+        exam_codes = self._codes([getattr(exam, field) or '' for exam in self.exams], vocabulary)
+        bank_codes = self._codes([getattr(bank, field) or '' for bank in self.banks], vocabulary)
+        return exam_codes != 0, bank_codes != 0, exam_codes[:, None] == bank_codes[None, :]
+
+    def _containment(self, field):
+        """
+        (exam value set, bank value set, exam value inside bank value, bank
+        value inside exam value), lower-cased. Containment is decided once per
+        pair of distinct values and then broadcast.
+        """
+        exam_vocabulary, bank_vocabulary = {}, {}
+        exam_codes = self._codes([(getattr(exam, field) or '').lower() for exam in self.exams], exam_vocabulary)
+        bank_codes = self._codes([(getattr(bank, field) or '').lower() for bank in self.banks], bank_vocabulary)
+
+        shape = (len(exam_vocabulary), len(bank_vocabulary))
+        inside = np.array(
+            [exam_value in bank_value for exam_value in exam_vocabulary for bank_value in bank_vocabulary],
+            dtype=bool,
+        ).reshape(shape)
+        around = np.array(
+            [bank_value in exam_value for exam_value in exam_vocabulary for bank_value in bank_vocabulary],
+            dtype=bool,
+        ).reshape(shape)
+
+        index = np.ix_(exam_codes, bank_codes)
+        exam_set = np.array([bool(getattr(exam, field)) for exam in self.exams], dtype=bool)
+        bank_set = np.array([bool(getattr(bank, field)) for bank in self.banks], dtype=bool)
+        return exam_set, bank_set, inside[index], around[index]
+
+    def _common_tags(self, normalize):
+        """Number of distinct shared tags of every pair, after normalize"""
+        vocabulary = {}
+        exam_tags = [{vocabulary.setdefault(normalize(tag), len(vocabulary)) for tag in _tags(exam)} for exam in self.exams]
+        bank_tags = [{vocabulary.setdefault(normalize(tag), len(vocabulary)) for tag in _tags(bank)} for bank in self.banks]
+
+        exam_matrix = np.zeros((len(self.exams), len(vocabulary)), dtype=np.float32)
+        bank_matrix = np.zeros((len(self.banks), len(vocabulary)), dtype=np.float32)
+        for row, codes in enumerate(exam_tags):
+            exam_matrix[row, list(codes)] = 1
+        for row, codes in enumerate(bank_tags):
+            bank_matrix[row, list(codes)] = 1
+        return (exam_matrix @ bank_matrix.T).astype(np.float64)
+
+    def _compute(self):
+        shape = (len(self.exams), len(self.banks))
+        compatible = np.zeros(shape, dtype=bool)
+        has_criteria = np.zeros(len(self.exams), dtype=bool)
+        matched = {}
+
+        for field in EQUALITY_FIELDS:
+            exam_set, bank_set, equal = self._equality(field)
+            has_criteria |= exam_set
+            compatible |= exam_set[:, None] & equal
+            matched[field] = (exam_set[:, None] & bank_set[None, :], equal)
+
+        for field in CONTAINMENT_FIELDS:
+            exam_set, bank_set, inside, around = self._containment(field)
+            has_criteria |= exam_set
+            compatible |= exam_set[:, None] & inside
+            matched[field] = (exam_set[:, None] & bank_set[None, :], inside | around)
+
+        exam_tag_counts = np.array([len(_tags(exam)) for exam in self.exams], dtype=np.float64)
+        bank_tag_counts = np.array([len(_tags(bank)) for bank in self.banks], dtype=np.float64)
+        has_criteria |= exam_tag_counts > 0
+        compatible |= self._common_tags(normalize_tag) > 0
+        compatible |= ~has_criteria[:, None]
+
+        # Same terms, in the same order, as calculate_match_score
+        scores = np.zeros(shape, dtype=np.float64)
+        total = np.zeros(shape, dtype=np.float64)
+        for field, weight in SCORE_WEIGHTS:
+            if field == 'tags':
+                both = (exam_tag_counts[:, None] > 0) & (bank_tag_counts[None, :] > 0)
+                common = self._common_tags(str)
+                largest = np.maximum(np.maximum(exam_tag_counts[:, None], bank_tag_counts[None, :]), 1)
+                total += np.where(both, weight, 0.0)
+                scores += np.where(both & (common > 0), weight * (common / largest), 0.0)
+                continue
+            both, equal = matched[field]
+            total += np.where(both, weight, 0.0)
+            scores += np.where(both & equal, weight, 0.0)
+
+        scores = np.where(total > 0, scores / np.where(total > 0, total, 1.0), 0.0)
+        return compatible, scores
+
+
+def _blocks(queryset, size):
+    block = []
+    for instance in queryset.iterator(chunk_size=size):
+        block.append(instance)
+        if len(block) >= size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def _store(model, exams: List, banks: List) -> int:
+    rows = [
+        model(exam_id=exam.pk, question_bank_id=bank.pk, score=score, reasons=get_match_reasons(exam, bank))
+        for exam, bank, score in CompatibilityMatrix(exams, banks).pairs()
+    ]
+    model.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def rebuild_compatibility_matrix(exams=None, banks=None, model=ExamBankCompatibility, block_size: int = 500) -> int:
+    """
+    Recompute every pair from scratch and return the number stored.
+    exams and banks default to all exams and all public banks; the
+    migration passes its historical models instead.
+    """
+    exams = (exams if exams is not None else Exam.objects.all()).only(*EXAM_FIELDS).order_by('pk')
+    banks = list((banks if banks is not None else QuestionBank.objects.filter(is_public=True)).only(*BANK_FIELDS))
+
+    stored = 0
+    with transaction.atomic():
+        model.objects.all().delete()
+        if banks:
+            for block in _blocks(exams, max(1, block_size)):
+                stored += _store(model, block, banks)
+    return stored
+
+
+def refresh_exam_compatibility(exam) -> int:
+    """Recompute one exam's row of the matrix"""
+    if exam.get_deferred_fields() & set(MATCH_FIELDS):
+        exam = Exam.objects.only(*EXAM_FIELDS).get(pk=exam.pk)
+    banks = list(QuestionBank.objects.filter(is_public=True).only(*BANK_FIELDS))
+
+    with transaction.atomic():
+        ExamBankCompatibility.objects.filter(exam_id=exam.pk).delete()
+        return _store(ExamBankCompatibility, [exam], banks)
+
+
+def refresh_bank_compatibility(question_bank, block_size: int = 500) -> int:
+    """Recompute one bank's column of the matrix; private banks have none"""
+    if question_bank.get_deferred_fields() & set(BANK_FIELDS):
+        question_bank = QuestionBank.objects.only(*BANK_FIELDS).get(pk=question_bank.pk)
+
+    stored = 0
+    with transaction.atomic():
+        ExamBankCompatibility.objects.filter(question_bank_id=question_bank.pk).delete()
+        if question_bank.is_public:
+            for block in _blocks(Exam.objects.only(*EXAM_FIELDS).order_by('pk'), block_size):
+                stored += _store(ExamBankCompatibility, block, [question_bank])
+    return stored
@@ -1,74 +1,34 @@
 """
 Utility functions for exam and question bank management.
 """
-from django.db.models import Q
-from questions.models import QuestionBank
+from questions.models import ExamBankCompatibility, QuestionBank
 from exams.models import Exam
 
 
+# Number of suggestions returned for an exam
+SUGGESTION_LIMIT = 20
+
+
 def find_compatible_question_banks(exam):
     """
     Find question banks that are compatible with the given exam.
     
+    Pairs are precomputed in ExamBankCompatibility (see
+    core.exam_compatibility), so this is a join on the matrix.
+    
     Args:
         exam: Exam instance
         
     Returns:
-        QuerySet of compatible QuestionBank instances
+        QuerySet of compatible QuestionBank instances, best match first
     """
     if not exam:
         return QuestionBank.objects.none()
     
-    # Start with all public question banks
-    compatible_banks = QuestionBank.objects.filter(is_public=True)
-    
-    # Filter by matching criteria
-    filters = Q()
-    
-    # Match by exam type
-    if exam.exam_type:
-        filters |= Q(exam_type=exam.exam_type)
-    
-    # Match by category
-    if exam.category:
-        filters |= Q(category=exam.category)
-    
-    # Match by subject
-    if exam.subject:
-        filters |= Q(subject__icontains=exam.subject)
-    
-    # Match by topic
-    if exam.topic:
-        filters |= Q(topic__icontains=exam.topic)
-    
-    # Match by tags (if any tag matches) - SQLite compatible
-    if exam.tags:
-        for tag in exam.tags:
-            # Use icontains for SQLite compatibility instead of JSONField contains
-            filters |= Q(tags__icontains=tag)
-    
-    # Match by difficulty level
-    if exam.difficulty_level:
-        filters |= Q(difficulty_level=exam.difficulty_level)
-    
-    # Match by target audience
-    if exam.target_audience:
-        filters |= Q(target_audience=exam.target_audience)
-    
-    # Match by language
-    if exam.language:
-        filters |= Q(language=exam.language)
-    
-    # Match by state specific content
-    if exam.state_specific:
-        filters |= Q(state_specific__icontains=exam.state_specific)
-    
-    # Apply filters
-    if filters:
-        compatible_banks = compatible_banks.filter(filters)
-    
-    # Order by relevance (more matches first)
-    return compatible_banks.distinct().order_by('-created_at')
+    return QuestionBank.objects.filter(
+        is_public=True,
+        exam_compatibilities__exam=exam
+    ).order_by('-exam_compatibilities__score', '-created_at')
 
 
 def find_compatible_exams(question_bank):
@@ -79,61 +39,37 @@ def find_compatible_exams(question_bank):
         question_bank: QuestionBank instance
         
     Returns:
-        QuerySet of compatible Exam instances
+        QuerySet of compatible Exam instances, best match first
     """
     if not question_bank:
         return Exam.objects.none()
     
-    # Start with all active exams
-    compatible_exams = Exam.objects.filter(is_active=True)
-    
-    # Filter by matching criteria
-    filters = Q()
-    
-    # Match by exam type
-    if question_bank.exam_type:
-        filters |= Q(exam_type=question_bank.exam_type)
-    
-    # Match by category
-    if question_bank.category:
-        filters |= Q(category=question_bank.category)
-    
-    # Match by subject
-    if question_bank.subject:
-        filters |= Q(subject__icontains=question_bank.subject)
-    
-    # Match by topic
-    if question_bank.topic:
-        filters |= Q(topic__icontains=question_bank.topic)
-    
-    # Match by tags (if any tag matches) - SQLite compatible
-    if question_bank.tags:
-        for tag in question_bank.tags:
-            # Use icontains for SQLite compatibility instead of JSONField contains
-            filters |= Q(tags__icontains=tag)
-    
-    # Match by difficulty level
-    if question_bank.difficulty_level:
-        filters |= Q(difficulty_level=question_bank.difficulty_level)
-    
-    # Match by target audience
-    if question_bank.target_audience:
-        filters |= Q(target_audience=question_bank.target_audience)
-    
-    # Match by language
-    if question_bank.language:
-        filters |= Q(language=question_bank.language)
-    
-    # Match by state specific content
-    if question_bank.state_specific:
-        filters |= Q(state_specific__icontains=question_bank.state_specific)
-    
-    # Apply filters
-    if filters:
-        compatible_exams = compatible_exams.filter(filters)
+    return Exam.objects.filter(
+        is_active=True,
+        bank_compatibilities__question_bank=question_bank
+    ).order_by('-bank_compatibilities__score', '-created_at')
+
+
+def get_compatible_bank_ids(exam, min_score=0.0, limit=SUGGESTION_LIMIT):
+    """
+    Ids of the best matching public banks of an exam, best first.
     
-    # Order by relevance
-    return compatible_exams.distinct().order_by('-created_at')
+    Args:
+        exam: Exam instance
+        min_score: Lowest match score to include
+        limit: Maximum number of banks (None for all)
+        
+    Returns:
+        list of QuestionBank ids
+    """
+    matches = ExamBankCompatibility.objects.filter(
+        exam=exam,
+        question_bank__is_public=True,
+        score__gte=min_score
+    ).order_by('-score', 'question_bank_id').values_list('question_bank_id', flat=True)
+    if limit is not None:
+        matches = matches[:limit]
+    return list(matches)
 
 
 def get_exam_question_bank_suggestions(exam):
@@ -146,36 +82,29 @@ def get_exam_question_bank_suggestions(exam):
     Returns:
         dict with categorized suggestions
     """
-    compatible_banks = find_compatible_question_banks(exam)
+    matches = ExamBankCompatibility.objects.filter(exam=exam, question_bank__is_public=True)
     
     suggestions = {
         'exact_matches': [],
         'good_matches': [],
         'partial_matches': [],
-        'total_count': compatible_banks.count()
+        'total_count': matches.count()
     }
     
-    for bank in compatible_banks[:20]:  # Limit to top 20
-        match_score = calculate_match_score(exam, bank)
+    top_matches = matches.select_related('question_bank').order_by('-score', 'question_bank_id')
+    for match in top_matches[:SUGGESTION_LIMIT]:
+        suggestion = {
+            'bank': match.question_bank,
+            'score': match.score,
+            'reasons': match.reasons
+        }
         
-        if match_score >= 0.8:
-            suggestions['exact_matches'].append({
-                'bank': bank,
-                'score': match_score,
-                'reasons': get_match_reasons(exam, bank)
-            })
-        elif match_score >= 0.6:
-            suggestions['good_matches'].append({
-                'bank': bank,
-                'score': match_score,
-                'reasons': get_match_reasons(exam, bank)
-            })
+        if match.score >= 0.8:
+            suggestions['exact_matches'].append(suggestion)
+        elif match.score >= 0.6:
+            suggestions['good_matches'].append(suggestion)
         else:
-            suggestions['partial_matches'].append({
-                'bank': bank,
-                'score': match_score,
-                'reasons': get_match_reasons(exam, bank)
-            })
+            suggestions['partial_matches'].append(suggestion)
     
     return suggestions
 
@@ -0,0 +1,118 @@
+"""
+Compare the full-text search index against the icontains filters it replaced.
+"""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.randomization import sample_ids
+from core.search import BACKENDS, SEARCH_FIELDS, get_search_backend, search_queryset
+
+
+class Command(BaseCommand):
+    help = 'Time ranked first-page searches through the search index and through icontains filters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            default=[],
+            help='Model to benchmark, e.g. Question (repeatable, default all searchable models)'
+        )
+        parser.add_argument(
+            '--query',
+            action='append',
+            default=[],
+            help='Query to run (repeatable, default words sampled from the data)'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=25,
+            help='Number of sampled queries per model'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs of each query per backend'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='Hits fetched per search, besides the total count'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed for sampling queries'
+        )
+
+    def handle(self, *args, **options):
+        models = [
+            model for model in SEARCH_FIELDS
+            if not options['model'] or model.__name__ in options['model']
+        ]
+        index = get_search_backend()
+        backends = [BACKENDS['icontains']] + ([index] if index is not BACKENDS['icontains'] else [])
+        rng = random.Random(options['seed'])
+
+        started = time.perf_counter()
+        for model in models:
+            queries = options['query'] or self._sample_queries(model, options['queries'], rng)
+            if not queries:
+                self.stdout.write(f'{model.__name__}: no rows to sample queries from')
+                continue
+
+            results = {}
+            for backend in backends:
+                timings, hits = [], []
+                for query in queries:
+                    for _ in range(max(1, options['repeat'])):
+                        elapsed, count = self._run(model, query, backend, options['page_size'])
+                        timings.append(elapsed)
+                    hits.append(count)
+                results[backend.name] = (timings, hits)
+                self.stdout.write(
+                    f'{model.__name__} [{backend.name}] median {statistics.median(timings) * 1000:.2f}ms '
+                    f'p95 {self._p95(timings) * 1000:.2f}ms, {statistics.mean(hits):.1f} hits/query'
+                )
+
+            if len(results) > 1:
+                baseline = statistics.median(results['icontains'][0])
+                indexed = statistics.median(results[index.name][0])
+                self.stdout.write(f'{model.__name__}: {baseline / max(indexed, 1e-9):.1f}x faster with {index.name}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Benchmarked search on {len(models)} models in {time.perf_counter() - started:.2f}s'
+        ))
+
+    @staticmethod
+    def _sample_queries(model, n, rng):
+        """Words of at least four letters from the title column of random rows"""
+        column = SEARCH_FIELDS[model][0][0]
+        queries = []
+        ids = sample_ids(model.objects.all(), n, rng)
+        for text in model.objects.filter(pk__in=ids).values_list(column, flat=True):
+            words = [word for word in (text or '').split() if len(word) >= 4 and word.isalpha()]
+            if words:
+                queries.append(rng.choice(words).lower())
+        return queries
+
+    @staticmethod
+    def _run(model, query, backend, page_size):
+        started = time.perf_counter()
+        hits = search_queryset(model.objects.all(), query, backend=backend)
+        count = hits.count()
+        list(hits.order_by('-search_rank', '-created_at').values_list('pk', flat=True)[:page_size])
+        return time.perf_counter() - started, count
+
+    @staticmethod
+    def _p95(timings):
+        ordered = sorted(timings)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
@@ -0,0 +1,34 @@
+"""
+Rebuild the exam-to-bank compatibility matrix from scratch.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.exam_compatibility import NUMPY_AVAILABLE, rebuild_compatibility_matrix
+from exams.models import Exam
+from questions.models import QuestionBank
+
+
+class Command(BaseCommand):
+    help = 'Recompute match scores and reasons for every exam and public question bank'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--block-size',
+            type=int,
+            default=500,
+            help='Exams scored against all banks per block'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stored = rebuild_compatibility_matrix(block_size=options['block_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {Exam.objects.count()} exams against '
+            f'{QuestionBank.objects.filter(is_public=True).count()} public banks '
+            f'in {time.perf_counter() - started:.2f}s ({stored} compatible pairs stored, '
+            f'{"vectorized" if NUMPY_AVAILABLE else "scalar"})'
+        ))
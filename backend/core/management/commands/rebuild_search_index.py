@@ -0,0 +1,34 @@
+"""
+Rebuild the full-text search index of exams, question banks and questions.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.search import SEARCH_FIELDS, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Recompute the full-text search index (and on SQLite recreate its triggers)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            default=[],
+            help='Model to reindex, e.g. Question (repeatable, default all searchable models)'
+        )
+
+    def handle(self, *args, **options):
+        models = [
+            model for model in SEARCH_FIELDS
+            if not options['model'] or model.__name__ in options['model']
+        ]
+
+        started = time.perf_counter()
+        rebuild_search_index(models)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt search index for {len(models)} models in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,245 @@
+"""
+Batch test-paper generation from linked question banks.
+Papers for many tests, and K anti-cheating variants of each, are drawn in
+one run from the shared question-pool index. Every TestQuestionBank's
+difficulty and topic filters and its selection method are honoured, and all
+TestQuestion rows are written with a single bulk_create.
+"""
+
+import random
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+
+from exams.answer_key import invalidate_answer_key
+from exams.models import Test
+from questions.models import Question, TestQuestion, TestQuestionBank
+
+from .question_pool import DIFFICULTY_CODES, UNKNOWN_CODE, QuestionPool, get_bank_pool
+from .randomization import seeded_random, seeded_permutation
+
+
+# Unknown difficulties sort after every known level in either direction
+_HARDEST = len(DIFFICULTY_CODES)
+
+
+def _clone(instance, **values):
+    """New unsaved instance with the field values of instance (but a new pk), updated with values"""
+    opts = instance._meta
+    fields = {
+        field.attname: getattr(instance, field.attname)
+        for field in opts.concrete_fields if not field.primary_key
+    }
+    clone = type(instance)(**fields)
+    for name, value in values.items():
+        setattr(clone, name, value)
+    return clone
+
+
+class PaperGenerator:
+    """
+    Generate TestQuestion sets for many tests at once.
+
+    Bank pools are loaded once per run and shared by every test and variant
+    that links the bank. With a seed, the same tests produce the same papers.
+    """
+
+    def __init__(self, seed=None, overwrite: bool = False):
+        self.seed = seed
+        self.overwrite = overwrite
+        self._pools: Dict[str, QuestionPool] = {}
+        self.summary: List[Dict] = []
+
+    def _pool(self, bank_id) -> QuestionPool:
+        bank_id = str(bank_id)
+        if bank_id not in self._pools:
+            self._pools[bank_id] = get_bank_pool(bank_id)
+        return self._pools[bank_id]
+
+    def _rng(self, test, link) -> random.Random:
+        if self.seed is None:
+            return random.Random()
+        return seeded_random(self.seed, test.pk, link.pk)
+
+    def select_rows(self, link: TestQuestionBank, rng: random.Random, taken=()):
+        """
+        Pick the pool rows for one bank link, leaving out the questions in taken.
+
+        'sequential' takes the first questions in bank order; the other
+        methods draw a random sample, which 'difficulty_asc' and
+        'difficulty_desc' then order easy-to-hard or hard-to-easy.
+        """
+        pool = self._pool(link.question_bank_id)
+        rows = range(len(pool))
+
+        if link.difficulty_filter:
+            rows = pool.rows_with_value('difficulty', link.difficulty_filter.strip().lower())
+        if link.topic_filter:
+            topic = link.topic_filter.strip().lower()
+            codes = {code for code, value in enumerate(pool.topics) if value.lower() == topic}
+            rows = [row for row in rows if pool.topic[row] in codes]
+        if taken:
+            rows = [row for row in rows if pool.ids[row] not in taken]
+
+        count = max(0, link.question_count)
+        if link.selection_method == 'sequential':
+            return pool, list(rows)[:count]
+
+        rows = pool.sample(rows, count, rng)
+        if link.selection_method == 'difficulty_asc':
+            rows.sort(key=lambda row: pool.difficulty[row] if pool.difficulty[row] != UNKNOWN_CODE else _HARDEST)
+        elif link.selection_method == 'difficulty_desc':
+            rows.sort(key=lambda row: pool.difficulty[row], reverse=True)
+        return pool, rows
+
+    def plan(self, test, links: Iterable[TestQuestionBank]) -> List:
+        """
+        Ordered question ids for one test, bank by bank. A question picked
+        for one link is not picked again for another link to the same bank.
+        """
+        question_ids = []
+        for link in links:
+            pool, rows = self.select_rows(link, self._rng(test, link), taken=set(question_ids))
+            question_ids.extend(pool.question_ids(rows))
+        return question_ids
+
+    def ensure_variants(self, tests: List[Test], variants: int) -> List[Test]:
+        """
+        Make sure each base test has `variants` variant tests.
+
+        Missing variants are cloned from the base test together with its
+        question bank links; tests without links get no variants. Returns the given tests plus the variants of
+        every base test, up to `variants` each.
+        """
+        bases = [test for test in tests if test.variant_of_id is None]
+        existing = defaultdict(dict)
+        for variant in Test.objects.filter(variant_of__in=bases, variant_number__lte=variants):
+            existing[variant.variant_of_id][variant.variant_number] = variant
+
+        links = defaultdict(list)
+        for link in TestQuestionBank.objects.filter(test__in=bases).order_by('created_at', 'id'):
+            links[link.test_id].append(link)
+
+        new_tests, new_links = [], []
+        for base in bases:
+            if not links[base.pk]:
+                continue
+            for number in range(1, variants + 1):
+                if number in existing[base.pk]:
+                    continue
+                variant = _clone(
+                    base,
+                    title=f'{base.title} (Variant {number})',
+                    variant_of=base,
+                    variant_number=number,
+                    imported_from_json=False,
+                    json_import_batch='',
+                    original_json_data=None,
+                )
+                existing[base.pk][number] = variant
+                new_tests.append(variant)
+                new_links.extend(_clone(link, test=variant) for link in links[base.pk])
+
+        with transaction.atomic():
+            Test.objects.bulk_create(new_tests)
+            TestQuestionBank.objects.bulk_create(new_links)
+
+        family = [test for test in tests if test.variant_of_id is not None]
+        for base in bases:
+            family.append(base)
+            family.extend(existing[base.pk][number] for number in sorted(existing[base.pk]))
+        return list(dict.fromkeys(family))
+
+    def generate(self, tests: Iterable[Test], variants: int = 0) -> List[Dict]:
+        """
+        Generate papers for the given tests (and their variants).
+
+        Tests without bank links are skipped, as are tests that already have
+        questions unless overwrite is set. Returns one summary row per test.
+        """
+        tests = list(tests)
+        if variants:
+            tests = self.ensure_variants(tests, variants)
+        if not tests:
+            return []
+
+        links = defaultdict(list)
+        for link in TestQuestionBank.objects.filter(test__in=tests).order_by('created_at', 'id'):
+            links[link.test_id].append(link)
+        populated = set(
+            TestQuestion.objects.filter(test__in=tests).values_list('test_id', flat=True).distinct()
+        )
+
+        plans = {}
+        for test in tests:
+            if not links[test.pk]:
+                self._record(test, 'skipped', 0, 0, 'No linked question banks')
+            elif test.pk in populated and not self.overwrite:
+                self._record(test, 'skipped', 0, 0, 'Test already has questions')
+            else:
+                plans[test] = self.plan(test, links[test.pk])
+
+        marks = dict(Question.objects.filter(
+            id__in={question_id for question_ids in plans.values() for question_id in question_ids}
+        ).values_list('id', 'marks'))
+
+        test_questions = [
+            TestQuestion(test=test, question_id=question_id, order=order, marks=marks.get(question_id) or 1)
+            for test, question_ids in plans.items()
+            for order, question_id in enumerate(question_ids, start=1)
+        ]
+
+        with transaction.atomic():
+            TestQuestion.objects.filter(test__in=list(plans)).delete()
+            TestQuestion.objects.bulk_create(test_questions)
+
+        invalidate_answer_key(*plans)
+        for test, question_ids in plans.items():
+            requested = sum(link.question_count for link in links[test.pk])
+            self._record(test, 'generated', len(question_ids), requested)
+        return self.summary
+
+    def _record(self, test, state, generated, requested, reason=''):
+        self.summary.append({
+            'test_id': str(test.pk),
+            'title': test.title,
+            'variant': test.variant_number,
+            'status': state,
+            'generated': generated,
+            'requested': requested,
+            'reason': reason,
+        })
+
+
+def variant_paper(test, user) -> Optional[Tuple[List[str], List[int]]]:
+    """
+    Paper a candidate sits for a test with variants: (question ids, marks)
+    of the variant picked for the candidate, or None for the test's own
+    paper. The pick is seeded per candidate, so retakes get the same one.
+    """
+    variant_ids = list(
+        Test.objects.filter(variant_of=test, test_questions__isnull=False).distinct().order_by(
+            'variant_number'
+        ).values_list('pk', flat=True)
+    )
+    if not variant_ids:
+        return None
+    # Number 0 is the base test itself
+    number = seeded_random(test.pk, user.pk).randrange(len(variant_ids) + 1)
+    if number == 0:
+        return None
+
+    rows = list(
+        TestQuestion.objects.filter(test_id=variant_ids[number - 1]).order_by('order').values_list(
+            'question_id', 'marks'
+        )
+    )
+    if test.randomize_questions:
+        rows = seeded_permutation(rows, test.pk, user.pk)
+    return [str(question_id) for question_id, _ in rows], [int(marks or 1) for _, marks in rows]
+
+
+def generate_test_papers(tests, variants: int = 0, seed=None, overwrite: bool = False) -> List[Dict]:
+    """Generate papers for tests; see PaperGenerator"""
+    return PaperGenerator(seed=seed, overwrite=overwrite).generate(tests, variants)
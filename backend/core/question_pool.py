@@ -0,0 +1,230 @@
+"""
+In-memory question pool index for question selection.
+Each question bank is loaded once with a single values_list query into
+compact column arrays (ids, difficulty/type/topic codes, creation time,
+usage and content flags) and cached with a per-bank version (see
+exams.cache_versions) that is bumped whenever the bank's questions change. Selection filters, stratifies
+and samples against the index; only the final picks are hydrated.
+"""
+
+import random
+from array import array
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q
+from django.utils import timezone
+
+from exams.answer_key import LocalLRU
+from exams.cache_versions import POOL_SCOPE, bump_versions, get_version, get_versions
+from questions.models import Question, QuestionBank
+
+
+POOL_CACHE_KEY = 'question_pool:{bank_id}:{version}'
+
+# Fixed code tables so pools of different banks share codes
+DIFFICULTY_CODES = {value: code for code, (value, _) in enumerate(Question.DIFFICULTY_LEVELS)}
+TYPE_CODES = {value: code for code, (value, _) in enumerate(Question.QUESTION_TYPES)}
+CATEGORY_CODES = {value: code for code, (value, _) in enumerate(QuestionBank.CATEGORY_CHOICES, start=1)}
+UNKNOWN_CODE = -1
+NO_CATEGORY = 0
+
+
+def _code_table(codes):
+    table = {code: value for value, code in codes.items()}
+    table[UNKNOWN_CODE] = ''
+    return table
+
+
+DIFFICULTY_VALUES = _code_table(DIFFICULTY_CODES)
+TYPE_VALUES = _code_table(TYPE_CODES)
+CATEGORY_VALUES = _code_table(CATEGORY_CODES)
+CATEGORY_VALUES[NO_CATEGORY] = ''
+
+CODE_TABLES = {
+    'difficulty': DIFFICULTY_CODES,
+    'question_type': TYPE_CODES,
+    'category': CATEGORY_CODES,
+}
+
+
+class QuestionPool:
+    """
+    Column store of selectable questions.
+
+    Row i describes question ids[i]. Topic and subtopic strings are
+    dictionary-encoded into the topics list; created_at is a POSIX timestamp.
+    """
+
+    __slots__ = (
+        'ids', 'difficulty', 'question_type', 'category', 'topic', 'subtopic',
+        'created_at', 'usage', 'has_explanation', 'has_image', 'topics',
+    )
+
+    COLUMNS = (
+        ('difficulty', 'b'), ('question_type', 'h'), ('category', 'h'), ('topic', 'i'),
+        ('subtopic', 'i'), ('created_at', 'd'), ('usage', 'i'), ('has_explanation', 'b'),
+        ('has_image', 'b'),
+    )
+
+    def __init__(self, ids=(), topics=None, **columns):
+        self.ids = list(ids)
+        self.topics = topics if topics is not None else ['']
+        for name, typecode in self.COLUMNS:
+            setattr(self, name, columns.get(name, array(typecode)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load_bank(cls, bank_id):
+        """Build the pool of one question bank with a single query"""
+        rows = Question.objects.filter(question_bank_id=bank_id).exclude(
+            question_text=''
+        ).exclude(question_text__isnull=True).annotate(
+            usage=Count('testquestion'),
+            has_explanation=ExpressionWrapper(~Q(explanation=''), output_field=BooleanField()),
+            has_image=ExpressionWrapper(
+                Q(image__isnull=False) & ~Q(image=''), output_field=BooleanField()
+            ),
+        ).order_by('created_at', 'id').values_list(
+            'id', 'difficulty', 'question_type', 'question_bank__category', 'topic', 'subtopic',
+            'created_at', 'usage', 'has_explanation', 'has_image',
+        )
+
+        pool = cls()
+        topic_codes = {'': 0}
+        for (question_id, difficulty, question_type, category, topic, subtopic, created_at,
+             usage, has_explanation, has_image) in rows:
+            pool.ids.append(question_id)
+            pool.difficulty.append(DIFFICULTY_CODES.get(difficulty, UNKNOWN_CODE))
+            pool.question_type.append(TYPE_CODES.get(question_type, UNKNOWN_CODE))
+            pool.category.append(CATEGORY_CODES.get(category, NO_CATEGORY))
+            pool.topic.append(topic_codes.setdefault(topic or '', len(topic_codes)))
+            pool.subtopic.append(topic_codes.setdefault(subtopic or '', len(topic_codes)))
+            pool.created_at.append(created_at.timestamp() if created_at else 0.0)
+            pool.usage.append(usage or 0)
+            pool.has_explanation.append(bool(has_explanation))
+            pool.has_image.append(bool(has_image))
+        pool.topics = [topic for topic, _ in sorted(topic_codes.items(), key=lambda item: item[1])]
+        return pool
+
+    @classmethod
+    def merge(cls, pools):
+        """Concatenate pools, re-encoding topics into one shared vocabulary"""
+        merged = cls()
+        topic_codes = {'': 0}
+        for pool in pools:
+            remap = [topic_codes.setdefault(topic, len(topic_codes)) for topic in pool.topics]
+            merged.ids.extend(pool.ids)
+            for name, _ in cls.COLUMNS:
+                column = getattr(pool, name)
+                if name in ('topic', 'subtopic'):
+                    column = array('i', (remap[code] for code in column))
+                getattr(merged, name).extend(column)
+        merged.topics = [topic for topic, _ in sorted(topic_codes.items(), key=lambda item: item[1])]
+        return merged
+
+    def take(self, indices):
+        """Return a new pool containing the given rows, in that order"""
+        subset = QuestionPool(topics=self.topics)
+        subset.ids = [self.ids[index] for index in indices]
+        for name, typecode in self.COLUMNS:
+            column = getattr(self, name)
+            setattr(subset, name, array(typecode, (column[index] for index in indices)))
+        return subset
+
+    def filter(self, predicate):
+        """Return a new pool with the rows for which predicate(index) is true"""
+        return self.take([index for index in range(len(self.ids)) if predicate(index)])
+
+    def topic_codes_matching(self, needle):
+        """Codes of topic strings containing needle, case-insensitively (like icontains)"""
+        needle = needle.lower()
+        return {code for code, topic in enumerate(self.topics) if needle in topic.lower()}
+
+    def rows_where(self, column, codes):
+        """Indices of rows whose column value is one of codes"""
+        values = getattr(self, column)
+        codes = set(codes)
+        return [index for index, value in enumerate(values) if value in codes]
+
+    def rows_with_value(self, column, value):
+        """Indices of rows whose coded column (difficulty, question_type, category) equals value"""
+        code = CODE_TABLES[column].get(value)
+        if code is None:
+            return []
+        return self.rows_where(column, [code])
+
+    def sample(self, indices, k, rng=None):
+        """Sample up to k of the given row indices"""
+        rng = rng or random
+        indices = list(indices)
+        if len(indices) <= k:
+            rng.shuffle(indices)
+            return indices
+        return rng.sample(indices, k)
+
+    def question_ids(self, indices):
+        return [self.ids[index] for index in indices]
+
+    def hydrate(self, indices):
+        """Load Question objects for the chosen rows, preserving order"""
+        ids = self.question_ids(indices)
+        questions = Question.objects.filter(id__in=ids).select_related(
+            'question_bank'
+        ).prefetch_related('options')
+        by_id = {question.id: question for question in questions}
+        return [by_id[question_id] for question_id in ids if question_id in by_id]
+
+    @staticmethod
+    def year_of(timestamp):
+        # Matches created_at__year lookups, which use the current time zone
+        return datetime.fromtimestamp(timestamp, tz=timezone.get_current_timezone()).year
+
+
+_local_pools = LocalLRU(getattr(settings, 'QUESTION_POOL_LOCAL_CACHE_SIZE', 128))
+
+
+def get_bank_pool(bank_id):
+    """Return the cached QuestionPool of a bank (local LRU, shared cache, then database)"""
+    bank_id = str(bank_id)
+    version = get_version(POOL_SCOPE, bank_id)
+    local_key = (bank_id, version)
+
+    pool = _local_pools.get(local_key)
+    if pool is not None:
+        return pool
+
+    shared_key = POOL_CACHE_KEY.format(bank_id=bank_id, version=version)
+    pool = cache.get(shared_key)
+    if pool is None:
+        pool = QuestionPool.load_bank(bank_id)
+        cache.set(shared_key, pool, timeout=getattr(settings, 'QUESTION_POOL_CACHE_TIMEOUT', 60 * 60))
+
+    _local_pools.set(local_key, pool)
+    return pool
+
+
+def get_pool_versions(bank_ids):
+    """Current pool version of each bank, in the given order"""
+    bank_ids = [str(bank_id) for bank_id in bank_ids]
+    versions = get_versions(POOL_SCOPE, bank_ids)
+    return [versions[bank_id] for bank_id in bank_ids]
+
+
+def get_question_pool(bank_ids):
+    """Return one pool covering all given banks"""
+    pools = [get_bank_pool(bank_id) for bank_id in dict.fromkeys(str(bank_id) for bank_id in bank_ids)]
+    if len(pools) == 1:
+        return pools[0]
+    return QuestionPool.merge(pools)
+
+
+def invalidate_question_pool(*bank_ids):
+    """Bump the pool version of the given banks"""
+    bank_ids = {str(getattr(bank_id, 'pk', bank_id)) for bank_id in bank_ids if bank_id is not None}
+    bump_versions(POOL_SCOPE, bank_ids)
+    for bank_id in bank_ids:
+        _local_pools.discard(bank_id)
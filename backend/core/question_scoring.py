@@ -0,0 +1,110 @@
+"""
+Vectorized question scoring for rule-based selection.
+PoolScorer scores every question of a QuestionPool at once over its column
+arrays: a base of 100, bonuses for matching the rule's distributions, for
+topic coverage, freshness, analytics, and images, and penalties for a
+missing explanation and for earlier servings.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from django.utils import timezone
+
+from .question_pool import CATEGORY_VALUES, DIFFICULTY_VALUES, TYPE_VALUES, UNKNOWN_CODE
+
+
+SECONDS_PER_DAY = 86400.0
+
+# Points a question loses per earlier serving when rules prefer less exposed questions
+EXPOSURE_PENALTY = 10.0
+
+
+def _weight_table(values: Dict, distribution: Dict, factor: float) -> List[float]:
+    """
+    Per-code bonus for a distribution, indexed by code + 1 so the unknown
+    code (-1) lands on slot 0.
+    """
+    size = max(values) + 2
+    table = [0.0] * size
+    for code, value in values.items():
+        if code != UNKNOWN_CODE and distribution and value in distribution:
+            table[code + 1] = distribution[value] * factor
+    return table
+
+
+class PoolScorer:
+    """Score every row of a QuestionPool against a selection rule"""
+
+    def __init__(self, rule, now=None):
+        self.rule = rule
+        self.now = (now or timezone.now()).timestamp()
+        self.difficulty_weights = _weight_table(DIFFICULTY_VALUES, rule.difficulty_distribution, 2)
+        self.category_weights = _weight_table(CATEGORY_VALUES, rule.category_distribution, 2)
+        self.type_weights = _weight_table(TYPE_VALUES, rule.question_type_distribution, 1.5)
+
+    def score(self, pool, analytics: Optional[Dict] = None, exposure: Optional[Sequence[int]] = None):
+        """
+        Return one score per pool row.
+
+        analytics may carry 'success_rate' and 'usage_count' sequences aligned
+        with the pool; those terms only apply when analytics are available.
+        exposure, also aligned with the pool, holds how often each question
+        was served and costs EXPOSURE_PENALTY per serving.
+        """
+        rule = self.rule
+        size = len(pool)
+        scores = np.zeros(size, dtype=np.float64)
+        if not size:
+            return scores
+
+        scores += 100
+        scores += np.asarray(self.difficulty_weights)[np.frombuffer(pool.difficulty, dtype=np.int8) + 1]
+        scores += np.asarray(self.category_weights)[np.frombuffer(pool.category, dtype=np.int16) + 1]
+        scores += np.asarray(self.type_weights)[np.frombuffer(pool.question_type, dtype=np.int16) + 1]
+
+        if rule.ensure_topic_coverage:
+            has_topic = np.frombuffer(pool.topic, dtype=np.int32) != 0
+            has_subtopic = np.frombuffer(pool.subtopic, dtype=np.int32) != 0
+            scores += np.where(has_topic, 20.0, 0.0)
+            scores += np.where(has_topic & has_subtopic, 10.0, 0.0)
+
+        if rule.priority_new_questions:
+            created = np.frombuffer(pool.created_at, dtype=np.float64)
+            days_old = np.floor((self.now - created) / SECONDS_PER_DAY)
+            scores += np.maximum(0.0, 100 - days_old * 0.5)
+
+        if analytics is not None:
+            success_rate = np.asarray(analytics['success_rate'], dtype=np.float64)
+            usage_count = np.asarray(analytics['usage_count'], dtype=np.float64)
+            scores += np.where((success_rate >= 40) & (success_rate <= 80), 30.0, 0.0)
+            scores += np.minimum(usage_count * 0.5, 50)
+
+        scores -= np.where(np.frombuffer(pool.has_explanation, dtype=np.int8) == 0, 20.0, 0.0)
+        scores += np.where(np.frombuffer(pool.has_image, dtype=np.int8) != 0, 15.0, 0.0)
+
+        if exposure is not None:
+            scores -= np.asarray(exposure, dtype=np.float64) * EXPOSURE_PENALTY
+        return scores
+
+    @staticmethod
+    def top_k(scores, k: int) -> List[int]:
+        """
+        Indices of the k highest scores, best first. Ties keep pool order,
+        matching a stable descending sort.
+        """
+        size = len(scores)
+        if k <= 0 or not size:
+            return []
+
+        scores = np.asarray(scores)
+        if k >= size:
+            return np.argsort(-scores, kind='stable').tolist()
+
+        # Partition around the k-th best score, then resolve ties at the boundary by index
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        above = np.flatnonzero(scores > threshold)
+        tied = np.flatnonzero(scores == threshold)[:k - len(above)]
+        chosen = np.concatenate([above, tied])
+        order = np.lexsort((chosen, -scores[chosen]))
+        return chosen[order].tolist()
@@ -6,23 +6,71 @@ Handles various selection strategies: random, rule-based, manual, and hybrid
 from django.db.models import Q, Count, F
 from django.utils import timezone
 from django.db import transaction
+from django.conf import settings
+import hashlib
+import json
+import logging
 import random
+import uuid
 from collections import defaultdict
 from typing import List, Dict, Tuple, Optional
 
 from questions.models import Question, QuestionBank, TestQuestion
+from questions.exposure import exam_cohort, get_exposure_counts, get_exposure_version
+from questions.tagging import tagged_question_ids
 from exams.models import Test, TestSelectionRule, TestAttempt
+from exams.answer_key import LocalLRU, invalidate_answer_key
+from .question_pool import CODE_TABLES, QuestionPool, get_pool_versions, get_question_pool
+from .question_scoring import PoolScorer
+from .quota_solver import QuotaDimension, QuotaSolver
+
+logger = logging.getLogger(__name__)
+
+
+class PaperDrawError(Exception):
+    """A per-attempt paper came back short of the rule's question count"""
+
+
+# Rule fields that decide which questions are eligible
+FILTER_FIELDS = (
+    'included_banks', 'year_range', 'included_topics', 'excluded_topics', 'included_tags',
+    'excluded_tags', 'excluded_questions', 'avoid_duplicates_from_attempts', 'max_exposure',
+)
+# Rule fields that only steer scoring and sampling within the eligible pool
+SAMPLING_FIELDS = (
+    'selection_mode', 'total_questions', 'difficulty_distribution', 'category_distribution',
+    'question_type_distribution', 'ensure_topic_coverage', 'priority_new_questions', 'prefer_less_exposed',
+)
+
+# Filtered pools and preview payloads, keyed by (test id, fingerprint)
+_filtered_pools = LocalLRU(getattr(settings, 'SELECTION_POOL_MEMO_SIZE', 32))
+_previews = LocalLRU(getattr(settings, 'SELECTION_PREVIEW_MEMO_SIZE', 64))
+
+
+def _fingerprint(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
 
 
 class QuestionSelectionEngine:
     """Main engine for selecting questions based on various rules and strategies"""
     
-    def __init__(self, exam, selection_rule: TestSelectionRule):
+    def __init__(self, exam, selection_rule: TestSelectionRule, memoize: bool = False, per_attempt: bool = False):
         self.exam = exam
         self.rule = selection_rule
         self.test = selection_rule.test
         self.selected_questions = []
         self.selection_metadata = {}
+        # Reuse filtered pools across runs with the same filters (previews only)
+        self.memoize = memoize
+        # Papers drawn for a single attempt: questions served before are
+        # favoured less instead of excluded, which would exhaust the banks
+        self.per_attempt = per_attempt
+        self.prefer_less_exposed = selection_rule.prefer_less_exposed or (
+            per_attempt and selection_rule.avoid_duplicates_from_attempts
+        )
+        self._exposure = None
+        self._bank_ids = None
+        self._filter_key = None
         
     def select_questions(self) -> List[Question]:
         """Main method to select questions based on configured rules"""
@@ -38,214 +86,170 @@ class QuestionSelectionEngine:
         else:
             raise ValueError(f"Unknown selection mode: {self.rule.selection_mode}")
     
-    def _get_eligible_questions(self) -> 'QuerySet':
-        """Get base queryset of eligible questions based on filters"""
-        # Start with all questions
-        questions = Question.objects.all()
-        
-        # Filter by included question banks
+    def _get_eligible_bank_ids(self) -> List:
+        """Question banks the rule draws from"""
         if self.rule.included_banks:
-            questions = questions.filter(question_bank_id__in=self.rule.included_banks)
-        else:
-            # Get compatible question banks based on exam properties
-            from core.exam_utils import get_exam_question_bank_suggestions
-            suggestions = get_exam_question_bank_suggestions(self.exam)
-            
-            # Get all matches with score >= 0.5
-            bank_ids = []
-            all_matches = suggestions['exact_matches'] + suggestions['good_matches'] + suggestions['partial_matches']
-            for match in all_matches:
-                if match['score'] >= 0.5:
-                    bank_ids.append(match['bank'].id)
-            
-            questions = questions.filter(question_bank_id__in=bank_ids)
+            return list(self.rule.included_banks)
+        
+        # Best precomputed matches for the exam's properties
+        from core.exam_utils import get_compatible_bank_ids
+        return get_compatible_bank_ids(self.exam, min_score=0.5)
+    
+    def _get_exposure(self) -> Dict:
+        """Times each question has been served to candidates of this exam, from the exposure ledger"""
+        if self._exposure is None:
+            self._exposure = get_exposure_counts(exam_cohort(self.exam))
+        return self._exposure
+    
+    def _get_used_question_ids(self):
+        """Questions already served to candidates of this exam"""
+        return set(self._get_exposure())
+    
+    def _get_overexposed_question_ids(self):
+        """Questions served at least max_exposure times in this exam"""
+        cap = self.rule.max_exposure
+        return {question_id for question_id, served in self._get_exposure().items() if served >= cap}
+    
+    def _get_bank_ids(self) -> List:
+        if self._bank_ids is None:
+            self._bank_ids = [str(bank_id) for bank_id in self._get_eligible_bank_ids()]
+        return self._bank_ids
+    
+    def _uses_exposure(self) -> bool:
+        return bool(
+            self.rule.avoid_duplicates_from_attempts or self.rule.max_exposure or self.prefer_less_exposed
+        )
+    
+    def filter_fingerprint(self) -> str:
+        """
+        Fingerprint of the eligibility filters and the versions of the banks
+        they draw from, and of the exam's exposure counts when the rule uses them
+        """
+        if self._filter_key is None:
+            bank_ids = self._get_bank_ids()
+            self._filter_key = _fingerprint(
+                [getattr(self.rule, field) for field in FILTER_FIELDS],
+                self.per_attempt,
+                bank_ids,
+                get_pool_versions(bank_ids),
+                get_exposure_version(exam_cohort(self.exam)) if self._uses_exposure() else None,
+            )
+        return self._filter_key
+    
+    def fingerprint(self) -> str:
+        """Fingerprint of the whole rule plus bank versions; equal fingerprints select alike"""
+        return _fingerprint(self.filter_fingerprint(), [getattr(self.rule, field) for field in SAMPLING_FIELDS])
+    
+    def _get_eligible_pool(self) -> QuestionPool:
+        """
+        Cached pool index of eligible questions, filtered without touching the questions table.
+        With memoize set, the filtered pool is reused while the filters and banks are unchanged.
+        """
+        if not self.memoize:
+            return self._filter_pool()
+        
+        key = (str(self.test.pk), self.filter_fingerprint())
+        pool = _filtered_pools.get(key)
+        if pool is None:
+            pool = self._filter_pool()
+            _filtered_pools.set(key, pool)
+        return pool
+    
+    def _filter_pool(self) -> QuestionPool:
+        bank_ids = self._get_bank_ids()
+        pool = get_question_pool(bank_ids)
+        rows = range(len(pool))
         
         # Filter by year range
         if self.rule.year_range:
             start_year = self.rule.year_range.get('start')
             end_year = self.rule.year_range.get('end')
-            if start_year:
-                questions = questions.filter(created_at__year__gte=start_year)
-            if end_year:
-                questions = questions.filter(created_at__year__lte=end_year)
+            if start_year or end_year:
+                years = [QuestionPool.year_of(timestamp) for timestamp in pool.created_at]
+                rows = [
+                    index for index in rows
+                    if (not start_year or years[index] >= int(start_year))
+                    and (not end_year or years[index] <= int(end_year))
+                ]
         
         # Filter by included topics
         if self.rule.included_topics:
-            topic_q = Q()
+            codes = set()
             for topic in self.rule.included_topics:
-                topic_q |= Q(topic__icontains=topic) | Q(subtopic__icontains=topic)
-            questions = questions.filter(topic_q)
+                codes |= pool.topic_codes_matching(topic)
+            rows = [index for index in rows if pool.topic[index] in codes or pool.subtopic[index] in codes]
         
         # Exclude specific topics
         if self.rule.excluded_topics:
+            codes = set()
             for topic in self.rule.excluded_topics:
-                questions = questions.exclude(
-                    Q(topic__icontains=topic) | Q(subtopic__icontains=topic)
-                )
-        
-        # Exclude specific questions
-        if self.rule.excluded_questions:
-            questions = questions.exclude(id__in=self.rule.excluded_questions)
-        
-        # Avoid duplicates from previous attempts if configured
-        if self.rule.avoid_duplicates_from_attempts:
-            # Get all questions used in previous attempts of tests in this exam
-            used_question_ids = TestQuestion.objects.filter(
-                test__exam=self.exam,
-                test__attempts__user=self.test.created_by
-            ).values_list('question_id', flat=True).distinct()
-            questions = questions.exclude(id__in=used_question_ids)
-        
-        # Ensure questions have required fields
-        questions = questions.exclude(question_text='').exclude(question_text__isnull=True)
-        
-        return questions.select_related('question_bank').prefetch_related('options')
+                codes |= pool.topic_codes_matching(topic)
+            rows = [index for index in rows if pool.topic[index] not in codes and pool.subtopic[index] not in codes]
+        
+        # Filter by tags through the tag index
+        if self.rule.included_tags:
+            tagged = tagged_question_ids(self.rule.included_tags, bank_ids)
+            rows = [index for index in rows if pool.ids[index] in tagged]
+        if self.rule.excluded_tags:
+            tagged = tagged_question_ids(self.rule.excluded_tags, bank_ids)
+            rows = [index for index in rows if pool.ids[index] not in tagged]
+        
+        # Exclude specific questions and, if configured, those from previous attempts
+        excluded_ids = set()
+        for question_id in self.rule.excluded_questions or []:
+            try:
+                excluded_ids.add(uuid.UUID(str(question_id)))
+            except ValueError:
+                continue
+        if self.rule.avoid_duplicates_from_attempts and not self.per_attempt:
+            excluded_ids.update(self._get_used_question_ids())
+        if self.rule.max_exposure:
+            excluded_ids.update(self._get_overexposed_question_ids())
+        if excluded_ids:
+            rows = [index for index in rows if pool.ids[index] not in excluded_ids]
+        
+        return pool.take(list(rows))
     
     def _random_selection(self) -> List[Question]:
-        """Random selection with distribution constraints"""
-        eligible_questions = self._get_eligible_questions()
-        selected = []
+        """Random selection with distribution constraints, sampled from the pool index"""
+        pool = self._get_eligible_pool()
         
-        # If difficulty distribution is specified
-        if self.rule.difficulty_distribution:
-            for difficulty, percentage in self.rule.difficulty_distribution.items():
-                count = int(self.rule.total_questions * percentage / 100)
-                difficulty_questions = list(
-                    eligible_questions.filter(difficulty=difficulty)
-                )
-                
-                # Randomly select required number
-                if len(difficulty_questions) >= count:
-                    selected.extend(random.sample(difficulty_questions, count))
-                else:
-                    # If not enough questions, take all available
-                    selected.extend(difficulty_questions)
-                    self.selection_metadata[f'shortage_{difficulty}'] = count - len(difficulty_questions)
-        
-        # If category distribution is specified
-        elif self.rule.category_distribution:
-            for category, percentage in self.rule.category_distribution.items():
-                count = int(self.rule.total_questions * percentage / 100)
-                category_questions = list(
-                    eligible_questions.filter(question_bank__category=category)
-                )
-                
-                if len(category_questions) >= count:
-                    selected.extend(random.sample(category_questions, count))
-                else:
-                    selected.extend(category_questions)
-                    self.selection_metadata[f'shortage_{category}'] = count - len(category_questions)
-        
-        # If question type distribution is specified
-        elif self.rule.question_type_distribution:
-            for qtype, percentage in self.rule.question_type_distribution.items():
-                count = int(self.rule.total_questions * percentage / 100)
-                type_questions = list(
-                    eligible_questions.filter(question_type=qtype)
-                )
-                
-                if len(type_questions) >= count:
-                    selected.extend(random.sample(type_questions, count))
-                else:
-                    selected.extend(type_questions)
-                    self.selection_metadata[f'shortage_{qtype}'] = count - len(type_questions)
-        
-        # If no distribution specified, pure random
-        else:
-            all_questions = list(eligible_questions)
-            if len(all_questions) >= self.rule.total_questions:
-                selected = random.sample(all_questions, self.rule.total_questions)
-            else:
-                selected = all_questions
-                self.selection_metadata['shortage_total'] = self.rule.total_questions - len(all_questions)
-        
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_selected = []
-        for q in selected:
-            if q.id not in seen:
-                seen.add(q.id)
-                unique_selected.append(q)
-        
-        self.selected_questions = unique_selected
-        return unique_selected
+        # A random priority order; the quota solver keeps every distribution in balance
+        order = pool.sample(range(len(pool)), len(pool))
+        if self.prefer_less_exposed:
+            # Least served first; the shuffle still decides among equals
+            exposure = self._get_exposure()
+            order.sort(key=lambda row: exposure.get(pool.ids[row], 0))
+        selected = pool.hydrate(self._solve_quotas(pool, order, self.rule.total_questions))
+        
+        self.selected_questions = selected
+        return selected
     
     def _rule_based_selection(self) -> List[Question]:
         """Complex rule-based selection with scoring"""
-        eligible_questions = self._get_eligible_questions()
-        
-        # Score each question based on multiple criteria
-        scored_questions = []
-        for question in eligible_questions:
-            score = self._calculate_question_score(question)
-            scored_questions.append((score, question))
-        
-        # Sort by score descending
-        scored_questions.sort(key=lambda x: x[0], reverse=True)
-        
-        # Select top N questions
-        selected = [q[1] for q in scored_questions[:self.rule.total_questions]]
-        
-        # Ensure distribution requirements are met
-        selected = self._ensure_distribution_requirements(selected, eligible_questions)
+        pool = self._get_eligible_pool()
+        
+        # Score every eligible question at once and rank them
+        scorer = PoolScorer(self.rule)
+        exposure = None
+        if self.prefer_less_exposed:
+            served = self._get_exposure()
+            exposure = [served.get(question_id, 0) for question_id in pool.ids]
+        # Distributions may need questions further down the ranking; without
+        # them the best total_questions are the selection
+        has_distributions = (
+            self.rule.difficulty_distribution or self.rule.category_distribution
+            or self.rule.question_type_distribution
+        )
+        needed = len(pool) if has_distributions else self.rule.total_questions
+        ranked_rows = scorer.top_k(scorer.score(pool, exposure=exposure), needed)
+        
+        # Take the best questions that jointly meet the distribution requirements
+        selected = pool.hydrate(self._solve_quotas(pool, ranked_rows, self.rule.total_questions))
         
         self.selected_questions = selected
         return selected
     
-    def _calculate_question_score(self, question: Question) -> float:
-        """Calculate question score based on multiple criteria"""
-        score = 0.0
-        
-        # Base score
-        score += 100
-        
-        # Difficulty match bonus
-        if self.rule.difficulty_distribution and question.difficulty in self.rule.difficulty_distribution:
-            score += self.rule.difficulty_distribution[question.difficulty] * 2
-        
-        # Category match bonus
-        if (self.rule.category_distribution and 
-            question.question_bank and 
-            question.question_bank.category in self.rule.category_distribution):
-            score += self.rule.category_distribution[question.question_bank.category] * 2
-        
-        # Question type match bonus
-        if self.rule.question_type_distribution and question.question_type in self.rule.question_type_distribution:
-            score += self.rule.question_type_distribution[question.question_type] * 1.5
-        
-        # Topic coverage bonus
-        if self.rule.ensure_topic_coverage and question.topic:
-            score += 20
-            if question.subtopic:
-                score += 10
-        
-        # Freshness bonus (newer questions get higher scores)
-        if self.rule.priority_new_questions:
-            days_old = (timezone.now() - question.created_at).days
-            freshness_score = max(0, 100 - (days_old * 0.5))
-            score += freshness_score
-        
-        # Quality indicators
-        if hasattr(question, 'analytics'):
-            # Higher score for questions with good success rate (40-80%)
-            success_rate = question.analytics.get('success_rate', 50)
-            if 40 <= success_rate <= 80:
-                score += 30
-            
-            # Bonus for frequently used questions (proven quality)
-            usage_count = question.analytics.get('usage_count', 0)
-            score += min(usage_count * 0.5, 50)
-        
-        # Penalty for questions without explanations
-        if not question.explanation:
-            score -= 20
-        
-        # Bonus for questions with images (more engaging)
-        if question.image:
-            score += 15
-        
-        return score
-    
     def _hybrid_selection(self) -> List[Question]:
         """Hybrid approach combining random and rule-based selection"""
         # First, apply rule-based selection for 70% of questions
@@ -257,10 +261,10 @@ class QuestionSelectionEngine:
         random_count = self.rule.total_questions - len(rule_based_questions)
         if random_count > 0:
             # Exclude already selected questions
-            eligible_questions = self._get_eligible_questions().exclude(
-                id__in=[q.id for q in rule_based_questions]
-            )
-            random_questions = list(eligible_questions.order_by('?')[:random_count])
+            pool = self._get_eligible_pool()
+            chosen_ids = {q.id for q in rule_based_questions}
+            rows = [index for index, question_id in enumerate(pool.ids) if question_id not in chosen_ids]
+            random_questions = pool.hydrate(pool.sample(rows, random_count))
             
             # Combine both sets
             self.selected_questions = rule_based_questions + random_questions
@@ -269,26 +273,34 @@ class QuestionSelectionEngine:
         
         return self.selected_questions
     
-    def _ensure_distribution_requirements(self, selected: List[Question], 
-                                        eligible_questions: 'QuerySet') -> List[Question]:
-        """Ensure selected questions meet distribution requirements"""
-        # Check difficulty distribution
-        if self.rule.difficulty_distribution:
-            current_distribution = self._calculate_distribution(selected, 'difficulty')
-            selected = self._adjust_distribution(
-                selected, eligible_questions, 'difficulty', 
-                self.rule.difficulty_distribution, current_distribution
-            )
+    def _solve_quotas(self, pool: QuestionPool, order: List[int], total: int) -> List[int]:
+        """
+        Pick `total` pool rows from `order` (best first) so that the difficulty,
+        category and question type distributions hold simultaneously.
+        Unavoidable shortfalls are recorded in selection_metadata.
+        """
+        dimensions = []
+        for column, distribution in (
+            ('difficulty', self.rule.difficulty_distribution),
+            ('category', self.rule.category_distribution),
+            ('question_type', self.rule.question_type_distribution),
+        ):
+            if not distribution:
+                continue
+            targets = {
+                label: (CODE_TABLES[column].get(label), int(total * percentage / 100))
+                for label, percentage in distribution.items()
+            }
+            dimensions.append(QuotaDimension(column, getattr(pool, column), targets, total))
         
-        # Check category distribution
-        if self.rule.category_distribution:
-            current_distribution = self._calculate_distribution(selected, 'question_bank__category')
-            selected = self._adjust_distribution(
-                selected, eligible_questions, 'question_bank__category',
-                self.rule.category_distribution, current_distribution
-            )
+        rows, shortfall = QuotaSolver(dimensions, total).solve(order)
         
-        return selected
+        for buckets in shortfall.values():
+            for label, missing in buckets.items():
+                self.selection_metadata[f'shortage_{label}'] = missing
+        if len(rows) < total:
+            self.selection_metadata['shortage_total'] = total - len(rows)
+        return rows
     
     def _calculate_distribution(self, questions: List[Question], field: str) -> Dict[str, int]:
         """Calculate current distribution of questions by field"""
@@ -310,55 +322,6 @@ class QuestionSelectionEngine:
         
         return dict(distribution)
     
-    def _adjust_distribution(self, selected: List[Question], eligible_questions: 'QuerySet',
-                           field: str, target_distribution: Dict[str, int],
-                           current_distribution: Dict[str, int]) -> List[Question]:
-        """Adjust selection to match target distribution"""
-        adjusted = selected.copy()
-        
-        for value, target_percentage in target_distribution.items():
-            target_count = int(self.rule.total_questions * target_percentage / 100)
-            current_count = current_distribution.get(value, 0)
-            
-            if current_count < target_count:
-                # Need more questions of this type
-                needed = target_count - current_count
-                
-                # Get additional questions
-                if '__' in field:
-                    filter_kwargs = {f"{field}": value}
-                else:
-                    filter_kwargs = {field: value}
-                
-                additional = eligible_questions.filter(**filter_kwargs).exclude(
-                    id__in=[q.id for q in adjusted]
-                ).order_by('?')[:needed]
-                
-                adjusted.extend(additional)
-            
-            elif current_count > target_count:
-                # Too many questions of this type, remove some
-                excess = current_count - target_count
-                
-                # Find questions to remove
-                to_remove = []
-                for q in adjusted:
-                    if '__' in field:
-                        parts = field.split('__')
-                        q_value = q
-                        for part in parts:
-                            q_value = getattr(q_value, part, None)
-                    else:
-                        q_value = getattr(q, field, None)
-                    
-                    if q_value == value and len(to_remove) < excess:
-                        to_remove.append(q)
-                
-                for q in to_remove:
-                    adjusted.remove(q)
-        
-        return adjusted
-    
     def get_distribution_preview(self) -> Dict[str, any]:
         """Get preview of question distribution"""
         if not self.selected_questions:
@@ -450,6 +413,7 @@ class QuestionSelectionEngine:
         
         # Bulk create
         TestQuestion.objects.bulk_create(test_questions)
+        invalidate_answer_key(self.test)
         
         # Update test total marks to match actual
         actual_total = marks_per_question * len(self.selected_questions)
@@ -485,4 +449,67 @@ class QuestionSelectionEngine:
                         f"instead of target {target_pct}%"
                     )
         
-        return len(errors) == 0, errors
\ No newline at end of file
+        return len(errors) == 0, errors
+
+
+def preview_selection(test, rule, sample_size: int = 10) -> Dict:
+    """
+    Selection preview for the rule-tuning UI: distribution preview, the first
+    sample_size picks and validation. Payloads are memoized by the rule
+    fingerprint and bank versions, and a changed distribution reuses the
+    filtered pool of the previous preview so only sampling runs again.
+    """
+    engine = QuestionSelectionEngine(test.exam, rule, memoize=True)
+    key = (str(test.pk), engine.fingerprint())
+    payload = _previews.get(key)
+    if payload is not None:
+        return payload
+    
+    selected_questions = engine.select_questions()
+    preview = engine.get_distribution_preview()
+    is_valid, errors = engine.validate_selection()
+    
+    sample_questions = []
+    for q in selected_questions[:sample_size]:
+        sample_questions.append({
+            'id': str(q.id),
+            'text': q.question_text[:100] + '...' if len(q.question_text) > 100 else q.question_text,
+            'type': q.question_type,
+            'difficulty': q.difficulty,
+            'category': q.question_bank.category if q.question_bank else 'N/A',
+            'bank': q.question_bank.name if q.question_bank else 'N/A',
+        })
+    
+    payload = {
+        'preview': preview,
+        'sample_questions': sample_questions,
+        'is_valid': is_valid,
+        'validation_errors': errors
+    }
+    _previews.set(key, payload)
+    return payload
+
+
+def draw_attempt_paper(test) -> Optional[Tuple[List[str], List[int]]]:
+    """
+    Draw a fresh paper for a new attempt when the test's selection rule is in
+    per_attempt_papers mode. Returns (question ids, marks) in paper order, or
+    None when attempts share the test's TestQuestion paper. Raises
+    PaperDrawError when the banks cannot fill the paper.
+    """
+    rule = TestSelectionRule.objects.filter(test=test, per_attempt_papers=True).first()
+    if rule is None or rule.selection_mode == 'manual':
+        return None
+    
+    questions = QuestionSelectionEngine(test.exam, rule, per_attempt=True).select_questions()
+    if len(questions) < rule.total_questions:
+        logger.warning(
+            'Per-attempt paper for test %s drew %d of %d questions',
+            test.pk, len(questions), rule.total_questions,
+        )
+        raise PaperDrawError(
+            f'Only {len(questions)} of {rule.total_questions} questions are available for this test'
+        )
+    if test.randomize_questions:
+        random.shuffle(questions)
+    return [str(question.id) for question in questions], [int(question.marks or 1) for question in questions]
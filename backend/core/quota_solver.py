@@ -0,0 +1,146 @@
+"""
+Joint quota solver for question selection distributions.
+Difficulty, category, type (and any other coded pool column) targets are
+treated as simultaneous constraints. Candidates are taken in priority order
+while every quota they touch has room, the remainder is filled with the
+least-violating candidates, and a bounded swap phase then repairs buckets
+that are still short. Whatever deficit is left cannot be met by the pool and
+is reported per bucket.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+
+class QuotaDimension:
+    """
+    Target counts for one coded column.
+
+    values holds the code of every pool row; targets maps a bucket label to
+    (code or None, target count). Rows whose code is not targeted share the
+    slack left once all targets are met.
+    """
+
+    __slots__ = ('name', 'values', 'targets', 'code_labels', 'slack')
+
+    def __init__(self, name, values: Sequence[int], targets: Dict[str, Tuple], total: int):
+        self.name = name
+        self.values = values
+        self.targets = targets
+        self.code_labels = {code: label for label, (code, _) in targets.items() if code is not None}
+        self.slack = max(0, total - sum(count for _, count in targets.values()))
+
+    def bucket(self, row):
+        """Label of the targeted bucket a row falls into, or None for the slack bucket"""
+        return self.code_labels.get(self.values[row])
+
+    def cap(self, label):
+        return self.targets[label][1] if label is not None else self.slack
+
+
+class QuotaSolver:
+    """Pick `total` rows in priority order honouring all dimension quotas jointly"""
+
+    def __init__(self, dimensions: List[QuotaDimension], total: int, repair_window: int = 200):
+        self.dimensions = dimensions
+        self.total = total
+        self.repair_window = repair_window
+
+    @staticmethod
+    def _cost(dimension, label, count):
+        """Violation of one bucket at a given count"""
+        cap = dimension.cap(label)
+        if label is None:
+            return max(0, count - cap)
+        return abs(count - cap)
+
+    def _delta(self, counts, row, step):
+        """Change in total violation when row is added (step=1) or removed (step=-1)"""
+        delta = 0
+        for dimension, dimension_counts in zip(self.dimensions, counts):
+            label = dimension.bucket(row)
+            current = dimension_counts.get(label, 0)
+            delta += (
+                self._cost(dimension, label, current + step)
+                - self._cost(dimension, label, current)
+            )
+        return delta
+
+    def _apply(self, counts, row, step):
+        for dimension, dimension_counts in zip(self.dimensions, counts):
+            label = dimension.bucket(row)
+            dimension_counts[label] = dimension_counts.get(label, 0) + step
+
+    def solve(self, order: Sequence[int]) -> Tuple[List[int], Dict[str, Dict[str, int]]]:
+        """
+        Select rows from `order` (best first).
+        Returns (selected rows in priority order, shortfall per dimension and bucket).
+        """
+        order = list(order)
+        rank = {row: position for position, row in enumerate(order)}
+        counts = [{} for _ in self.dimensions]
+        selected = []
+        chosen = set()
+
+        # Strict pass: take candidates while every bucket they touch has room
+        for row in order:
+            if len(selected) >= self.total:
+                break
+            if all(
+                counts[index].get(dimension.bucket(row), 0) < dimension.cap(dimension.bucket(row))
+                for index, dimension in enumerate(self.dimensions)
+            ):
+                self._apply(counts, row, 1)
+                selected.append(row)
+                chosen.add(row)
+
+        # Fill pass: top up with the candidates that add the least violation
+        if len(selected) < self.total:
+            remaining = [row for row in order if row not in chosen]
+            remaining.sort(key=lambda row: (self._delta(counts, row, 1), rank[row]))
+            for row in remaining[:self.total - len(selected)]:
+                self._apply(counts, row, 1)
+                selected.append(row)
+                chosen.add(row)
+
+        self._repair(order, counts, selected, chosen)
+        selected.sort(key=rank.__getitem__)
+        return selected, self._shortfall(counts)
+
+    def _repair(self, order, counts, selected, chosen):
+        """Swap in candidates for short buckets while total violation strictly drops"""
+        for index, dimension in enumerate(self.dimensions):
+            for label, (code, target) in dimension.targets.items():
+                if code is None:
+                    continue
+                candidates = [
+                    row for row in order
+                    if row not in chosen and dimension.values[row] == code
+                ][:self.repair_window]
+                for candidate in candidates:
+                    if counts[index].get(label, 0) >= target:
+                        break
+                    gain = self._delta(counts, candidate, 1)
+                    best, best_delta = None, 0
+                    for position, row in enumerate(selected):
+                        self._apply(counts, candidate, 1)
+                        delta = gain + self._delta(counts, row, -1)
+                        self._apply(counts, candidate, -1)
+                        if delta < best_delta:
+                            best, best_delta = position, delta
+                    if best is None:
+                        continue
+                    removed = selected[best]
+                    self._apply(counts, removed, -1)
+                    self._apply(counts, candidate, 1)
+                    chosen.discard(removed)
+                    chosen.add(candidate)
+                    selected[best] = candidate
+
+    def _shortfall(self, counts):
+        shortfall = {}
+        for dimension, dimension_counts in zip(self.dimensions, counts):
+            for label, (_, target) in dimension.targets.items():
+                missing = target - dimension_counts.get(label, 0)
+                if missing > 0:
+                    shortfall.setdefault(dimension.name, {})[label] = missing
+        return shortfall
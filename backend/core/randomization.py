@@ -0,0 +1,74 @@
+"""
+Randomization helpers for question ordering and selection.
+Seeded permutations give every attempt a stable order across page loads,
+and sample_queryset draws random rows without an ORDER BY RANDOM() sort.
+"""
+
+import random
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+
+def seeded_random(*seed_parts) -> random.Random:
+    """Return a Random instance seeded from the given parts (e.g. attempt id, question id)"""
+    return random.Random(':'.join(str(part) for part in seed_parts))
+
+
+def seeded_permutation(items, *seed_parts) -> List:
+    """Return a new list with items in a deterministic order for the seed"""
+    permuted = list(items)
+    seeded_random(*seed_parts).shuffle(permuted)
+    return permuted
+
+
+def sample_ids(queryset, k: int, rng: Optional[random.Random] = None) -> List:
+    """
+    Return up to k random primary keys from a queryset.
+
+    On PostgreSQL, large querysets are pre-filtered with TABLESAMPLE BERNOULLI
+    so only a small slice of ids is read; everywhere else (and when the sample
+    comes up short) the ids are fetched and sampled in memory, which still
+    avoids sorting whole rows by RANDOM().
+    """
+    rng = rng or random.Random()
+    if k <= 0:
+        return []
+
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    threshold = getattr(settings, 'RANDOM_SAMPLE_TABLESAMPLE_THRESHOLD', 10000)
+
+    if connection.vendor == 'postgresql':
+        total = queryset.count()
+        if total > threshold:
+            # Oversample so the filtered sample usually covers k rows
+            percent = min(100.0, 100.0 * k * 3 / total)
+            meta = queryset.model._meta
+            sampled = RawSQL(
+                'SELECT {pk} FROM {table} TABLESAMPLE BERNOULLI (%s) REPEATABLE (%s)'.format(
+                    pk=connection.ops.quote_name(meta.pk.column),
+                    table=connection.ops.quote_name(meta.db_table),
+                ),
+                [percent, rng.randrange(2 ** 31)],
+            )
+            ids = list(queryset.filter(pk__in=sampled).values_list('pk', flat=True))
+            if len(ids) >= k:
+                return rng.sample(ids, k)
+
+    ids = list(queryset.values_list('pk', flat=True))
+    if len(ids) <= k:
+        rng.shuffle(ids)
+        return ids
+    return rng.sample(ids, k)
+
+
+def sample_queryset(queryset, k: int, rng: Optional[random.Random] = None) -> List:
+    """Return up to k random instances of a queryset, keeping its select/prefetch settings"""
+    ids = sample_ids(queryset, k, rng)
+    if not ids:
+        return []
+    by_id = {obj.pk: obj for obj in queryset.filter(pk__in=ids)}
+    return [by_id[pk] for pk in ids if pk in by_id]
@@ -0,0 +1,287 @@
+"""
+Full-text search over exams, question banks and questions.
+Searches used to OR icontains filters across several columns, which scans
+every row. Each searchable table now carries a full-text index kept up to
+date by database triggers, and search_queryset() turns a query string into a
+filter on that index plus a search_rank annotation, so results come back
+ranked and paginate like any other queryset.
+
+Backends are chosen per database vendor:
+
+- postgresql: a stored tsvector column with a GIN index, filled by a
+  BEFORE INSERT/UPDATE trigger, queried with SearchQuery/SearchRank.
+- sqlite: an external-content FTS5 table per model, kept in sync by
+  AFTER INSERT/UPDATE/DELETE triggers and ranked with bm25().
+- icontains: the previous OR-of-icontains filters, for any other database
+  and as the baseline of the benchmark_search command.
+
+SEARCH_BACKEND forces one of these by name. The SQLite index is keyed by the
+implicit rowid of the base table, which table rebuilds and VACUUM may
+renumber; the index is rebuilt after every migrate, and the
+rebuild_search_index command rebuilds it on demand.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from exams.models import Exam
+from questions.models import Question, QuestionBank
+
+
+# Searchable model -> (column, weight) pairs; weights follow PostgreSQL's A-D scheme
+SEARCH_FIELDS = {
+    Exam: (
+        ('name', 'A'), ('description', 'B'), ('category', 'C'), ('subject', 'C'), ('topic', 'C'),
+    ),
+    QuestionBank: (
+        ('name', 'A'), ('description', 'B'), ('organization', 'C'), ('category', 'C'),
+        ('subject', 'C'), ('topic', 'C'),
+    ),
+    Question: (
+        ('question_text', 'A'), ('topic', 'B'), ('subtopic', 'B'),
+    ),
+}
+
+# Relative weight of each class, as ts_rank's defaults
+WEIGHT_VALUES = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+TEXT_SEARCH_CONFIG = 'english'
+MAX_TERMS = 8
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """Distinct lower-cased word terms of a query string, at most MAX_TERMS"""
+    terms = dict.fromkeys(term.lower() for term in _TERM_RE.findall(query or ''))
+    return list(terms)[:MAX_TERMS]
+
+
+class IcontainsSearchBackend:
+    """Case-insensitive substring match of the whole query on every searchable column"""
+
+    name = 'icontains'
+
+    def search(self, queryset, query, also=None):
+        match = Q()
+        for column, _ in SEARCH_FIELDS[queryset.model]:
+            match |= Q(**{f'{column}__icontains': query})
+        if also is not None:
+            match |= also
+        return queryset.filter(match).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def install(self, schema_editor, model):
+        pass
+
+    def uninstall(self, schema_editor, model):
+        pass
+
+    def rebuild(self, connection, model):
+        pass
+
+
+class PostgresSearchBackend:
+    """Trigger-maintained tsvector column with a GIN index"""
+
+    name = 'postgresql'
+
+    @staticmethod
+    def _vector_sql(model, prefix=''):
+        return ' || '.join(
+            f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce({prefix}\"{column}\", '')), '{weight}')"
+            for column, weight in SEARCH_FIELDS[model]
+        )
+
+    def search(self, queryset, query, also=None):
+        # psycopg is only needed once PostgreSQL is actually in use
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+
+        table = queryset.model._meta.db_table
+        vector = RawSQL(f'"{table}"."search_vector"', [], output_field=SearchVectorField())
+        # Every term must match, each as a prefix, as icontains did for partial words
+        search_query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms), search_type='raw', config=TEXT_SEARCH_CONFIG
+        )
+        match = Q(search_vector=search_query)
+        if also is not None:
+            match |= also
+        return queryset.alias(search_vector=vector).filter(match).annotate(
+            search_rank=SearchRank(vector, search_query)
+        )
+
+    def install(self, schema_editor, model):
+        table = model._meta.db_table
+        columns = ', '.join(f'"{column}"' for column, _ in SEARCH_FIELDS[model])
+        schema_editor.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "search_vector" tsvector')
+        schema_editor.execute(
+            f'CREATE OR REPLACE FUNCTION "{table}_search_vector_update"() RETURNS trigger AS $$ '
+            f'BEGIN NEW."search_vector" := {self._vector_sql(model, "NEW.")}; RETURN NEW; END '
+            f'$$ LANGUAGE plpgsql'
+        )
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS "{table}_search_vector_trigger" ON "{table}"')
+        schema_editor.execute(
+            f'CREATE TRIGGER "{table}_search_vector_trigger" BEFORE INSERT OR UPDATE OF {columns} '
+            f'ON "{table}" FOR EACH ROW EXECUTE FUNCTION "{table}_search_vector_update"()'
+        )
+        schema_editor.execute(f'UPDATE "{table}" SET "search_vector" = {self._vector_sql(model)}')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{table}_search_gin" ON "{table}" USING gin ("search_vector")'
+        )
+
+    def uninstall(self, schema_editor, model):
+        table = model._meta.db_table
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS "{table}_search_vector_trigger" ON "{table}"')
+        schema_editor.execute(f'DROP FUNCTION IF EXISTS "{table}_search_vector_update"()')
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{table}_search_gin"')
+        schema_editor.execute(f'ALTER TABLE "{table}" DROP COLUMN IF EXISTS "search_vector"')
+
+    def rebuild(self, connection, model):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE "{table}" SET "search_vector" = {self._vector_sql(model)}')
+
+
+class SQLiteSearchBackend:
+    """External-content FTS5 table per model, ranked by bm25()"""
+
+    name = 'sqlite'
+
+    @staticmethod
+    def _match_expression(terms):
+        # Quoted so that FTS5 operators in user input are plain words
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, queryset, query, also=None):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+
+        model = queryset.model
+        table = model._meta.db_table
+        fts = f'{table}_fts'
+        pk = model._meta.pk.column
+        weights = ', '.join(str(WEIGHT_VALUES[weight]) for _, weight in SEARCH_FIELDS[model])
+        expression = self._match_expression(terms)
+
+        matched = RawSQL(
+            f'SELECT "{table}"."{pk}" FROM "{fts}" JOIN "{table}" ON "{table}".rowid = "{fts}".rowid '
+            f'WHERE "{fts}" MATCH %s',
+            [expression],
+        )
+        # bm25() is lower for better matches; negate it so higher ranks first on every backend.
+        # LIMIT -1 keeps the hits subquery from being flattened, so it is materialized once
+        # per statement instead of recomputing bm25's corpus statistics for every row.
+        rank = RawSQL(
+            f'SELECT "hits"."rank" FROM (SELECT "{fts}".rowid AS "hit", -bm25("{fts}", {weights}) AS "rank" '
+            f'FROM "{fts}" WHERE "{fts}" MATCH %s LIMIT -1) AS "hits" WHERE "hits"."hit" = "{table}".rowid',
+            [expression],
+            output_field=FloatField(),
+        )
+        match = Q(pk__in=matched)
+        if also is not None:
+            match |= also
+        return queryset.filter(match).annotate(search_rank=Coalesce(rank, 0.0))
+
+    def install(self, schema_editor, model):
+        table = model._meta.db_table
+        fts = f'{table}_fts'
+        columns = [column for column, _ in SEARCH_FIELDS[model]]
+        names = ', '.join(f'"{column}"' for column in columns)
+        new = ', '.join(f'new."{column}"' for column in columns)
+        old = ', '.join(f'old."{column}"' for column in columns)
+
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS "{fts}" USING fts5({names}, content="{table}", '
+            f'content_rowid="rowid", tokenize="unicode61 remove_diacritics 2", prefix="2 3")'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS "{fts}_ai" AFTER INSERT ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"(rowid, {names}) VALUES (new.rowid, {new}); END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS "{fts}_ad" AFTER DELETE ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"("{fts}", rowid, {names}) VALUES (\'delete\', old.rowid, {old}); END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS "{fts}_au" AFTER UPDATE OF {names} ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"("{fts}", rowid, {names}) VALUES (\'delete\', old.rowid, {old}); '
+            f'INSERT INTO "{fts}"(rowid, {names}) VALUES (new.rowid, {new}); END'
+        )
+        schema_editor.execute(f'INSERT INTO "{fts}"("{fts}") VALUES (\'rebuild\')')
+
+    def uninstall(self, schema_editor, model):
+        fts = f'{model._meta.db_table}_fts'
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS "{fts}_{suffix}"')
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{fts}"')
+
+    def rebuild(self, connection, model):
+        # Table rebuilds drop the triggers along with the old table, so recreate them too
+        with connection.schema_editor(atomic=False) as schema_editor:
+            self.install(schema_editor, model)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (PostgresSearchBackend(), SQLiteSearchBackend(), IcontainsSearchBackend())
+}
+
+
+def get_search_backend(using='default'):
+    """SEARCH_BACKEND when set, otherwise the index backend of the database vendor"""
+    name = getattr(settings, 'SEARCH_BACKEND', None) or connections[using].vendor
+    return BACKENDS.get(name, BACKENDS['icontains'])
+
+
+def search_queryset(queryset, query, also=None, backend=None):
+    """
+    Restrict a queryset of a searchable model to rows matching every word of
+    query and annotate search_rank (higher is better). Rows matching the
+    optional also filter are kept with rank 0, for matches on related tables
+    the index does not cover. Order by '-search_rank' for ranked results.
+    """
+    backend = backend or get_search_backend(queryset.db)
+    return backend.search(queryset, query, also=also)
+
+
+def _index_backend(connection):
+    # The index always matches the database, whatever SEARCH_BACKEND queries with
+    return BACKENDS.get(connection.vendor, BACKENDS['icontains'])
+
+
+def install_search_index(schema_editor):
+    backend = _index_backend(schema_editor.connection)
+    for model in SEARCH_FIELDS:
+        backend.install(schema_editor, model)
+
+
+def uninstall_search_index(schema_editor):
+    backend = _index_backend(schema_editor.connection)
+    for model in SEARCH_FIELDS:
+        backend.uninstall(schema_editor, model)
+
+
+def rebuild_search_index(models=None, using='default'):
+    """Recompute the index of the given searchable models (all when None)"""
+    connection = connections[using]
+    backend = _index_backend(connection)
+    for model in models or SEARCH_FIELDS:
+        backend.rebuild(connection, model)
+
+
+class SearchIndexAdminMixin:
+    """ModelAdmin whose search box queries the full-text index instead of search_fields"""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search_queryset(queryset, search_term), False
@@ -0,0 +1,82 @@
+"""
+Signal handlers keeping the question pool index and the exam-to-bank
+compatibility matrix in sync with exams and question banks, and the SQLite
+search index intact across migrations.
+"""
+
+from django.db import connections
+from django.db.models.signals import post_delete, post_init, post_migrate, post_save
+from django.dispatch import receiver
+
+from exams.models import Exam
+from questions.models import Question, QuestionBank
+from .exam_compatibility import (
+    BANK_FIELDS, EXAM_FIELDS, refresh_bank_compatibility, refresh_exam_compatibility,
+)
+from .question_pool import invalidate_question_pool
+from .search import rebuild_search_index
+
+
+def _match_state(instance, fields):
+    """Matched attributes of an exam or bank, or None if any were deferred"""
+    data = instance.__dict__
+    if any(field not in data for field in fields):
+        return None
+    return tuple(tuple(data[field]) if isinstance(data[field], list) else data[field] for field in fields)
+
+
+@receiver(post_init, sender=Question)
+def remember_question_bank(sender, instance, **kwargs):
+    # For rows loaded from the database this is the stored bank (None if deferred)
+    instance._stored_bank_id = instance.__dict__.get('question_bank_id')
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    previous = getattr(instance, '_stored_bank_id', None)
+    instance._stored_bank_id = instance.question_bank_id
+    # A question moved to another bank leaves the old bank's pool (and trigram index) too
+    invalidate_question_pool(previous, instance.question_bank_id)
+
+
+@receiver(post_save, sender=QuestionBank)
+def question_bank_changed(sender, instance, created, **kwargs):
+    # Category is denormalized into the pool
+    if not created:
+        invalidate_question_pool(instance.pk)
+
+
+@receiver(post_init, sender=Exam)
+def remember_exam_match_state(sender, instance, **kwargs):
+    instance._match_state = _match_state(instance, EXAM_FIELDS)
+
+
+@receiver(post_init, sender=QuestionBank)
+def remember_bank_match_state(sender, instance, **kwargs):
+    instance._match_state = _match_state(instance, BANK_FIELDS)
+
+
+@receiver(post_save, sender=Exam)
+def exam_compatibility_changed(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_match_state', None)
+    instance._match_state = _match_state(instance, EXAM_FIELDS)
+    if created or previous is None or previous != instance._match_state:
+        refresh_exam_compatibility(instance)
+
+
+@receiver(post_save, sender=QuestionBank)
+def bank_compatibility_changed(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_match_state', None)
+    instance._match_state = _match_state(instance, BANK_FIELDS)
+    if created or previous is None or previous != instance._match_state:
+        refresh_bank_compatibility(instance)
+
+
+@receiver(post_migrate)
+def repair_search_index(sender, using='default', **kwargs):
+    # SQLite rebuilds altered tables, which drops their FTS triggers and renumbers rowids
+    connection = connections[using]
+    if sender.name != 'core' or connection.vendor != 'sqlite':
+        return
+    if f'{Exam._meta.db_table}_fts' in connection.introspection.table_names():
+        rebuild_search_index(using=using)
@@ -1,3 +1,46 @@
-from django.test import TestCase
+import random
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from questions.models import Question, QuestionBank
+from .question_pool import get_bank_pool
+from .question_scoring import PoolScorer
+
+
+class TopKTests(SimpleTestCase):
+    """PoolScorer.top_k against a stable descending sort"""
+
+    def test_matches_stable_sort(self):
+        rng = random.Random(7)
+        for size in (1, 5, 40, 300):
+            # Few distinct values, so many ties straddle the k-th score
+            scores = [float(rng.randint(0, 6)) for _ in range(size)]
+            ranked = sorted(range(size), key=lambda index: scores[index], reverse=True)
+            for k in {1, 2, size // 3, size - 1, size, size + 5}:
+                if k <= 0:
+                    continue
+                self.assertEqual(PoolScorer.top_k(scores, k), ranked[:k], f'size {size}, k {k}')
+
+    def test_empty(self):
+        self.assertEqual(PoolScorer.top_k([], 3), [])
+        self.assertEqual(PoolScorer.top_k([1.0, 2.0], 0), [])
+
+
+class QuestionPoolTests(TestCase):
+    """Bank pools follow their questions"""
+
+    def test_moved_question_leaves_the_old_pool(self):
+        user = get_user_model().objects.create(username='author')
+        old_bank = QuestionBank.objects.create(name='Old', created_by=user)
+        new_bank = QuestionBank.objects.create(name='New', created_by=user)
+        question = Question.objects.create(question_bank=old_bank, question_text='Moved', question_type='essay')
+        self.assertEqual(list(get_bank_pool(old_bank.pk).ids), [question.pk])
+        self.assertEqual(list(get_bank_pool(new_bank.pk).ids), [])
+
+        question = Question.objects.get(pk=question.pk)
+        question.question_bank = new_bank
+        question.save()
+
+        self.assertEqual(list(get_bank_pool(old_bank.pk).ids), [])
+        self.assertEqual(list(get_bank_pool(new_bank.pk).ids), [question.pk])
@@ -146,6 +146,39 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+
+# Exam answer handling
+# The write-behind buffer needs a cache shared by all workers (REDIS_URL)
+ANSWER_WRITE_BEHIND = config('ANSWER_WRITE_BEHIND', default=False, cast=bool)
+ANSWER_BUFFER_FLUSH_INTERVAL = config('ANSWER_BUFFER_FLUSH_INTERVAL', default=5, cast=int)
+
+# Grade submissions in the background (run `manage.py grade_submissions`)
+ASYNC_SUBMISSION_GRADING = config('ASYNC_SUBMISSION_GRADING', default=False, cast=bool)
+GRADING_WORKERS = config('GRADING_WORKERS', default=4, cast=int)
+
+# Process content uploads over IMPORT_INLINE_MAX_RECORDS in the background
+# (run `manage.py run_import_workers`); otherwise every upload is processed inline
+IMPORT_BACKGROUND_JOBS = config('IMPORT_BACKGROUND_JOBS', default=False, cast=bool)
+IMPORT_INLINE_MAX_RECORDS = config('IMPORT_INLINE_MAX_RECORDS', default=2000, cast=int)
+
+# Started attempts are added to the question exposure ledger in the
+# background (run `manage.py record_question_exposure`)
+EXPOSURE_RECORD_INTERVAL = config('EXPOSURE_RECORD_INTERVAL', default=10, cast=int)
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -1,9 +1,10 @@
 from django.contrib import admin
-from .models import Exam, Test, TestSection, TestAttempt
+from core.search import SearchIndexAdminMixin
+from .models import Exam, Test, TestSection, TestAttempt, GradingJob
 
 
 @admin.register(Exam)
-class ExamAdmin(admin.ModelAdmin):
+class ExamAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
     list_display = ['name', 'category', 'created_by', 'is_active', 'test_count', 'created_at']
     list_filter = ['category', 'is_active', 'created_at']
     search_fields = ['name', 'description']
@@ -80,3 +81,11 @@ class TestAttemptAdmin(admin.ModelAdmin):
     def test_title(self, obj):
         return obj.test.title
     test_title.short_description = 'Test'
+
+
+@admin.register(GradingJob)
+class GradingJobAdmin(admin.ModelAdmin):
+    list_display = ['attempt', 'status', 'tries', 'worker', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['attempt__user__username', 'attempt__test__title']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'last_error']
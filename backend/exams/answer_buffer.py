@@ -0,0 +1,175 @@
+"""
+Write-behind buffer for in-progress answers.
+Answer saves land in the cache (Redis in production, local memory in
+development) and are persisted to UserAnswer in batches by the
+flush_answer_buffers command. Submitting or expiring an attempt forces a
+synchronous flush so no buffered answer is lost.
+
+The buffer only makes sense with a cache shared by all workers, so it is
+opt-in through the ANSWER_WRITE_BEHIND setting.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from questions.models import UserAnswer
+from .answer_key import get_attempt_answer_key
+from .answer_store import AnswerBatchWriter, answer_hash
+
+
+ENTRY_CACHE_KEY = 'answer_buffer:{attempt_id}:{question_id}'
+DIRTY_CACHE_KEY = 'answer_buffer:{attempt_id}:dirty'
+
+
+def is_enabled():
+    return getattr(settings, 'ANSWER_WRITE_BEHIND', False)
+
+
+def _cache():
+    return caches[getattr(settings, 'ANSWER_BUFFER_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'ANSWER_BUFFER_TIMEOUT', 60 * 60 * 6)
+
+
+class AnswerBuffer:
+    """Cache-backed buffer of normalized answers for one TestAttempt"""
+
+    def __init__(self, attempt):
+        self.attempt = attempt
+        self.cache = _cache()
+
+    def _entry_key(self, question_id):
+        return ENTRY_CACHE_KEY.format(attempt_id=self.attempt.pk, question_id=question_id)
+
+    @property
+    def _dirty_key(self):
+        return DIRTY_CACHE_KEY.format(attempt_id=self.attempt.pk)
+
+    def add(self, entries):
+        """
+        Merge normalized entries into the buffer and mark the attempt dirty.
+        Entries matching the buffered answer, or the stored one for questions
+        not buffered yet, are skipped. Returns saved and unchanged counts.
+        """
+        if not entries:
+            return {'saved': 0, 'unchanged': 0}
+
+        keys = {question_id: self._entry_key(question_id) for question_id in entries}
+        existing = self.cache.get_many(list(keys.values()))
+
+        unbuffered = [question_id for question_id, key in keys.items() if key not in existing]
+        stored = {}
+        if unbuffered:
+            stored = dict(
+                UserAnswer.objects.filter(
+                    test_attempt_id=self.attempt.pk, question_id__in=unbuffered
+                ).values_list('question_id', 'answer_hash')
+            )
+
+        # Heartbeats mostly resend unchanged answers
+        changed = {}
+        for question_id, key in keys.items():
+            previous = existing.get(key)
+            fields = {**(previous or {}), **entries[question_id]}
+            previous_hash = answer_hash(previous) if previous is not None else stored.get(question_id)
+            if answer_hash(fields) != previous_hash:
+                changed[question_id] = entries[question_id]
+        if not changed:
+            return {'saved': 0, 'unchanged': len(entries)}
+
+        # The revision advances when a save is accepted, not when it is flushed
+        changed = AnswerBatchWriter(self.attempt).stamp_revision(changed)
+        merged = {
+            keys[question_id]: {**(existing.get(keys[question_id]) or {}), **fields}
+            for question_id, fields in changed.items()
+        }
+
+        timeout = _timeout()
+        self.cache.set_many(merged, timeout=timeout)
+        self.cache.set(self._dirty_key, timezone.now().timestamp(), timeout=timeout)
+        return {'saved': len(merged), 'unchanged': len(entries) - len(merged)}
+
+    def pending(self):
+        """Return buffered entries keyed by question id"""
+        question_ids = list(get_attempt_answer_key(self.attempt).entries)
+        keys = {self._entry_key(question_id): question_id for question_id in question_ids}
+        found = self.cache.get_many(list(keys))
+        return {keys[key]: fields for key, fields in found.items()}
+
+    def is_dirty(self):
+        return self.cache.get(self._dirty_key) is not None
+
+    def flush(self):
+        """
+        Persist buffered entries to the database.
+
+        The dirty flag is cleared before reading so that saves arriving
+        while the flush runs mark the attempt dirty again for the next cycle.
+        Entries stay in the cache until clear() so a failed flush can retry.
+        """
+        self.cache.delete(self._dirty_key)
+        entries = self.pending()
+        if not entries:
+            return {'saved': 0, 'unchanged': 0}
+        try:
+            return AnswerBatchWriter(self.attempt).write(entries)
+        except Exception:
+            self.cache.set(self._dirty_key, timezone.now().timestamp(), timeout=_timeout())
+            raise
+
+    def clear(self):
+        question_ids = get_attempt_answer_key(self.attempt).entries
+        self.cache.delete_many([self._entry_key(question_id) for question_id in question_ids])
+        self.cache.delete(self._dirty_key)
+
+
+def flush_attempt_answers(attempt):
+    """
+    Synchronously flush and drop the buffer of an attempt that is being
+    submitted or expired. The buffer is dropped once the transaction
+    commits, so answers survive a submission that rolls back.
+    """
+    buffer = AnswerBuffer(attempt)
+    result = buffer.flush()
+    transaction.on_commit(buffer.clear)
+    return result
+
+
+def flush_dirty_attempts(batch_size=500):
+    """
+    Flush every in-progress attempt with buffered changes.
+    Returns a summary of attempts flushed and answers saved.
+    """
+    from .models import TestAttempt
+
+    cache = _cache()
+    stats = {'attempts': 0, 'saved': 0, 'errors': 0}
+    attempts = TestAttempt.objects.filter(status='in_progress').only('id', 'test_id')
+
+    pending = []
+    for attempt in attempts.iterator(chunk_size=batch_size):
+        pending.append(attempt)
+        if len(pending) >= batch_size:
+            _flush_batch(cache, pending, stats)
+            pending = []
+    if pending:
+        _flush_batch(cache, pending, stats)
+    return stats
+
+
+def _flush_batch(cache, attempts, stats):
+    dirty_keys = {DIRTY_CACHE_KEY.format(attempt_id=attempt.pk): attempt for attempt in attempts}
+    dirty = cache.get_many(list(dirty_keys))
+    for key in dirty:
+        attempt = dirty_keys[key]
+        try:
+            result = AnswerBuffer(attempt).flush()
+        except Exception:
+            stats['errors'] += 1
+            continue
+        stats['attempts'] += 1
+        stats['saved'] += result['saved']
@@ -0,0 +1,207 @@
+"""
+Precompiled answer keys for tests.
+An AnswerKey is built once per Test from its TestQuestion rows and cached in
+a process-local LRU backed by the Django cache. Keys are versioned per test
+(see cache_versions); any change to the test's questions or options bumps
+the version so stale keys are never served.
+"""
+
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from questions.models import QuestionOption, TestQuestion
+from .cache_versions import TEST_SCOPE, bump_versions, get_version
+
+
+KEY_CACHE_KEY = 'answer_key:{test_id}:{version}'
+
+
+class AnswerKeyEntry:
+    """Immutable grading data for a single question on a test"""
+
+    __slots__ = (
+        'question_type', 'marks', 'negative_marks', 'correct_options',
+        'correct_bool', 'correct_answers', 'case_sensitive',
+    )
+
+    def __init__(self, question_type, marks, negative_marks, correct_options=frozenset(),
+                 correct_bool=None, correct_answers=(), case_sensitive=False):
+        self.question_type = question_type
+        self.marks = Decimal(marks or 0)
+        self.negative_marks = Decimal(negative_marks or 0)
+        self.correct_options = frozenset(correct_options)
+        self.correct_bool = correct_bool
+        self.correct_answers = tuple(correct_answers)
+        self.case_sensitive = case_sensitive
+
+    def is_correct(self, selected_options=frozenset(), boolean_answer=None, text_answer=''):
+        """Check a candidate's response against this entry"""
+        if self.question_type == 'true_false':
+            return (
+                self.correct_bool is not None and boolean_answer is not None
+                and boolean_answer == self.correct_bool
+            )
+        if self.question_type == 'mcq':
+            return len(selected_options) == 1 and selected_options <= self.correct_options
+        if self.question_type == 'multi_select':
+            return bool(self.correct_options) and set(selected_options) == self.correct_options
+        if self.question_type == 'fill_blank' and self.correct_answers and text_answer:
+            response = text_answer.strip()
+            if self.case_sensitive:
+                return response in self.correct_answers
+            return response.lower() in {answer.lower() for answer in self.correct_answers}
+
+        # Essays and other descriptive types need manual evaluation
+        return False
+
+
+class AnswerKey:
+    """Immutable, versioned answer key for a test"""
+
+    __slots__ = ('test_id', 'version', 'entries')
+
+    def __init__(self, test_id, version, entries):
+        self.test_id = test_id
+        self.version = version
+        self.entries = entries
+
+    def __contains__(self, question_id):
+        return question_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, question_id):
+        return self.entries.get(question_id)
+
+    @property
+    def total_marks(self):
+        return sum((entry.marks for entry in self.entries.values()), Decimal('0'))
+
+    @classmethod
+    def build(cls, test_id, version):
+        """Compile the answer key for a test in two queries"""
+        rows = TestQuestion.objects.filter(test_id=test_id).values_list(
+            'question_id', 'marks', 'question__question_type', 'question__negative_marks',
+            'question__correct_answers', 'question__case_sensitive',
+        )
+        questions = {}
+        for question_id, marks, question_type, negative_marks, correct_answers, case_sensitive in rows:
+            questions[question_id] = {
+                'question_type': question_type,
+                'marks': marks,
+                'negative_marks': negative_marks,
+                'correct_options': set(),
+                'correct_bool': None,
+                'correct_answers': [str(answer).strip() for answer in (correct_answers or [])],
+                'case_sensitive': case_sensitive,
+            }
+
+        options = QuestionOption.objects.filter(
+            question__testquestion__test_id=test_id, is_correct=True
+        ).values_list('question_id', 'id', 'option_text')
+        for question_id, option_id, option_text in options:
+            data = questions.get(question_id)
+            if data is None:
+                continue
+            data['correct_options'].add(option_id)
+            if data['correct_bool'] is None:
+                data['correct_bool'] = option_text.strip().lower() == 'true'
+
+        entries = {
+            question_id: AnswerKeyEntry(**data) for question_id, data in questions.items()
+        }
+        return cls(test_id, version, entries)
+
+
+class LocalLRU:
+    """Small thread-safe LRU keyed by (owner id, version) tuples"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, owner_id):
+        """Drop every entry whose key starts with owner_id"""
+        with self._lock:
+            for key in [key for key in self._data if key[0] == owner_id]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_keys = LocalLRU(getattr(settings, 'ANSWER_KEY_LOCAL_CACHE_SIZE', 256))
+
+
+def get_test_version(test_id):
+    """
+    Return the current content version of a test.
+    Shared by everything compiled from the test's questions.
+    """
+    return get_version(TEST_SCOPE, getattr(test_id, 'pk', test_id))
+
+
+def get_answer_key(test):
+    """
+    Return the compiled AnswerKey for a test or test id.
+
+    Lookup order is the process-local LRU, then the shared Django cache, and
+    finally the database.
+    """
+    test_id = str(getattr(test, 'pk', test))
+    version = get_test_version(test_id)
+    local_key = (test_id, version)
+
+    answer_key = _local_keys.get(local_key)
+    if answer_key is not None:
+        return answer_key
+
+    shared_key = KEY_CACHE_KEY.format(test_id=test_id, version=version)
+    answer_key = cache.get(shared_key)
+    if answer_key is None:
+        answer_key = AnswerKey.build(test_id, version)
+        cache.set(shared_key, answer_key, timeout=getattr(settings, 'ANSWER_KEY_CACHE_TIMEOUT', 60 * 60 * 6))
+
+    _local_keys.set(local_key, answer_key)
+    return answer_key
+
+
+def invalidate_answer_key(*test_ids):
+    """Bump the answer key version of the given tests"""
+    test_ids = [str(getattr(test_id, 'pk', test_id)) for test_id in test_ids]
+    bump_versions(TEST_SCOPE, test_ids)
+    for test_id in test_ids:
+        _local_keys.discard(test_id)
+
+
+def get_attempt_answer_key(attempt):
+    """
+    Return the answer key an attempt is graded against: the one built from
+    its own paper when it carries one, otherwise the test's shared key.
+    """
+    if attempt.question_ids is None:
+        return get_answer_key(attempt.test_id)
+    # Import here to avoid circular imports
+    from .question_content import build_attempt_answer_key
+    return build_attempt_answer_key(attempt)
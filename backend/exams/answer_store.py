@@ -0,0 +1,265 @@
+"""
+Batched persistence of in-progress answers.
+Validates an answer sheet against the attempt's paper in one query and
+upserts every changed answer with a single INSERT ... ON CONFLICT per
+field set, skipping answers whose content hash has not changed.
+
+Every save that changes answers advances the attempt's answer_revision,
+so a delta (see TestAttemptViewSet.delta) built on older answers conflicts
+instead of overwriting them.
+"""
+
+import hashlib
+import json
+import uuid
+from typing import Dict, List, Tuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from questions.models import QuestionOption, TestQuestion, UserAnswer
+from .answer_key import get_attempt_answer_key
+from .models import TestAttempt
+
+
+OPTION_BASED_TYPES = ('mcq', 'multi_select')
+
+# Client payload keys mapped to UserAnswer fields
+PAYLOAD_FIELDS = {
+    'text_answer': 'text_answer',
+    'boolean_answer': 'boolean_answer',
+    'marked_for_review': 'is_marked_for_review',
+    'is_marked_for_review': 'is_marked_for_review',
+    'time_spent_seconds': 'time_spent_seconds',
+}
+
+
+def _parse_uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def answer_hash(fields: Dict) -> str:
+    """Stable content hash of a normalized answer entry, ignoring its revision"""
+    content = {field: value for field, value in fields.items() if field != 'revision'}
+    payload = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class AnswerBatchWriter:
+    """Validate and upsert a batch of answers for one TestAttempt"""
+
+    def __init__(self, attempt):
+        self.attempt = attempt
+
+    def normalize(self, answers: Dict) -> Tuple[Dict, List[str]]:
+        """
+        Turn a raw answer sheet into normalized field dicts keyed by question id.
+
+        Accepts either the structured form sent by the frontend
+        ({"selected_options": [...], "text_answer": ..., "marked_for_review": ...})
+        or the legacy scalar/list form. Only fields present in a structured
+        entry are written. Returns (entries, rejected_question_ids).
+        """
+        parsed = {}
+        rejected = []
+        for raw_id, value in answers.items():
+            question_id = _parse_uuid(raw_id)
+            if question_id is None:
+                rejected.append(str(raw_id))
+            else:
+                parsed[question_id] = value
+
+        if not parsed:
+            return {}, rejected
+
+        # Validate all question ids against the paper in one query
+        if self.attempt.question_ids is not None:
+            # The attempt's own paper is checked against its cached answer key instead
+            answer_key = get_attempt_answer_key(self.attempt)
+            question_types = {
+                question_id: answer_key.get(question_id).question_type
+                for question_id in parsed if question_id in answer_key
+            }
+        else:
+            question_types = dict(
+                TestQuestion.objects.filter(
+                    test_id=self.attempt.test_id, question_id__in=list(parsed)
+                ).values_list('question_id', 'question__question_type')
+            )
+        rejected.extend(str(qid) for qid in parsed if qid not in question_types)
+
+        entries = {}
+        requested_options = {}
+        for question_id, value in parsed.items():
+            question_type = question_types.get(question_id)
+            if question_type is None:
+                continue
+
+            if isinstance(value, dict):
+                fields = {
+                    field: value[key] for key, field in PAYLOAD_FIELDS.items() if key in value
+                }
+                if 'text_answer' in fields:
+                    fields['text_answer'] = str(fields['text_answer'] or '')
+                if 'boolean_answer' in fields and fields['boolean_answer'] is not None:
+                    fields['boolean_answer'] = bool(fields['boolean_answer'])
+                if 'is_marked_for_review' in fields:
+                    fields['is_marked_for_review'] = bool(fields['is_marked_for_review'])
+                if 'time_spent_seconds' in fields:
+                    try:
+                        fields['time_spent_seconds'] = max(0, int(fields['time_spent_seconds'] or 0))
+                    except (TypeError, ValueError):
+                        del fields['time_spent_seconds']
+                if 'selected_options' in value:
+                    options = value['selected_options'] or []
+                    if not isinstance(options, list):
+                        options = [options]
+                    requested_options[question_id] = options
+            elif question_type == 'true_false':
+                fields = {
+                    'boolean_answer': bool(value) if value is not None else None,
+                    'text_answer': '',
+                }
+            elif question_type in OPTION_BASED_TYPES:
+                values = value if isinstance(value, list) else ([value] if value else [])
+                fields = {
+                    'text_answer': ','.join(str(v) for v in values),
+                    'boolean_answer': None,
+                }
+                requested_options[question_id] = values
+            else:
+                fields = {
+                    'text_answer': str(value) if value else '',
+                    'boolean_answer': None,
+                }
+            entries[question_id] = fields
+
+        # Keep only option ids that belong to their question
+        if requested_options:
+            option_ids = {
+                option_id for options in requested_options.values()
+                for option_id in map(_parse_uuid, options) if option_id
+            }
+            option_owner = dict(
+                QuestionOption.objects.filter(
+                    id__in=option_ids, question_id__in=list(requested_options)
+                ).values_list('id', 'question_id')
+            )
+            for question_id, options in requested_options.items():
+                valid = []
+                for option_id in map(_parse_uuid, options):
+                    if option_id and option_owner.get(option_id) == question_id and option_id not in valid:
+                        valid.append(option_id)
+                entries[question_id]['selected_options'] = sorted(valid, key=str)
+
+        return entries, rejected
+
+    def bump_revision(self) -> int:
+        """Advance the attempt's answer revision and return the new one"""
+        TestAttempt.objects.filter(pk=self.attempt.pk).update(answer_revision=F('answer_revision') + 1)
+        self.attempt.answer_revision = TestAttempt.objects.filter(pk=self.attempt.pk).values_list(
+            'answer_revision', flat=True
+        ).get()
+        return self.attempt.answer_revision
+
+    def stamp_revision(self, entries: Dict) -> Dict:
+        """
+        Give entries that don't carry a revision (everything but deltas,
+        which claim theirs by compare-and-set) the next answer revision.
+        """
+        if not entries or all('revision' in fields for fields in entries.values()):
+            return entries
+        revision = self.bump_revision()
+        return {
+            question_id: fields if 'revision' in fields else {**fields, 'revision': revision}
+            for question_id, fields in entries.items()
+        }
+
+    def write(self, entries: Dict) -> Dict:
+        """
+        Upsert normalized entries, skipping those whose content is unchanged.
+        Returns a summary with saved and unchanged counts.
+        """
+        if not entries:
+            return {'saved': 0, 'unchanged': 0}
+
+        hashes = {question_id: answer_hash(fields) for question_id, fields in entries.items()}
+        stored = dict(
+            UserAnswer.objects.filter(
+                test_attempt_id=self.attempt.pk, question_id__in=list(entries)
+            ).values_list('question_id', 'answer_hash')
+        )
+        changed = {
+            question_id: fields for question_id, fields in entries.items()
+            if stored.get(question_id) != hashes[question_id]
+        }
+        if not changed:
+            return {'saved': 0, 'unchanged': len(entries)}
+
+        now = timezone.now()
+        with transaction.atomic():
+            changed = self.stamp_revision(changed)
+
+            # Group rows by the set of fields they carry so each group is one upsert
+            groups = {}
+            for question_id, fields in changed.items():
+                columns = tuple(sorted(field for field in fields if field != 'selected_options'))
+                groups.setdefault(columns, []).append(question_id)
+
+            for columns, question_ids in groups.items():
+                rows = []
+                for question_id in question_ids:
+                    values = {column: changed[question_id][column] for column in columns}
+                    rows.append(UserAnswer(
+                        test_attempt_id=self.attempt.pk,
+                        question_id=question_id,
+                        answer_hash=hashes[question_id],
+                        answered_at=now,
+                        **values
+                    ))
+                UserAnswer.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=['test_attempt', 'question'],
+                    update_fields=list(columns) + ['answer_hash', 'answered_at'],
+                )
+
+            self._replace_selected_options(changed)
+
+        return {'saved': len(changed), 'unchanged': len(entries) - len(changed)}
+
+    def _replace_selected_options(self, changed: Dict):
+        """Rewrite M2M selections for answers that carried selected_options"""
+        with_options = [
+            question_id for question_id, fields in changed.items() if 'selected_options' in fields
+        ]
+        if not with_options:
+            return
+
+        # Rows that hit the conflict keep the uuid generated client-side, not
+        # the id of the row already stored, so read the ids back
+        answer_ids = dict(
+            UserAnswer.objects.filter(
+                test_attempt_id=self.attempt.pk, question_id__in=with_options
+            ).values_list('question_id', 'id')
+        )
+
+        through = UserAnswer.selected_options.through
+        ids = [answer_ids[question_id] for question_id in with_options]
+        through.objects.filter(useranswer_id__in=ids).delete()
+        through.objects.bulk_create([
+            through(useranswer_id=answer_ids[question_id], questionoption_id=option_id)
+            for question_id in with_options
+            for option_id in changed[question_id]['selected_options']
+        ])
+
+    def save(self, answers: Dict) -> Dict:
+        """Normalize and persist an answer sheet in one batch"""
+        entries, rejected = self.normalize(answers)
+        summary = self.write(entries)
+        summary['rejected'] = rejected
+        return summary
@@ -2,10 +2,17 @@ from rest_framework import status, viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Count, Q
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.db.models import Count, F, Q
 from django.utils import timezone
+from core.paper_generation import generate_test_papers, variant_paper
+from core.question_selection import PaperDrawError, draw_attempt_paper
+from core.search import search_queryset
+from questions.tagging import filter_by_tags
 from .models import (
-    Exam, Test, TestSection, TestAttempt, Organization, 
+    Exam, Test, TestSection, TestAttempt, GradingJob, Organization, 
     ExamMetadata, Syllabus, Subject, SyllabusNode,
     StudentSyllabusProgress, LearningContent
 )
@@ -13,6 +20,12 @@ from .serializers import (
     ExamSerializer, TestSerializer, TestSectionSerializer,
     TestAttemptSerializer, TestDetailSerializer
 )
+from . import answer_buffer, grading_queue
+from .answer_key import get_attempt_answer_key
+from .answer_store import AnswerBatchWriter
+from .deadlines import finalize_expired_attempt
+from .grading import AttemptGrader
+from .question_paper import render_attempt_paper
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -35,7 +48,7 @@ class ExamViewSet(viewsets.ReadOnlyModelViewSet):
     
     def get_queryset(self):
         # For admin users accessing requirements or specific actions, include inactive exams
-        if (self.request.user.is_staff or self.request.user.is_superuser) and self.action in ['requirements', 'retrieve', 'update_status']:
+        if (self.request.user.is_staff or self.request.user.is_superuser) and self.action in ['requirements', 'retrieve', 'update_status', 'generate_papers']:
             queryset = Exam.objects.annotate(
                 tests_count=Count('tests')
             ).select_related('created_by', 'organization')
@@ -46,14 +59,20 @@ class ExamViewSet(viewsets.ReadOnlyModelViewSet):
         category = self.request.query_params.get('category', None)
         if category:
             queryset = queryset.filter(category=category)
+        
+        # Filter by tags (comma separated, any tag unless tag_match=all)
+        tags = self.request.query_params.get('tags', None)
+        if tags:
+            queryset = filter_by_tags(
+                queryset,
+                tags.split(','),
+                match=self.request.query_params.get('tag_match', 'any')
+            )
             
         # Search functionality
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search)
-            )
+            return search_queryset(queryset, search).order_by('-search_rank', '-created_at')
             
         return queryset.order_by('-created_at')
     
@@ -71,7 +90,8 @@ class ExamViewSet(viewsets.ReadOnlyModelViewSet):
         exam = self.get_object()
         tests = Test.objects.filter(
             exam=exam, 
-            status='active'
+            status='active',
+            variant_of__isnull=True
         ).select_related('created_by').annotate(
             questions_count=Count('test_questions'),
             attempts_count=Count('attempts')
@@ -119,6 +139,44 @@ class ExamViewSet(viewsets.ReadOnlyModelViewSet):
             'status': new_status,
             'requirements': updated_requirements
         })
+    
+    @action(detail=True, methods=['post'])
+    def generate_papers(self, request, pk=None):
+        """
+        Generate question papers for the exam's tests from their linked question banks.
+        Optional body: tests (ids, default all), variants (per test), seed, overwrite.
+        """
+        if not (request.user.is_staff or request.user.is_superuser):
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        
+        exam = self.get_object()
+        try:
+            variants = int(request.data.get('variants', 0))
+        except (TypeError, ValueError):
+            return Response({'error': 'variants must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        max_variants = getattr(settings, 'PAPER_GENERATION_MAX_VARIANTS', 26)
+        if not 0 <= variants <= max_variants:
+            return Response(
+                {'error': f'variants must be between 0 and {max_variants}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        tests = Test.objects.filter(exam=exam, variant_of__isnull=True)
+        test_ids = request.data.get('tests')
+        if test_ids:
+            tests = tests.filter(id__in=test_ids)
+        
+        summary = generate_test_papers(
+            tests,
+            variants=variants,
+            seed=request.data.get('seed'),
+            overwrite=bool(request.data.get('overwrite', False)),
+        )
+        return Response({
+            'generated': sum(1 for row in summary if row['status'] == 'generated'),
+            'skipped': sum(1 for row in summary if row['status'] == 'skipped'),
+            'tests': summary,
+        })
 
 
 class TestViewSet(viewsets.ReadOnlyModelViewSet):
@@ -126,7 +184,7 @@ class TestViewSet(viewsets.ReadOnlyModelViewSet):
     ViewSet for listing and retrieving tests.
     Students can view test details before purchasing.
     """
-    queryset = Test.objects.filter(status='active').select_related(
+    queryset = Test.objects.filter(status='active', variant_of__isnull=True).select_related(
         'exam', 'created_by'
     ).prefetch_related('sections').annotate(
         questions_count=Count('test_questions'),
@@ -250,12 +308,25 @@ class TestViewSet(viewsets.ReadOnlyModelViewSet):
         # Calculate attempt number
         attempt_number = TestAttempt.objects.filter(test=test, user=user).count() + 1
         
-        # Generate questions if test doesn't have any
-        total_questions_count = test.test_questions.count()
-        if total_questions_count == 0:
-            print(f"DEBUG: No questions found for test {test.title}, generating from question banks...")
-            total_questions_count = self._generate_test_questions(test)
-            print(f"DEBUG: Generated {total_questions_count} questions")
+        # Draw this attempt's own paper when the test is in per-attempt mode,
+        # or sit the candidate's variant of a test with variants
+        try:
+            paper = draw_attempt_paper(test) or variant_paper(test, user)
+        except PaperDrawError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if paper is not None:
+            question_ids, question_marks = paper
+            total_questions_count = len(question_ids)
+        else:
+            question_ids = question_marks = None
+            # Generate questions if test doesn't have any
+            total_questions_count = test.test_questions.count()
+            if total_questions_count == 0:
+                print(f"DEBUG: No questions found for test {test.title}, generating from question banks...")
+                total_questions_count = self._generate_test_questions(test)
+                print(f"DEBUG: Generated {total_questions_count} questions")
         
         # Create new attempt
         attempt = TestAttempt.objects.create(
@@ -263,7 +334,9 @@ class TestViewSet(viewsets.ReadOnlyModelViewSet):
             user=user,
             attempt_number=attempt_number,
             status='in_progress',
-            total_questions=total_questions_count
+            total_questions=total_questions_count,
+            question_ids=question_ids,
+            question_marks=question_marks
         )
         
         serializer = TestAttemptSerializer(attempt)
@@ -271,54 +344,8 @@ class TestViewSet(viewsets.ReadOnlyModelViewSet):
     
     def _generate_test_questions(self, test):
         """Generate questions for a test from its linked question banks"""
-        import random
-        from questions.models import TestQuestion
-        from django.db import transaction
-        
-        with transaction.atomic():
-            # Clear any existing questions
-            TestQuestion.objects.filter(test=test).delete()
-            
-            total_generated = 0
-            test_questions = []
-            
-            # Get all question bank links for this test
-            test_question_banks = test.test_question_banks.all()
-            
-            for tqb in test_question_banks:
-                bank = tqb.question_bank
-                requested_count = tqb.question_count
-                
-                # Get available questions from this bank
-                available_questions = list(bank.questions.all())
-                
-                # Select random questions (up to requested count)
-                if available_questions:
-                    selected_count = min(len(available_questions), requested_count)
-                    selected_questions = random.sample(available_questions, selected_count)
-                    
-                    # Create TestQuestion objects
-                    for order, question in enumerate(selected_questions):
-                        test_questions.append(
-                            TestQuestion(
-                                test=test,
-                                question=question,
-                                order=total_generated + order + 1,
-                                marks=question.marks or 1  # Use question's marks or default to 1
-                            )
-                        )
-                    
-                    total_generated += selected_count
-                    print(f"DEBUG: Selected {selected_count} questions from {bank.name}")
-                else:
-                    print(f"DEBUG: No questions available in bank {bank.name}")
-            
-            # Bulk create all test questions
-            if test_questions:
-                TestQuestion.objects.bulk_create(test_questions)
-                print(f"DEBUG: Created {len(test_questions)} TestQuestion objects")
-            
-            return total_generated
+        summary = generate_test_papers([test], overwrite=True)
+        return summary[0]['generated'] if summary else 0
 
 
 class TestAttemptViewSet(viewsets.ReadOnlyModelViewSet):
@@ -346,22 +373,59 @@ class TestAttemptViewSet(viewsets.ReadOnlyModelViewSet):
                 'error': 'Test attempt not completed yet'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        # Attempts submitted through the grading queue may not be graded yet
+        job = GradingJob.objects.filter(attempt=attempt).only('status').first()
+        if job and job.status in ('queued', 'running'):
+            return Response({
+                'id': str(attempt.id),
+                'status': attempt.status,
+                'grading_status': job.status,
+            }, status=status.HTTP_202_ACCEPTED)
+        if job and job.status == 'failed':
+            return Response({
+                'error': 'Grading failed for this attempt',
+                'grading_status': job.status,
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
         # Return detailed results
         data = TestAttemptSerializer(attempt).data
         
-        # Add additional result details if test allows review
+        # Add question-wise results if test allows review
         if attempt.test.allow_review:
-            # This would include question-wise results
-            # For now, just return basic attempt data
-            pass
+            data['question_results'] = self._question_results(attempt)
         
         return Response(data)
     
-    @action(detail=True, methods=['post'])
-    def auto_save(self, request, pk=None):
-        """Auto-save answers for a test attempt"""
-        attempt = self.get_object()
-        
+    def _question_results(self, attempt):
+        """Build per-question results from the cached answer key"""
+        from questions.models import UserAnswer
+        
+        answer_key = get_attempt_answer_key(attempt)
+        selected_map = {}
+        through = UserAnswer.selected_options.through
+        for answer_id, option_id in through.objects.filter(
+            useranswer__test_attempt=attempt
+        ).values_list('useranswer_id', 'questionoption_id'):
+            selected_map.setdefault(answer_id, []).append(str(option_id))
+        
+        results = []
+        answers = UserAnswer.objects.filter(test_attempt=attempt).values_list(
+            'id', 'question_id', 'is_correct', 'marks_obtained'
+        )
+        for answer_id, question_id, is_correct, marks_obtained in answers:
+            entry = answer_key.get(question_id)
+            results.append({
+                'question_id': str(question_id),
+                'is_correct': is_correct,
+                'marks_obtained': marks_obtained,
+                'max_marks': entry.marks if entry else None,
+                'selected_options': selected_map.get(answer_id, []),
+                'correct_options': [str(option_id) for option_id in entry.correct_options] if entry else [],
+            })
+        return results
+    
+    def _answer_window_error(self, request, attempt):
+        """Return an error response if answers can't be saved for the attempt"""
         # Verify the attempt belongs to the current user and is in progress
         if attempt.user != request.user:
             return Response({
@@ -373,7 +437,7 @@ class TestAttemptViewSet(viewsets.ReadOnlyModelViewSet):
                 'error': 'Test attempt is not in progress'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Server-side time validation for auto-save
+        # Server-side time validation for saving answers
         current_time = timezone.now()
         test_duration = timezone.timedelta(minutes=attempt.test.duration_minutes)
         allowed_end_time = attempt.start_time + test_duration
@@ -387,6 +451,17 @@ class TestAttemptViewSet(viewsets.ReadOnlyModelViewSet):
                 'message': 'Cannot save answers after test time has expired'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        return None
+    
+    @action(detail=True, methods=['post'])
+    def auto_save(self, request, pk=None):
+        """Auto-save answers for a test attempt"""
+        attempt = self.get_object()
+        
+        error_response = self._answer_window_error(request, attempt)
+        if error_response:
+            return error_response
+        
         # Get answers from request
         answers = request.data.get('answers', {})
         
@@ -396,59 +471,21 @@ class TestAttemptViewSet(viewsets.ReadOnlyModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Import here to avoid circular imports
-            from questions.models import UserAnswer, Question
-            
-            # Update or create user answers
-            saved_count = 0
-            for question_id, answer_data in answers.items():
-                try:
-                    # Validate question exists
-                    question = Question.objects.get(id=question_id)
-                    
-                    # Get or create user answer
-                    user_answer, created = UserAnswer.objects.get_or_create(
-                        test_attempt=attempt,
-                        question=question,
-                        defaults={
-                            'text_answer': '',
-                            'boolean_answer': None,
-                        }
-                    )
-                    
-                    # Update answer based on question type
-                    if question.question_type == 'true_false':
-                        user_answer.boolean_answer = bool(answer_data) if answer_data is not None else None
-                        user_answer.text_answer = ''
-                    elif question.question_type in ['mcq', 'multi_select']:
-                        # For MCQ/Multi-select, answer_data could be string or list
-                        if isinstance(answer_data, list):
-                            user_answer.text_answer = ','.join(str(a) for a in answer_data)
-                        else:
-                            user_answer.text_answer = str(answer_data) if answer_data else ''
-                        user_answer.boolean_answer = None
-                    else:
-                        # For text-based questions
-                        user_answer.text_answer = str(answer_data) if answer_data else ''
-                        user_answer.boolean_answer = None
-                    
-                    user_answer.save()
-                    saved_count += 1
-                    
-                except Question.DoesNotExist:
-                    # Skip invalid question IDs
-                    continue
-                except Exception as e:
-                    # Log error but continue with other answers
-                    print(f"Error saving answer for question {question_id}: {e}")
-                    continue
-            
-            # Update attempt's last activity time
-            attempt.save()
+            writer = AnswerBatchWriter(attempt)
+            if answer_buffer.is_enabled():
+                # Buffer answers; flush_answer_buffers persists them in batches
+                entries, rejected = writer.normalize(answers)
+                result = answer_buffer.AnswerBuffer(attempt).add(entries)
+                result['rejected'] = rejected
+            else:
+                # Validate and upsert the whole answer sheet in one batch
+                result = writer.save(answers)
             
             return Response({
                 'success': True,
-                'saved_answers': saved_count,
+                'saved_answers': result['saved'],
+                'unchanged_answers': result['unchanged'],
+                'rejected_questions': result['rejected'],
                 'timestamp': timezone.now().isoformat()
             }, status=status.HTTP_200_OK)
             
@@ -484,12 +521,8 @@ class TestAttemptViewSet(viewsets.ReadOnlyModelViewSet):
         # Check if test time has expired (allow 30 seconds grace period for network delays)
         grace_period = timezone.timedelta(seconds=30)
         if current_time > allowed_end_time + grace_period:
-            # Auto-submit as time expired
-            attempt.status = 'submitted'
-            attempt.end_time = allowed_end_time  # Use the actual end time, not current time
-            time_spent = (attempt.end_time - attempt.start_time).total_seconds()
-            attempt.time_spent_seconds = int(time_spent)
-            attempt.save()
+            # Auto-submit and grade as of the actual end time, not current time
+            finalize_expired_attempt(attempt)
             
             return Response({
                 'error': 'Test time has expired',
@@ -497,6 +530,20 @@ class TestAttemptViewSet(viewsets.ReadOnlyModelViewSet):
                 'message': 'Test was automatically submitted due to time expiry'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        if grading_queue.is_enabled():
+            # Queue grading so the request stays fast during end-of-exam surges
+            job = grading_queue.submit_attempt(attempt)
+            if job is None:
+                return Response({
+                    'error': 'Test attempt is not in progress'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'id': str(attempt.id),
+                'status': attempt.status,
+                'grading_status': job.status,
+                'status_url': self.reverse_action('results', args=[attempt.pk]),
+            }, status=status.HTTP_202_ACCEPTED)
+        
         try:
             # Mark as submitted
             attempt.status = 'submitted'
@@ -506,75 +553,10 @@ class TestAttemptViewSet(viewsets.ReadOnlyModelViewSet):
             time_spent = (attempt.end_time - attempt.start_time).total_seconds()
             attempt.time_spent_seconds = int(time_spent)
             
-            # Calculate score and evaluation
-            from questions.models import UserAnswer
-            user_answers = UserAnswer.objects.filter(test_attempt=attempt)
-            
-            total_questions = attempt.total_questions
-            attempted_count = 0
-            correct_count = 0
-            total_marks = 0
-            
-            for answer in user_answers:
-                question = answer.question
-                
-                # Count as attempted if any answer is provided
-                if (answer.text_answer or 
-                    answer.boolean_answer is not None or 
-                    answer.selected_options.exists()):
-                    attempted_count += 1
-                    
-                    # Check if answer is correct
-                    is_correct = False
-                    
-                    if question.question_type == 'true_false':
-                        # For true/false questions, check if boolean_answer matches correct answer
-                        correct_option = question.options.filter(is_correct=True).first()
-                        if correct_option and answer.boolean_answer is not None:
-                            # Convert option text to boolean for comparison
-                            correct_bool = correct_option.option_text.lower() == 'true'
-                            is_correct = answer.boolean_answer == correct_bool
-                    
-                    elif question.question_type == 'mcq':
-                        # For single choice questions
-                        selected_options = answer.selected_options.all()
-                        if selected_options.count() == 1:
-                            correct_options = question.options.filter(is_correct=True)
-                            is_correct = selected_options.first() in correct_options
-                    
-                    elif question.question_type == 'multi_select':
-                        # For multiple choice questions
-                        selected_options = set(answer.selected_options.all())
-                        correct_options = set(question.options.filter(is_correct=True))
-                        is_correct = selected_options == correct_options
-                    
-                    # For text-based questions (fill_blank, essay), manual evaluation needed
-                    # For now, mark as incorrect unless manually evaluated
-                    
-                    if is_correct:
-                        correct_count += 1
-                        # Get marks from TestQuestion relationship
-                        test_question = attempt.test.test_questions.filter(question=question).first()
-                        question_marks = test_question.marks if test_question else 1
-                        total_marks += question_marks
-                    
-                    # Update answer record
-                    answer.is_correct = is_correct
-                    test_question = attempt.test.test_questions.filter(question=question).first()
-                    answer.marks_obtained = test_question.marks if (is_correct and test_question) else 0
-                    answer.save()
-            
-            # Update attempt with calculated values
-            attempt.attempted_questions = attempted_count
-            attempt.correct_answers = correct_count
-            attempt.marks_obtained = total_marks
-            
-            # Calculate percentage
-            max_marks = attempt.test.total_marks
-            if max_marks > 0:
-                attempt.percentage = (total_marks / max_marks) * 100
-            else:
-                attempt.percentage = 0
+            # Persist any buffered answers, then grade in a constant number of queries
+            if answer_buffer.is_enabled():
+                answer_buffer.flush_attempt_answers(attempt)
+            AttemptGrader(attempt).grade()
             
             attempt.save()
             
@@ -598,31 +580,166 @@ class TestAttemptViewSet(viewsets.ReadOnlyModelViewSet):
             }, status=status.HTTP_403_FORBIDDEN)
         
         try:
-            # Import here to avoid circular imports
-            from questions.serializers import QuestionSerializer
-            
-            # Get test questions in order
-            test_questions = attempt.test.test_questions.select_related('question').order_by('order')
-            questions_data = []
-            
-            for test_question in test_questions:
-                question_serializer = QuestionSerializer(test_question.question)
-                # Create nested structure matching frontend expectations
-                test_question_data = {
-                    'id': str(test_question.id),
-                    'question': question_serializer.data,  # Nested question object
-                    'order': test_question.order,
-                    'marks': test_question.marks
-                }
-                questions_data.append(test_question_data)
-            
-            return Response(questions_data, status=status.HTTP_200_OK)
+            # Serve the pre-rendered paper; randomized tests get a per-attempt permutation
+            body, etag = render_attempt_paper(attempt)
+            if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = HttpResponse(body, content_type='application/json')
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
             
         except Exception as e:
             return Response({
                 'error': f'Failed to get questions: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    def _serialize_answers(self, attempt, since_revision=None):
+        """Serialize the attempt's answers, optionally only those changed after a revision"""
+        # Import here to avoid circular imports
+        from questions.models import UserAnswer
+        
+        # Get user answers for this attempt
+        user_answers = UserAnswer.objects.filter(test_attempt=attempt).select_related(
+            'question'
+        ).prefetch_related('selected_options')
+        if since_revision is not None:
+            user_answers = user_answers.filter(revision__gt=since_revision)
+        answers_data = []
+        
+        for answer in user_answers:
+            answer_data = {
+                'question_id': str(answer.question.id),
+                'text_answer': answer.text_answer,
+                'boolean_answer': answer.boolean_answer,
+                'marked_for_review': answer.is_marked_for_review,
+                'time_spent_seconds': answer.time_spent_seconds,
+                'revision': answer.revision,
+            }
+            
+            # Get selected options for MCQ/multi-select
+            if answer.question.question_type in ['mcq', 'multi_select']:
+                selected_options = answer.selected_options.all()
+                answer_data['selected_options'] = [str(opt.id) for opt in selected_options]
+            
+            answers_data.append(answer_data)
+        
+        # Overlay answers still waiting in the write-behind buffer
+        if answer_buffer.is_enabled():
+            answers_data = self._overlay_buffered_answers(attempt, answers_data, since_revision)
+        
+        return answers_data
+    
+    def _overlay_buffered_answers(self, attempt, answers_data, since_revision=None):
+        """Merge buffered, not yet flushed answers over the stored ones"""
+        pending = answer_buffer.AnswerBuffer(attempt).pending()
+        if since_revision is not None:
+            pending = {
+                question_id: fields for question_id, fields in pending.items()
+                if fields.get('revision', 0) > since_revision
+            }
+        if not pending:
+            return answers_data
+        
+        answer_key = get_attempt_answer_key(attempt)
+        by_question = {item['question_id']: item for item in answers_data}
+        for question_id, fields in pending.items():
+            item = by_question.setdefault(str(question_id), {
+                'question_id': str(question_id),
+                'text_answer': '',
+                'boolean_answer': None,
+                'marked_for_review': False,
+                'time_spent_seconds': 0,
+                'revision': 0,
+            })
+            for field in ('text_answer', 'boolean_answer', 'time_spent_seconds', 'revision'):
+                if field in fields:
+                    item[field] = fields[field]
+            if 'is_marked_for_review' in fields:
+                item['marked_for_review'] = fields['is_marked_for_review']
+            entry = answer_key.get(question_id)
+            if entry and entry.question_type in ['mcq', 'multi_select']:
+                if 'selected_options' in fields:
+                    item['selected_options'] = [str(option_id) for option_id in fields['selected_options']]
+                else:
+                    item.setdefault('selected_options', [])
+        return list(by_question.values())
+    
+    @action(detail=True, methods=['get', 'post'])
+    def delta(self, request, pk=None):
+        """
+        Revision-based answer sync.
+        
+        POST {"base_revision": N, "answers": {question_id: entry}} applies only
+        the changed entries if N is the attempt's current revision and returns
+        the new revision; stale or out-of-order deltas get 409 with the current
+        revision. GET ?since=N returns the answers changed after revision N.
+        """
+        attempt = self.get_object()
+        
+        if request.method == 'GET':
+            if attempt.user != request.user:
+                return Response({
+                    'error': 'Access denied'
+                }, status=status.HTTP_403_FORBIDDEN)
+            try:
+                since = int(request.query_params.get('since', 0))
+            except (TypeError, ValueError):
+                return Response({
+                    'error': 'Invalid revision'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'revision': attempt.answer_revision,
+                'answers': self._serialize_answers(attempt, since_revision=since),
+            }, status=status.HTTP_200_OK)
+        
+        error_response = self._answer_window_error(request, attempt)
+        if error_response:
+            return error_response
+        
+        answers = request.data.get('answers', {})
+        try:
+            base_revision = int(request.data.get('base_revision'))
+        except (TypeError, ValueError):
+            base_revision = None
+        if not isinstance(answers, dict) or base_revision is None:
+            return Response({
+                'error': 'Invalid delta format'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        writer = AnswerBatchWriter(attempt)
+        entries, rejected = writer.normalize(answers)
+        new_revision = base_revision + 1
+        for fields in entries.values():
+            fields['revision'] = new_revision
+        
+        with transaction.atomic():
+            # Compare-and-set on the revision rejects stale deltas without reading answers
+            applied = TestAttempt.objects.filter(
+                pk=attempt.pk, status='in_progress', answer_revision=base_revision
+            ).update(answer_revision=F('answer_revision') + 1)
+            if not applied:
+                current = TestAttempt.objects.filter(pk=attempt.pk).values_list(
+                    'answer_revision', flat=True
+                ).first()
+                return Response({
+                    'error': 'Stale revision',
+                    'revision': current,
+                }, status=status.HTTP_409_CONFLICT)
+            
+            if answer_buffer.is_enabled():
+                saved = answer_buffer.AnswerBuffer(attempt).add(entries)['saved']
+            else:
+                saved = writer.write(entries)['saved']
+        
+        return Response({
+            'success': True,
+            'revision': new_revision,
+            'saved_answers': saved,
+            'rejected_questions': rejected,
+        }, status=status.HTTP_200_OK)
+    
     @action(detail=True, methods=['get'])
     def answers(self, request, pk=None):
         """Get user answers for a test attempt"""
@@ -635,29 +752,7 @@ class TestAttemptViewSet(viewsets.ReadOnlyModelViewSet):
             }, status=status.HTTP_403_FORBIDDEN)
         
         try:
-            # Import here to avoid circular imports
-            from questions.models import UserAnswer
-            
-            # Get user answers for this attempt
-            user_answers = UserAnswer.objects.filter(test_attempt=attempt).select_related('question')
-            answers_data = []
-            
-            for answer in user_answers:
-                answer_data = {
-                    'question_id': str(answer.question.id),
-                    'text_answer': answer.text_answer,
-                    'boolean_answer': answer.boolean_answer,
-                    'marked_for_review': answer.is_marked_for_review,
-                    'time_spent_seconds': answer.time_spent_seconds,
-                }
-                
-                # Get selected options for MCQ/multi-select
-                if answer.question.question_type in ['mcq', 'multi_select']:
-                    selected_options = answer.selected_options.all()
-                    answer_data['selected_options'] = [str(opt.id) for opt in selected_options]
-                
-                answers_data.append(answer_data)
-            
+            answers_data = self._serialize_answers(attempt)
             return Response(answers_data, status=status.HTTP_200_OK)
             
         except Exception as e:
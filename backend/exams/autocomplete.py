@@ -0,0 +1,327 @@
+"""
+In-memory prefix index for exam search-as-you-type.
+Exam names, organization names, short names and aliases are kept as
+lower-cased keys in sorted arrays, together with every word-suffix of a
+name and the acronyms of those, so "cgl" finds both "SSC CGL" and "SSC
+Combined Graduate Level". A keystroke is a binary search plus a short walk
+over the matching range, and results (including organization exam counts)
+are precomputed, so no query runs.
+
+The index loads on first use with two queries. Saves and deletes of exams
+and organizations update this process's copy incrementally after commit
+and bump a version token in the shared cache, which makes other processes
+reload. Bulk writes bypass signals, so an index is also reloaded once it is
+older than EXAM_AUTOCOMPLETE_MAX_AGE seconds.
+
+Exam aliases are read from custom_fields['aliases'].
+"""
+
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Exam, Organization
+
+
+VERSION_CACHE_KEY = 'exam_autocomplete:version'
+
+EXAM_FIELDS = ('id', 'name', 'category', 'year', 'organization_id', 'custom_fields')
+ORGANIZATION_FIELDS = ('id', 'name', 'short_name')
+
+MIN_QUERY_LENGTH = 2
+MAX_SUFFIX_WORDS = 8
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """Lower-cased words of text joined by single spaces"""
+    return ' '.join(_WORD_RE.findall(str(text or '').lower()))
+
+
+def index_keys(name, aliases=()):
+    """Keys a name is found under: each word-suffix and its acronym, and the aliases"""
+    words = normalize(name).split()
+    keys = set()
+    for start in range(min(len(words), MAX_SUFFIX_WORDS)):
+        keys.add(' '.join(words[start:]))
+        if len(words) - start > 1:
+            keys.add(''.join(word[0] for word in words[start:]))
+    keys.update(normalize(alias) for alias in aliases)
+    keys.discard('')
+    return keys
+
+
+def _aliases(custom_fields):
+    aliases = (custom_fields or {}).get('aliases') if isinstance(custom_fields, dict) else None
+    return [alias for alias in aliases if isinstance(alias, str)] if isinstance(aliases, list) else []
+
+
+class AutocompleteIndex:
+    """Sorted (key, id) arrays of exams and organizations plus their ready-made results"""
+
+    def __init__(self, version, exam_rows, organization_rows):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.organizations = {str(row['id']): row for row in organization_rows}
+        self.exams = {}
+        self.exam_keys = []
+        self.organization_keys = []
+        # Organization id -> sorted (normalized name, exam id) of its exams
+        self.organization_exams = {}
+        self.exam_results = {}
+        self.organization_results = {}
+
+        for row in exam_rows:
+            self._put_exam(row, sort=False)
+        for organization_id in self.organizations:
+            self._put_organization_keys(organization_id, sort=False)
+        self.exam_keys.sort()
+        self.organization_keys.sort()
+        for members in self.organization_exams.values():
+            members.sort()
+        for organization_id in self.organizations:
+            self._refresh_organization_result(organization_id)
+
+    @classmethod
+    def load(cls, version):
+        return cls(
+            version,
+            list(Exam.objects.values(*EXAM_FIELDS)),
+            list(Organization.objects.values(*ORGANIZATION_FIELDS)),
+        )
+
+    # Lookups
+
+    @staticmethod
+    def _walk(keys, prefix, limit, found=None):
+        found = found if found is not None else []
+        seen = set(found)
+        for position in range(bisect_left(keys, (prefix,)), len(keys)):
+            if len(found) >= limit:
+                break
+            key, item_id = keys[position]
+            if not key.startswith(prefix):
+                break
+            if item_id not in seen:
+                seen.add(item_id)
+                found.append(item_id)
+        return found
+
+    def search(self, query, exam_limit=10, organization_limit=5):
+        """
+        Exams whose keys start with query, topped up with exams of matching
+        organizations, then the matching organizations themselves.
+        """
+        prefix = normalize(query)
+        if len(prefix) < MIN_QUERY_LENGTH:
+            return []
+        exam_ids = self._walk(self.exam_keys, prefix, exam_limit)
+        organization_ids = self._walk(self.organization_keys, prefix, organization_limit)
+        for organization_id in organization_ids:
+            members = self.organization_exams.get(organization_id, ())
+            exam_ids = self._walk(members, '', exam_limit, found=exam_ids)
+        return (
+            [self.exam_results[exam_id] for exam_id in exam_ids]
+            + [self.organization_results[organization_id] for organization_id in organization_ids]
+        )
+
+    # Incremental updates; callers apply them to a copy (see copy())
+
+    def copy(self, version):
+        clone = object.__new__(AutocompleteIndex)
+        clone.version = version
+        clone.loaded_at = self.loaded_at
+        clone.organizations = dict(self.organizations)
+        clone.exams = dict(self.exams)
+        clone.exam_keys = list(self.exam_keys)
+        clone.organization_keys = list(self.organization_keys)
+        # Member lists are replaced, never changed in place, so sharing them is safe
+        clone.organization_exams = dict(self.organization_exams)
+        clone.exam_results = dict(self.exam_results)
+        clone.organization_results = dict(self.organization_results)
+        return clone
+
+    @staticmethod
+    def _remove_keys(keys, item_id, names):
+        for name in names:
+            position = bisect_left(keys, (name, item_id))
+            if position < len(keys) and keys[position] == (name, item_id):
+                del keys[position]
+
+    @staticmethod
+    def _add_keys(keys, item_id, names, sort=True):
+        for name in names:
+            if sort:
+                insort(keys, (name, item_id))
+            else:
+                keys.append((name, item_id))
+
+    def _exam_result(self, row):
+        organization = self.organizations.get(str(row['organization_id'])) if row['organization_id'] else None
+        return {
+            'id': str(row['id']),
+            'text': row['name'],
+            'organization': organization['name'] if organization else 'N/A',
+            'category': row['category'],
+            'year': row['year'] or 'N/A',
+            'url': f"/exams/{row['id']}/",
+        }
+
+    def _refresh_organization_result(self, organization_id):
+        row = self.organizations[organization_id]
+        self.organization_results[organization_id] = {
+            'id': f'org_{organization_id}',
+            'text': row['name'],
+            'type': 'organization',
+            'exams_count': len(self.organization_exams.get(organization_id, ())),
+            'url': f'/exams/organization/{organization_id}/',
+        }
+
+    def _put_exam(self, row, sort=True):
+        exam_id = str(row['id'])
+        keys = index_keys(row['name'], _aliases(row['custom_fields']))
+        self.exams[exam_id] = (row, keys)
+        self.exam_results[exam_id] = self._exam_result(row)
+        self._add_keys(self.exam_keys, exam_id, keys, sort=sort)
+        if row['organization_id']:
+            organization_id = str(row['organization_id'])
+            if sort:
+                members = list(self.organization_exams.get(organization_id, ()))
+                self._add_keys(members, exam_id, [normalize(row['name'])])
+                self.organization_exams[organization_id] = members
+            else:
+                self.organization_exams.setdefault(organization_id, []).append((normalize(row['name']), exam_id))
+
+    def _drop_exam(self, exam_id):
+        previous = self.exams.pop(exam_id, None)
+        if previous is None:
+            return None
+        row, keys = previous
+        del self.exam_results[exam_id]
+        self._remove_keys(self.exam_keys, exam_id, keys)
+        if row['organization_id']:
+            organization_id = str(row['organization_id'])
+            members = list(self.organization_exams.get(organization_id, ()))
+            self._remove_keys(members, exam_id, [normalize(row['name'])])
+            self.organization_exams[organization_id] = members
+        return row['organization_id']
+
+    def _put_organization_keys(self, organization_id, sort=True):
+        row = self.organizations[organization_id]
+        self._add_keys(
+            self.organization_keys, organization_id, index_keys(row['name'], [row['short_name']]), sort=sort
+        )
+
+    def update_exam(self, row=None, exam_id=None):
+        """Replace (or with row None, remove) one exam"""
+        exam_id = str(row['id']) if row is not None else str(exam_id)
+        touched = {self._drop_exam(exam_id)}
+        if row is not None:
+            self._put_exam(row)
+            touched.add(row['organization_id'])
+        for organization_id in touched:
+            if organization_id and str(organization_id) in self.organizations:
+                self._refresh_organization_result(str(organization_id))
+
+    def update_organization(self, row=None, organization_id=None):
+        """Replace (or with row None, remove) one organization"""
+        organization_id = str(row['id']) if row is not None else str(organization_id)
+        previous = self.organizations.pop(organization_id, None)
+        if previous is not None:
+            self._remove_keys(
+                self.organization_keys, organization_id, index_keys(previous['name'], [previous['short_name']])
+            )
+            self.organization_results.pop(organization_id, None)
+        if row is not None:
+            self.organizations[organization_id] = row
+            self._put_organization_keys(organization_id)
+            self._refresh_organization_result(organization_id)
+
+        # Exam results carry the organization's name
+        for _, exam_id in self.organization_exams.get(organization_id, ()):
+            self.exam_results[exam_id] = self._exam_result(self.exams[exam_id][0])
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def _current_version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def get_autocomplete_index():
+    """This process's index, reloaded when another process changed the data or it grew old"""
+    global _index
+    version = _current_version()
+    max_age = getattr(settings, 'EXAM_AUTOCOMPLETE_MAX_AGE', 300)
+    index = _index
+    if index is None or index.version != version or time.monotonic() - index.loaded_at > max_age:
+        with _lock:
+            index = _index
+            if index is None or index.version != version or time.monotonic() - index.loaded_at > max_age:
+                index = _index = AutocompleteIndex.load(version)
+    return index
+
+
+def autocomplete(query, exam_limit=10, organization_limit=5):
+    """Up to exam_limit exams and organization_limit organizations matching a typed prefix"""
+    return get_autocomplete_index().search(query, exam_limit, organization_limit)
+
+
+def _apply(update):
+    """
+    Apply an update to a copy of this process's index and publish a new
+    version. A copy that was already behind is dropped and reloads instead.
+    """
+    global _index
+    with _lock:
+        previous = cache.get(VERSION_CACHE_KEY)
+        version = uuid.uuid4().hex
+        cache.set(VERSION_CACHE_KEY, version, timeout=None)
+        index = _index
+        if index is None or index.version != previous or update is None:
+            _index = None
+            return
+        index = index.copy(version)
+        update(index)
+        _index = index
+
+
+def _row(instance, fields):
+    """Indexed values of a saved instance, or None if any were deferred"""
+    data = instance.__dict__
+    if any(field not in data for field in fields):
+        return None
+    return {field: data[field] for field in fields}
+
+
+def exam_saved(exam):
+    row = _row(exam, EXAM_FIELDS)
+    transaction.on_commit(lambda: _apply(row and (lambda index: index.update_exam(row))))
+
+
+def exam_deleted(exam):
+    exam_id = exam.pk
+    transaction.on_commit(lambda: _apply(lambda index: index.update_exam(exam_id=exam_id)))
+
+
+def organization_saved(organization):
+    row = _row(organization, ORGANIZATION_FIELDS)
+    transaction.on_commit(lambda: _apply(row and (lambda index: index.update_organization(row))))
+
+
+def organization_deleted(organization):
+    organization_id = organization.pk
+    transaction.on_commit(lambda: _apply(lambda index: index.update_organization(organization_id=organization_id)))
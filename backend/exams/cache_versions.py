@@ -0,0 +1,44 @@
+"""
+Database-backed version counters for cached, derived data.
+Answer keys, papers, question pools and question contents are cached under
+(id, version) in a process-local LRU and the Django cache. The versions
+used to live in the Django cache too, which is per process unless REDIS_URL
+is set, so a bump in one gunicorn worker never reached the others. They are
+now CacheVersion rows: reading them is one indexed query per batch of ids,
+and a bump is part of the transaction that changed the data.
+"""
+
+from django.db.models import F
+
+from .models import CacheVersion
+
+
+TEST_SCOPE = 'test'
+POOL_SCOPE = 'question_pool'
+QUESTION_SCOPE = 'question'
+EXPOSURE_SCOPE = 'question_exposure'
+
+
+def get_versions(scope, keys):
+    """{key: version} for the given keys (as strings); never-bumped keys are at 0"""
+    keys = [str(key) for key in keys]
+    found = dict(
+        CacheVersion.objects.filter(scope=scope, key__in=keys).values_list('key', 'version')
+    )
+    return {key: found.get(key, 0) for key in keys}
+
+
+def get_version(scope, key):
+    return get_versions(scope, [key])[str(key)]
+
+
+def bump_versions(scope, keys):
+    """Advance the version of each key by one"""
+    # Sorted so concurrent bumps insert rows in the same order
+    keys = sorted({str(key) for key in keys})
+    if not keys:
+        return
+    CacheVersion.objects.bulk_create(
+        [CacheVersion(scope=scope, key=key) for key in keys], ignore_conflicts=True
+    )
+    CacheVersion.objects.filter(scope=scope, key__in=keys).update(version=F('version') + 1)
@@ -0,0 +1,133 @@
+"""
+Server-authoritative attempt deadlines.
+An attempt is due at start_time + test.duration_minutes. Due attempts are
+finalized here in batches (buffered answers flushed, graded with the
+set-based grader) instead of waiting for the candidate to come back.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from . import answer_buffer
+from .grading import AttemptGrader
+from .models import TestAttempt
+
+
+# Fields written when an attempt is finalized
+FINALIZED_FIELDS = [
+    'status', 'end_time', 'time_spent_seconds', 'attempted_questions',
+    'correct_answers', 'marks_obtained', 'percentage',
+]
+
+
+def grace_period():
+    return timedelta(seconds=getattr(settings, 'ATTEMPT_DEADLINE_GRACE_SECONDS', 30))
+
+
+def attempt_deadline(attempt):
+    return attempt.start_time + timedelta(minutes=attempt.test.duration_minutes)
+
+
+def finalize_expired_attempt(attempt, negative_marking=False, save=True):
+    """
+    Submit an attempt whose time ran out, as of its deadline.
+    Buffered answers are flushed before grading and only dropped once the
+    attempt's savepoint commits, so a failed attempt keeps them for the
+    next run.
+    """
+    if answer_buffer.is_enabled():
+        answer_buffer.flush_attempt_answers(attempt)
+    attempt.status = 'submitted'
+    attempt.end_time = attempt_deadline(attempt)
+    attempt.time_spent_seconds = int((attempt.end_time - attempt.start_time).total_seconds())
+    AttemptGrader(attempt, negative_marking=negative_marking).grade()
+    if save:
+        attempt.save(update_fields=FINALIZED_FIELDS)
+    return attempt
+
+
+class DeadlineScheduler:
+    """Find and finalize in-progress attempts whose deadline has passed"""
+
+    def __init__(self, batch_size=200):
+        self.batch_size = batch_size
+
+    def _earliest_starts(self):
+        """Earliest in-progress start_time per test duration"""
+        return TestAttempt.objects.filter(status='in_progress').values(
+            'test__duration_minutes'
+        ).annotate(first_start=Min('start_time')).order_by()
+
+    def next_deadline(self):
+        """Return when the next in-progress attempt becomes due, or None"""
+        deadlines = [
+            row['first_start'] + timedelta(minutes=row['test__duration_minutes'])
+            for row in self._earliest_starts()
+        ]
+        return min(deadlines) + grace_period() if deadlines else None
+
+    def expire_due(self, now=None):
+        """
+        Finalize every due attempt. Each duration group is a range scan on
+        (status, start_time), processed in locked batches so several
+        schedulers can run side by side. Batches follow a (start_time, id)
+        cursor, so attempts that fail to finalize are passed over and
+        retried on the next run instead of holding up the ones after them.
+        """
+        now = now or timezone.now()
+        stats = {'expired': 0, 'errors': 0}
+
+        for row in self._earliest_starts():
+            duration = row['test__duration_minutes']
+            cutoff = now - timedelta(minutes=duration) - grace_period()
+            if row['first_start'] > cutoff:
+                continue
+
+            after = None
+            while True:
+                processed, errors, after = self._expire_batch(duration, cutoff, after)
+                stats['expired'] += processed
+                stats['errors'] += errors
+                if after is None:
+                    break
+        return stats
+
+    def _expire_batch(self, duration, cutoff, after=None):
+        """
+        Finalize one batch of due attempts past the (start_time, id) cursor
+        after. Returns (finalized, errors, cursor of the next batch or None
+        once the group is done).
+        """
+        with transaction.atomic():
+            due = TestAttempt.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                status='in_progress',
+                test__duration_minutes=duration,
+                start_time__lte=cutoff,
+            )
+            if after is not None:
+                start_time, attempt_id = after
+                due = due.filter(Q(start_time__gt=start_time) | Q(start_time=start_time, id__gt=attempt_id))
+            attempts = list(due.select_related('test').order_by('start_time', 'id')[:self.batch_size])
+
+            finalized = []
+            errors = 0
+            for attempt in attempts:
+                try:
+                    with transaction.atomic():
+                        finalize_expired_attempt(attempt, save=False)
+                except Exception:
+                    errors += 1
+                    continue
+                finalized.append(attempt)
+
+            if finalized:
+                TestAttempt.objects.bulk_update(finalized, FINALIZED_FIELDS)
+
+        cursor = None
+        if len(attempts) == self.batch_size:
+            cursor = (attempts[-1].start_time, attempts[-1].id)
+        return len(finalized), errors, cursor
@@ -0,0 +1,131 @@
+"""
+Set-based grading engine for test attempts.
+Reads the precompiled answer key for the attempt's paper, loads the
+candidate's answers in a fixed number of queries, grades everything in
+memory and writes the results back with a single bulk update.
+"""
+
+from decimal import Decimal
+from typing import Dict
+
+from questions.models import Question, QuestionOption, UserAnswer
+from .answer_key import AnswerKeyEntry, get_attempt_answer_key
+
+
+class AttemptGrader:
+    """Grade every answer of a TestAttempt using set comparisons"""
+
+    # Marks awarded when an answered question is not part of the test paper
+    DEFAULT_MARKS = Decimal('1')
+
+    def __init__(self, attempt, negative_marking: bool = False, batch_size: int = 500):
+        self.attempt = attempt
+        self.negative_marking = negative_marking
+        self.batch_size = batch_size
+
+    def _load_off_paper_entries(self, question_ids) -> Dict:
+        """
+        Build key entries for answered questions that are not on the paper.
+        They are graded with DEFAULT_MARKS like the legacy submit path did.
+        """
+        if not question_ids:
+            return {}
+
+        entries = {}
+        correct_options = {}
+        options = QuestionOption.objects.filter(
+            question_id__in=question_ids, is_correct=True
+        ).values_list('question_id', 'id', 'option_text')
+        for question_id, option_id, option_text in options:
+            correct_options.setdefault(question_id, []).append((option_id, option_text))
+
+        rows = Question.objects.filter(id__in=question_ids).values_list(
+            'id', 'question_type', 'negative_marks', 'correct_answers', 'case_sensitive'
+        )
+        for question_id, question_type, negative_marks, correct_answers, case_sensitive in rows:
+            options = correct_options.get(question_id, [])
+            entries[question_id] = AnswerKeyEntry(
+                question_type, self.DEFAULT_MARKS, negative_marks,
+                correct_options=[option_id for option_id, _ in options],
+                correct_bool=options[0][1].strip().lower() == 'true' if options else None,
+                correct_answers=[str(answer).strip() for answer in (correct_answers or [])],
+                case_sensitive=case_sensitive,
+            )
+        return entries
+
+    def _load_selected_options(self) -> Dict:
+        """Map answer id -> set of selected option ids via the M2M table"""
+        through = UserAnswer.selected_options.through
+        selected = {}
+        rows = through.objects.filter(
+            useranswer__test_attempt_id=self.attempt.pk
+        ).values_list('useranswer_id', 'questionoption_id')
+        for answer_id, option_id in rows:
+            selected.setdefault(answer_id, set()).add(option_id)
+        return selected
+
+    def grade(self) -> Dict:
+        """
+        Grade the attempt and persist per-answer results.
+
+        Updates the attempt's score fields in memory; the caller is responsible
+        for saving the attempt along with any status changes.
+        """
+        answers = list(UserAnswer.objects.filter(test_attempt_id=self.attempt.pk))
+        selected_map = self._load_selected_options()
+        answer_key = get_attempt_answer_key(self.attempt)
+        off_paper = self._load_off_paper_entries(
+            {answer.question_id for answer in answers} - set(answer_key.entries)
+        )
+
+        attempted_count = 0
+        correct_count = 0
+        total_marks = Decimal('0')
+        graded = []
+
+        for answer in answers:
+            selected = selected_map.get(answer.id, set())
+            if not (answer.text_answer or answer.boolean_answer is not None or selected):
+                continue
+
+            attempted_count += 1
+            entry = answer_key.get(answer.question_id) or off_paper.get(answer.question_id)
+            is_correct = bool(entry and entry.is_correct(
+                selected, answer.boolean_answer, answer.text_answer
+            ))
+
+            if is_correct:
+                marks = entry.marks
+                correct_count += 1
+            elif self.negative_marking and entry:
+                marks = -entry.negative_marks
+            else:
+                marks = Decimal('0')
+
+            total_marks += marks
+            answer.is_correct = is_correct
+            answer.marks_obtained = marks
+            graded.append(answer)
+
+        if graded:
+            UserAnswer.objects.bulk_update(
+                graded, ['is_correct', 'marks_obtained'], batch_size=self.batch_size
+            )
+
+        if self.negative_marking:
+            total_marks = max(Decimal('0'), total_marks)  # Don't allow negative total
+
+        max_marks = self.attempt.test.total_marks
+        percentage = (total_marks / max_marks) * 100 if max_marks > 0 else 0
+
+        self.attempt.attempted_questions = attempted_count
+        self.attempt.correct_answers = correct_count
+        self.attempt.marks_obtained = total_marks
+        self.attempt.percentage = round(percentage, 2)
+
+        return {
+            'attempted_questions': attempted_count,
+            'correct_answers': correct_count,
+            'marks_obtained': total_marks,
+            'percentage': self.attempt.percentage,
+        }
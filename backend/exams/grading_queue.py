@@ -0,0 +1,123 @@
+"""
+Database-backed queue for grading submitted attempts.
+With ASYNC_SUBMISSION_GRADING enabled, submit only marks the attempt as
+submitted and enqueues a GradingJob; the grade_submissions workers claim
+jobs with SKIP LOCKED, flush buffered answers and run the set-based grader.
+"""
+
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import answer_buffer
+from .grading import AttemptGrader
+from .models import GradingJob, TestAttempt
+
+
+SCORE_FIELDS = ['attempted_questions', 'correct_answers', 'marks_obtained', 'percentage']
+
+
+def is_enabled():
+    return getattr(settings, 'ASYNC_SUBMISSION_GRADING', False)
+
+
+def _max_tries():
+    return getattr(settings, 'GRADING_JOB_MAX_TRIES', 3)
+
+
+def _stale_after():
+    return timedelta(seconds=getattr(settings, 'GRADING_JOB_TIMEOUT', 300))
+
+
+def submit_attempt(attempt, negative_marking=False):
+    """
+    Atomically mark an in-progress attempt as submitted and enqueue its grading.
+    Returns the job, or None if the attempt was no longer in progress.
+    """
+    now = timezone.now()
+    time_spent = int((now - attempt.start_time).total_seconds())
+    with transaction.atomic():
+        updated = TestAttempt.objects.filter(pk=attempt.pk, status='in_progress').update(
+            status='submitted', end_time=now, time_spent_seconds=time_spent
+        )
+        if not updated:
+            return None
+        job = GradingJob.objects.create(attempt_id=attempt.pk, negative_marking=negative_marking)
+
+    attempt.status = 'submitted'
+    attempt.end_time = now
+    attempt.time_spent_seconds = time_spent
+    return job
+
+
+def claim_jobs(worker, limit=1):
+    """
+    Claim queued jobs (and jobs abandoned by crashed workers) for a worker.
+    Abandoned jobs out of tries are failed instead, at most limit per call.
+    """
+    now = timezone.now()
+    stale = Q(status='running', started_at__lt=now - _stale_after())
+    with transaction.atomic():
+        given_up = list(
+            GradingJob.objects.select_for_update(skip_locked=True).filter(
+                stale, tries__gte=_max_tries()
+            ).order_by('created_at').values_list('pk', flat=True)[:limit]
+        )
+        if given_up:
+            GradingJob.objects.filter(pk__in=given_up).update(
+                status='failed', finished_at=now,
+                last_error=f'Worker stopped responding; gave up after {_max_tries()} tries',
+            )
+
+        jobs = list(
+            GradingJob.objects.select_for_update(skip_locked=True).filter(
+                Q(status='queued') | (stale & Q(tries__lt=_max_tries()))
+            ).order_by('created_at')[:limit]
+        )
+        if jobs:
+            GradingJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status='running', worker=worker, started_at=now, tries=F('tries') + 1
+            )
+    return jobs
+
+
+def run_job(job):
+    """Grade the job's attempt; failed jobs are retried up to GRADING_JOB_MAX_TRIES"""
+    try:
+        attempt = TestAttempt.objects.select_related('test').get(pk=job.attempt_id)
+        with transaction.atomic():
+            if answer_buffer.is_enabled():
+                answer_buffer.flush_attempt_answers(attempt)
+            AttemptGrader(attempt, negative_marking=job.negative_marking).grade()
+            attempt.save(update_fields=SCORE_FIELDS)
+            GradingJob.objects.filter(pk=job.pk).update(
+                status='done', finished_at=timezone.now(), last_error=''
+            )
+        return True
+    except Exception:
+        # job.tries is the value before this claim incremented it
+        retry = job.tries + 1 < _max_tries()
+        GradingJob.objects.filter(pk=job.pk).update(
+            status='queued' if retry else 'failed',
+            finished_at=None if retry else timezone.now(),
+            last_error=traceback.format_exc()[-4000:],
+        )
+        return False
+
+
+def drain(worker, batch_size=10):
+    """Process jobs until the queue is empty. Returns (done, failed) counts."""
+    done = failed = 0
+    while True:
+        jobs = claim_jobs(worker, limit=batch_size)
+        if not jobs:
+            return done, failed
+        for job in jobs:
+            if run_job(job):
+                done += 1
+            else:
+                failed += 1
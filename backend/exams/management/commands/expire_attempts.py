@@ -0,0 +1,54 @@
+"""
+Deadline worker that finalizes abandoned test attempts.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from exams.deadlines import DeadlineScheduler
+
+
+class Command(BaseCommand):
+    help = 'Submit and grade in-progress attempts whose time has run out, sleeping until the next deadline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Attempts finalized per transaction'
+        )
+        parser.add_argument(
+            '--max-sleep',
+            type=int,
+            default=60,
+            help='Upper bound in seconds between scans, so newly started attempts are picked up'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run a single expiry pass and exit'
+        )
+
+    def handle(self, *args, **options):
+        scheduler = DeadlineScheduler(batch_size=max(1, options['batch_size']))
+        max_sleep = max(1, options['max_sleep'])
+
+        while True:
+            stats = scheduler.expire_due()
+            if stats['expired'] or stats['errors']:
+                self.stdout.write(
+                    f"Expired {stats['expired']} attempts ({stats['errors']} errors)"
+                )
+
+            if options['once']:
+                break
+
+            # Wake up at the next deadline, but never sleep longer than max_sleep
+            next_deadline = scheduler.next_deadline()
+            sleep_for = max_sleep
+            if next_deadline is not None:
+                sleep_for = min(max_sleep, (next_deadline - timezone.now()).total_seconds())
+            time.sleep(max(1, sleep_for))
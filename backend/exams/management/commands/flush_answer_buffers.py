@@ -0,0 +1,43 @@
+"""
+Background flusher for the write-behind answer buffer.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from exams.answer_buffer import flush_dirty_attempts
+
+
+class Command(BaseCommand):
+    help = 'Persist buffered in-progress answers to the database every N seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=getattr(settings, 'ANSWER_BUFFER_FLUSH_INTERVAL', 5),
+            help='Seconds between flush cycles'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run a single flush cycle and exit'
+        )
+
+    def handle(self, *args, **options):
+        interval = max(1, options['interval'])
+
+        while True:
+            started = time.monotonic()
+            stats = flush_dirty_attempts()
+            if stats['attempts'] or stats['errors']:
+                self.stdout.write(
+                    f"Flushed {stats['saved']} answers from {stats['attempts']} attempts "
+                    f"({stats['errors']} errors)"
+                )
+
+            if options['once']:
+                break
+            time.sleep(max(0, interval - (time.monotonic() - started)))
@@ -0,0 +1,72 @@
+"""
+Batch question-paper generation for whole exams or selected tests.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.paper_generation import PaperGenerator
+from exams.models import Test
+
+
+class Command(BaseCommand):
+    help = 'Generate question papers (and anti-cheating variants) from the tests\' linked question banks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--exam',
+            action='append',
+            default=[],
+            help='Exam id whose tests get papers (repeatable)'
+        )
+        parser.add_argument(
+            '--test',
+            action='append',
+            default=[],
+            help='Test id to generate a paper for (repeatable)'
+        )
+        parser.add_argument(
+            '--variants',
+            type=int,
+            default=0,
+            help='Variant papers to create per test in addition to the base paper'
+        )
+        parser.add_argument(
+            '--seed',
+            help='Seed for reproducible papers'
+        )
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Regenerate tests that already have questions'
+        )
+
+    def handle(self, *args, **options):
+        if not options['exam'] and not options['test']:
+            raise CommandError('Pass at least one --exam or --test.')
+        if options['variants'] < 0:
+            raise CommandError('--variants cannot be negative.')
+
+        # Exams contribute their base tests; explicitly named tests are taken as given
+        tests = Test.objects.filter(exam_id__in=options['exam'], variant_of__isnull=True) | Test.objects.filter(
+            id__in=options['test']
+        )
+
+        started = time.perf_counter()
+        generator = PaperGenerator(seed=options['seed'], overwrite=options['overwrite'])
+        summary = generator.generate(tests.order_by('created_at'), variants=options['variants'])
+        elapsed = time.perf_counter() - started
+
+        for row in summary:
+            label = row['title']
+            if row['status'] == 'generated':
+                self.stdout.write(f"{label}: {row['generated']}/{row['requested']} questions")
+            else:
+                self.stdout.write(f"{label}: skipped ({row['reason']})")
+
+        generated = [row for row in summary if row['status'] == 'generated']
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(generated)} papers with {sum(row['generated'] for row in generated)} questions "
+            f"in {elapsed:.2f}s ({len(summary) - len(generated)} skipped)"
+        ))
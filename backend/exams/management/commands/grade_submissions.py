@@ -0,0 +1,68 @@
+"""
+Worker pool that drains the grading queue.
+"""
+
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from exams.grading_queue import drain
+
+
+class Command(BaseCommand):
+    help = 'Grade submitted attempts queued by the asynchronous submit endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'GRADING_WORKERS', 4),
+            help='Number of grading threads'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds an idle worker waits before polling the queue again'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        lock = threading.Lock()
+        totals = {'done': 0, 'failed': 0}
+
+        def work(index):
+            name = f'{prefix}:{index}'
+            try:
+                while True:
+                    done, failed = drain(name)
+                    if done or failed:
+                        with lock:
+                            totals['done'] += done
+                            totals['failed'] += failed
+                        self.stdout.write(f'[{name}] graded {done} attempts ({failed} failed)')
+                    if options['once']:
+                        return
+                    time.sleep(options['poll_interval'])
+            finally:
+                # Each thread holds its own database connection
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(work, range(workers)))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Graded {totals['done']} attempts ({totals['failed']} failed)"
+        ))
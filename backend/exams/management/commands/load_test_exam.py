@@ -0,0 +1,346 @@
+"""
+Load test that simulates an exam window against the local database.
+
+Each simulated candidate starts an attempt, fetches the question paper,
+sends auto_save heartbeats and submits, all through the real API stack.
+Latency percentiles, queries per request and throughput are reported per
+endpoint; with --baseline they are compared against a report saved by an
+earlier run (--output).
+"""
+
+import contextlib
+import io
+import json
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from rest_framework.test import APIClient
+
+from exams.answer_key import invalidate_answer_key
+from exams.models import Exam, Test
+from questions.models import Question, QuestionBank, QuestionOption, TestQuestion
+from questions.question_counts import refresh_question_counts
+
+User = get_user_model()
+
+API_PREFIX = '/api/v1/exams'
+ENDPOINTS = ('start_attempt', 'questions', 'auto_save', 'submit', 'results')
+
+# Report figures compared against a baseline report
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'throughput_rps')
+
+# Run parameters that must match for a baseline comparison to be like for like
+RUN_PARAMETERS = ('database', 'candidates', 'questions', 'concurrency', 'heartbeats', 'changed_answers')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+def percent_change(before, after):
+    """Change from before to after in percent, or None without a baseline figure"""
+    if not before:
+        return None
+    return round((after - before) / before * 100, 1)
+
+
+class Command(BaseCommand):
+    help = 'Simulate N candidates taking a test and report per-endpoint latency and query counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', type=int, default=50, help='Number of simulated candidates')
+        parser.add_argument('--questions', type=int, default=100, help='Questions on the generated test')
+        parser.add_argument('--concurrency', type=int, default=8, help='Candidates running at the same time')
+        parser.add_argument('--heartbeats', type=int, default=5, help='auto_save calls per candidate')
+        parser.add_argument(
+            '--changed-answers', type=int, default=5,
+            help='Earlier answers each heartbeat changes, on top of answering new questions'
+        )
+        parser.add_argument(
+            '--heartbeat-interval', type=float, default=0.0,
+            help='Seconds between auto_save heartbeats of one candidate'
+        )
+        parser.add_argument(
+            '--ramp-up', type=float, default=0.0,
+            help='Seconds over which candidate start times are spread'
+        )
+        parser.add_argument('--results', action='store_true', help='Also fetch results after submitting')
+        parser.add_argument('--output', help='Write the report as JSON to this path')
+        parser.add_argument('--baseline', help='Compare against a report written earlier with --output')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users, test and questions')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Allow running with DEBUG off (the command writes fixture data to the database)'
+        )
+        parser.add_argument('--verbose-app', action='store_true', help='Do not silence print output from views')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('Refusing to write load-test data with DEBUG off; pass --force to override.')
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline report {options['baseline']}: {e}")
+
+        # Lets the test client through ALLOWED_HOSTS
+        setup_test_environment(debug=settings.DEBUG)
+
+        self.samples = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.lock = threading.Lock()
+
+        self.stdout.write(
+            f"Creating fixture: {options['candidates']} candidates, {options['questions']} questions..."
+        )
+        fixture = self._create_fixture(options['candidates'], options['questions'])
+
+        try:
+            silence = contextlib.nullcontext() if options['verbose_app'] else contextlib.redirect_stdout(io.StringIO())
+            started = time.perf_counter()
+            with silence, ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as pool:
+                delay = options['ramp_up'] / max(1, len(fixture['users']))
+                futures = [
+                    pool.submit(self._run_candidate, fixture, user, index * delay, options)
+                    for index, user in enumerate(fixture['users'])
+                ]
+                for future in futures:
+                    future.result()
+            wall_time = time.perf_counter() - started
+
+            report = self._build_report(wall_time, options)
+            self._print_report(report)
+            if baseline is not None:
+                report['baseline'] = self._compare(report, baseline, options['baseline'])
+                self._print_comparison(report['baseline'])
+            if options['output']:
+                with open(options['output'], 'w') as handle:
+                    json.dump(report, handle, indent=2)
+                self.stdout.write(f"Report written to {options['output']}")
+        finally:
+            if not options['keep']:
+                self._delete_fixture(fixture)
+
+    def _create_fixture(self, candidates, question_count):
+        tag = f'loadtest-{uuid.uuid4().hex[:8]}'
+        with transaction.atomic():
+            owner = User.objects.create(username=f'{tag}-owner', is_staff=True)
+            exam = Exam.objects.create(name=f'{tag} exam', description='Load test exam', created_by=owner)
+            test = Test.objects.create(
+                exam=exam, title=f'{tag} test', description='Load test paper',
+                duration_minutes=180, total_marks=question_count * 2,
+                status='active', max_attempts=1, created_by=owner,
+            )
+            bank = QuestionBank.objects.create(name=f'{tag} bank', created_by=owner)
+
+            questions = Question.objects.bulk_create([
+                Question(
+                    question_bank=bank, question_text=f'Load test question {index}',
+                    question_type='mcq', marks=2, created_by=owner,
+                )
+                for index in range(question_count)
+            ])
+            options = QuestionOption.objects.bulk_create([
+                QuestionOption(question=question, option_text=f'Option {order}', is_correct=order == 0, order=order)
+                for question in questions
+                for order in range(4)
+            ])
+            TestQuestion.objects.bulk_create([
+                TestQuestion(test=test, question=question, order=index + 1, marks=2)
+                for index, question in enumerate(questions)
+            ])
+            users = User.objects.bulk_create([
+                User(username=f'{tag}-candidate-{index}') for index in range(candidates)
+            ])
+        invalidate_answer_key(test)
+        refresh_question_counts(bank)
+
+        option_ids = {}
+        for option in options:
+            option_ids.setdefault(option.question_id, []).append(str(option.id))
+        return {
+            'tag': tag, 'owner': owner, 'exam': exam, 'test': test, 'bank': bank,
+            'users': users, 'question_ids': [str(question.id) for question in questions],
+            'option_ids': option_ids,
+        }
+
+    def _delete_fixture(self, fixture):
+        User.objects.filter(username__startswith=fixture['tag']).exclude(pk=fixture['owner'].pk).delete()
+        fixture['exam'].delete()
+        fixture['bank'].delete()
+        fixture['owner'].delete()
+
+    def _call(self, name, func):
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = func()
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.samples[name].append((elapsed, len(queries)))
+            if response.status_code >= 400:
+                self.errors[name] += 1
+        return response
+
+    def _run_candidate(self, fixture, user, delay, options):
+        if delay:
+            time.sleep(delay)
+        client = APIClient()
+        client.force_authenticate(user)
+        question_ids = fixture['question_ids']
+        try:
+            response = self._call('start_attempt', lambda: client.post(
+                f"{API_PREFIX}/tests/{fixture['test'].id}/start_attempt/", secure=True
+            ))
+            if response.status_code != 201:
+                return
+            attempt_url = f"{API_PREFIX}/test-attempts/{response.json()['id']}"
+
+            self._call('questions', lambda: client.get(f'{attempt_url}/questions/', secure=True))
+
+            # Each heartbeat answers the next slice of the paper, like a candidate working
+            # through it, and changes some earlier answers so they are written again
+            heartbeats = max(1, options['heartbeats'])
+            per_beat = max(1, len(question_ids) // heartbeats)
+            changes = max(0, options['changed_answers'])
+            answers = {}
+            for beat in range(heartbeats):
+                answered = list(answers)
+                for offset in range(min(changes, len(answered))):
+                    question_id = answered[(beat * changes + offset) % len(answered)]
+                    choices = fixture['option_ids'][uuid.UUID(question_id)]
+                    current = choices.index(answers[question_id]['selected_options'][0])
+                    answers[question_id] = {
+                        'selected_options': [choices[(current + 1) % len(choices)]],
+                        'marked_for_review': False,
+                    }
+                for question_id in question_ids[beat * per_beat:(beat + 1) * per_beat]:
+                    choices = fixture['option_ids'][uuid.UUID(question_id)]
+                    answers[question_id] = {
+                        'selected_options': [choices[(beat + len(answers)) % len(choices)]],
+                        'marked_for_review': False,
+                    }
+                payload = {'answers': dict(answers)}
+                self._call('auto_save', lambda: client.post(
+                    f'{attempt_url}/auto_save/', payload, format='json', secure=True
+                ))
+                if options['heartbeat_interval']:
+                    time.sleep(options['heartbeat_interval'])
+
+            self._call('submit', lambda: client.post(f'{attempt_url}/submit/', secure=True))
+            if options['results']:
+                self._call('results', lambda: client.get(f'{attempt_url}/results/', secure=True))
+        finally:
+            # Worker threads each hold their own database connection
+            connection.close()
+
+    def _build_report(self, wall_time, options):
+        endpoints = {}
+        for name in ENDPOINTS:
+            samples = self.samples[name]
+            if not samples:
+                continue
+            latencies = sorted(elapsed * 1000 for elapsed, _ in samples)
+            queries = [count for _, count in samples]
+            endpoints[name] = {
+                'requests': len(samples),
+                'errors': self.errors[name],
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'max_ms': round(latencies[-1], 2),
+                'queries_per_request': round(statistics.mean(queries), 2),
+                'max_queries': max(queries),
+                'throughput_rps': round(len(samples) / wall_time, 2) if wall_time else 0,
+            }
+
+        total = sum(endpoint['requests'] for endpoint in endpoints.values())
+        return {
+            'database': connection.vendor,
+            'candidates': options['candidates'],
+            'questions': options['questions'],
+            'concurrency': options['concurrency'],
+            'heartbeats': options['heartbeats'],
+            'changed_answers': options['changed_answers'],
+            'wall_time_s': round(wall_time, 3),
+            'total_requests': total,
+            'throughput_rps': round(total / wall_time, 2) if wall_time else 0,
+            'endpoints': endpoints,
+        }
+
+    def _print_report(self, report):
+        self.stdout.write('')
+        self.stdout.write(
+            f"{report['candidates']} candidates x {report['questions']} questions on {report['database']} "
+            f"(concurrency {report['concurrency']}): {report['total_requests']} requests in "
+            f"{report['wall_time_s']}s, {report['throughput_rps']} req/s"
+        )
+        header = f"{'endpoint':<15}{'reqs':>7}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'req/s':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, data in report['endpoints'].items():
+            self.stdout.write(
+                f"{name:<15}{data['requests']:>7}{data['errors']:>6}{data['p50_ms']:>10}{data['p95_ms']:>10}"
+                f"{data['p99_ms']:>10}{data['queries_per_request']:>9}{data['throughput_rps']:>9}"
+            )
+
+    def _compare(self, report, baseline, path):
+        """Per-endpoint change of COMPARED_METRICS against a baseline report"""
+        endpoints = {}
+        for name, data in report['endpoints'].items():
+            before = baseline.get('endpoints', {}).get(name)
+            if not before:
+                continue
+            endpoints[name] = {
+                metric: {
+                    'baseline': before.get(metric),
+                    'current': data[metric],
+                    'change_pct': percent_change(before.get(metric), data[metric]),
+                }
+                for metric in COMPARED_METRICS
+            }
+        return {
+            'path': path,
+            'mismatched_parameters': [
+                parameter for parameter in RUN_PARAMETERS if baseline.get(parameter) != report.get(parameter)
+            ],
+            'throughput_change_pct': percent_change(baseline.get('throughput_rps'), report['throughput_rps']),
+            'endpoints': endpoints,
+        }
+
+    def _print_comparison(self, comparison):
+        def change(value):
+            return 'n/a' if value is None else f'{value:+.1f}%'
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"Against baseline {comparison['path']}: throughput {change(comparison['throughput_change_pct'])}"
+        )
+        if comparison['mismatched_parameters']:
+            self.stdout.write(self.style.WARNING(
+                f"Run parameters differ from the baseline: {', '.join(comparison['mismatched_parameters'])}"
+            ))
+        header = f"{'endpoint':<15}{'p50 ms':>28}{'p95 ms':>28}{'queries':>24}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, metrics in comparison['endpoints'].items():
+            cells = []
+            for metric, width in (('p50_ms', 28), ('p95_ms', 28), ('queries_per_request', 24)):
+                values = metrics[metric]
+                cell = f"{values['baseline']} -> {values['current']} ({change(values['change_pct'])})"
+                cells.append(f' {cell}'.rjust(width))
+            self.stdout.write(f"{name:<15}{''.join(cells)}")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0009_assessment_assessmentattempt_learningcontent_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testattempt',
+            name='answer_revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
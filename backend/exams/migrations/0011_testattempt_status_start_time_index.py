@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0010_testattempt_answer_revision'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='testattempt',
+            index=models.Index(fields=['status', 'start_time'], name='test_attemp_status_59cca5_idx'),
+        ),
+    ]
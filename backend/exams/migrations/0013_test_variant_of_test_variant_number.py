@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-17 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0012_gradingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='variant_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='exams.test'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='variant_number',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
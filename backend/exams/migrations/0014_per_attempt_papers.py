@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0013_test_variant_of_test_variant_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testselectionrule',
+            name='per_attempt_papers',
+            field=models.BooleanField(default=False, help_text='Draw a separate paper for every attempt'),
+        ),
+        migrations.AddField(
+            model_name='testattempt',
+            name='question_ids',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testattempt',
+            name='question_marks',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
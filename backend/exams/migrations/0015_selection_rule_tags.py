@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0014_per_attempt_papers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='selectionruletemplate',
+            name='excluded_tags',
+            field=models.JSONField(blank=True, default=list, help_text='Skip questions carrying any of these tags'),
+        ),
+        migrations.AddField(
+            model_name='selectionruletemplate',
+            name='included_tags',
+            field=models.JSONField(blank=True, default=list, help_text='Only questions carrying any of these tags'),
+        ),
+        migrations.AddField(
+            model_name='testselectionrule',
+            name='excluded_tags',
+            field=models.JSONField(blank=True, default=list, help_text='Skip questions carrying any of these tags'),
+        ),
+        migrations.AddField(
+            model_name='testselectionrule',
+            name='included_tags',
+            field=models.JSONField(blank=True, default=list, help_text='Only questions carrying any of these tags'),
+        ),
+    ]
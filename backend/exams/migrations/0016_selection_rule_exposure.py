@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0015_selection_rule_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='selectionruletemplate',
+            name='max_exposure',
+            field=models.PositiveIntegerField(blank=True, help_text='Skip questions already served this many times in the exam', null=True),
+        ),
+        migrations.AddField(
+            model_name='selectionruletemplate',
+            name='prefer_less_exposed',
+            field=models.BooleanField(default=False, help_text='Favour questions served less often in the exam'),
+        ),
+        migrations.AddField(
+            model_name='testselectionrule',
+            name='max_exposure',
+            field=models.PositiveIntegerField(blank=True, help_text='Skip questions already served this many times in the exam', null=True),
+        ),
+        migrations.AddField(
+            model_name='testselectionrule',
+            name='prefer_less_exposed',
+            field=models.BooleanField(default=False, help_text='Favour questions served less often in the exam'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0016_selection_rule_exposure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=30)),
+                ('key', models.CharField(max_length=64)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'cache_versions',
+                'unique_together': {('scope', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:40
+
+from django.db import migrations, models
+
+
+def mark_existing_attempts(apps, schema_editor):
+    # Attempts started so far were counted when they were created
+    TestAttempt = apps.get_model('exams', 'TestAttempt')
+    TestAttempt.objects.update(exposure_recorded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0017_cacheversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testattempt',
+            name='exposure_recorded',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_existing_attempts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='testattempt',
+            index=models.Index(condition=models.Q(('exposure_recorded', False)), fields=['id'], name='test_attempts_exposure_pending'),
+        ),
+    ]
@@ -157,7 +157,7 @@ class Exam(models.Model):
     
     def check_question_requirements(self):
         """Check if all tests in this exam have sufficient questions in their linked question banks"""
-        from questions.models import QuestionBank
+        from questions.question_counts import get_bank_counts
         
         requirements_check = {
             'is_ready': True,
@@ -167,8 +167,14 @@ class Exam(models.Model):
             'test_details': []
         }
         
-        for test in self.tests.all():
-            test_check = test.check_question_requirements()
+        # One query for the links and one for the counters of every linked bank
+        tests = list(self.tests.prefetch_related('test_question_banks__question_bank'))
+        counts = get_bank_counts({
+            link.question_bank_id for test in tests for link in test.test_question_banks.all()
+        })
+        
+        for test in tests:
+            test_check = test.check_question_requirements(counts)
             requirements_check['total_tests'] += 1
             requirements_check['missing_questions'] += test_check['missing_questions']
             
@@ -235,6 +241,8 @@ class TestSelectionRule(models.Model):
     year_range = models.JSONField(default=dict, help_text='{"start": 2020, "end": 2024}')
     included_topics = models.JSONField(default=list)
     excluded_topics = models.JSONField(default=list)
+    included_tags = models.JSONField(default=list, blank=True, help_text='Only questions carrying any of these tags')
+    excluded_tags = models.JSONField(default=list, blank=True, help_text='Skip questions carrying any of these tags')
     included_banks = models.JSONField(default=list, help_text='List of question bank IDs')
     excluded_questions = models.JSONField(default=list, help_text='Already used question IDs')
     
@@ -242,6 +250,9 @@ class TestSelectionRule(models.Model):
     ensure_topic_coverage = models.BooleanField(default=True)
     avoid_duplicates_from_attempts = models.BooleanField(default=True)
     priority_new_questions = models.BooleanField(default=False)
+    max_exposure = models.PositiveIntegerField(null=True, blank=True, help_text="Skip questions already served this many times in the exam")
+    prefer_less_exposed = models.BooleanField(default=False, help_text="Favour questions served less often in the exam")
+    per_attempt_papers = models.BooleanField(default=False, help_text='Draw a separate paper for every attempt')
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -268,9 +279,13 @@ class SelectionRuleTemplate(models.Model):
     year_range = models.JSONField(default=dict)
     included_topics = models.JSONField(default=list)
     excluded_topics = models.JSONField(default=list)
+    included_tags = models.JSONField(default=list, blank=True, help_text='Only questions carrying any of these tags')
+    excluded_tags = models.JSONField(default=list, blank=True, help_text='Skip questions carrying any of these tags')
     ensure_topic_coverage = models.BooleanField(default=True)
     avoid_duplicates_from_attempts = models.BooleanField(default=True)
     priority_new_questions = models.BooleanField(default=False)
+    max_exposure = models.PositiveIntegerField(null=True, blank=True, help_text="Skip questions already served this many times in the exam")
+    prefer_less_exposed = models.BooleanField(default=False, help_text="Favour questions served less often in the exam")
     
     is_public = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -313,6 +328,10 @@ class Test(models.Model):
     start_time = models.DateTimeField(null=True, blank=True)
     end_time = models.DateTimeField(null=True, blank=True)
     
+    # Anti-cheating paper variants drawn from the same question banks
+    variant_of = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='variants')
+    variant_number = models.PositiveSmallIntegerField(default=0)
+    
     # Import tracking
     imported_from_json = models.BooleanField(default=False)
     json_import_batch = models.CharField(max_length=100, blank=True, help_text="Batch ID from JSON import")
@@ -322,9 +341,13 @@ class Test(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    def check_question_requirements(self):
-        """Check if this test has sufficient questions in its linked question banks"""
-        from questions.models import QuestionBank
+    def check_question_requirements(self, counts=None):
+        """
+        Check if this test has sufficient questions in its linked question banks.
+        Availability honours each link's difficulty and topic filters and is read
+        from the question counters; counts may be passed in when already loaded.
+        """
+        from questions.question_counts import get_bank_counts
         
         requirements_check = {
             'is_ready': True,
@@ -334,11 +357,18 @@ class Test(models.Model):
             'question_banks': []
         }
         
+        models.prefetch_related_objects([self], 'test_question_banks__question_bank')
+        links = self.test_question_banks.all()
+        if counts is None:
+            counts = get_bank_counts({link.question_bank_id for link in links})
+        
         # Check each linked question bank
-        for test_question_bank in self.test_question_banks.all():
+        for test_question_bank in links:
             bank = test_question_bank.question_bank
             requested = test_question_bank.question_count
-            available = bank.questions.count()
+            available = counts[bank.id].available(
+                test_question_bank.difficulty_filter, test_question_bank.topic_filter
+            )
             missing = max(0, requested - available)
             
             requirements_check['requested_questions'] += requested
@@ -420,9 +450,80 @@ class TestAttempt(models.Model):
     marks_obtained = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     
+    # Bumped on every applied answer delta; clients send it back as base_revision
+    answer_revision = models.PositiveIntegerField(default=0)
+    
+    # Own paper drawn for this attempt (per_attempt_papers mode): question ids in paper
+    # order and their marks. None when the attempt uses the test's shared paper.
+    question_ids = models.JSONField(null=True, blank=True)
+    question_marks = models.JSONField(null=True, blank=True)
+    
+    # Whether the paper has been counted in the question exposure ledger
+    exposure_recorded = models.BooleanField(default=False)
+    
     class Meta:
         db_table = 'test_attempts'
         # Removed unique_together to allow multiple attempts per user per test
+        indexes = [
+            # Deadline scans for in-progress attempts
+            models.Index(fields=['status', 'start_time']),
+            # Attempts waiting to be counted in the exposure ledger
+            models.Index(
+                fields=['id'], condition=models.Q(exposure_recorded=False), name='test_attempts_exposure_pending'
+            ),
+        ]
+
+
+class GradingJob(models.Model):
+    """Queued grading work for a submitted test attempt"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    attempt = models.OneToOneField(TestAttempt, on_delete=models.CASCADE, related_name='grading_job')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    negative_marking = models.BooleanField(default=False)
+    
+    tries = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'grading_jobs'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Grading {self.attempt_id} ({self.status})"
+
+
+class CacheVersion(models.Model):
+    """
+    Version counter of cached data derived from one row: a test's answer key
+    and paper, a bank's question pool, a question's content or a cohort's
+    question exposure. It lives in
+    the database so a bump reaches every worker whatever the cache backend.
+    """
+    scope = models.CharField(max_length=30)
+    key = models.CharField(max_length=64)
+    version = models.BigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'cache_versions'
+        unique_together = ['scope', 'key']
+    
+    def __str__(self):
+        return f"{self.scope}:{self.key} v{self.version}"
 
 
 class Organization(models.Model):
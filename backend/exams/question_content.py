@@ -0,0 +1,201 @@
+"""
+Shared question-content cache for per-attempt papers.
+Each question is serialized once per content version into a JSON fragment,
+together with the grading data the answer key needs, and cached under
+(question id, version). Attempts that carry their own paper assemble it
+from these fragments, so a per-candidate paper costs about what the shared
+paper costs. Versions (see cache_versions) are bumped by signals whenever
+a question or one of its options changes.
+"""
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.randomization import seeded_permutation
+from questions.models import Question
+from .answer_key import AnswerKey, AnswerKeyEntry, LocalLRU
+from .cache_versions import QUESTION_SCOPE, bump_versions, get_versions
+from .question_paper import SHUFFLED_OPTION_TYPES, _OPTIONS_PLACEHOLDER, _PLACEHOLDER_BYTES, _encoder
+
+
+CONTENT_CACHE_KEY = 'question_content:candidate:{question_id}:{version}'
+
+
+def shuffle_options(options, seed, question_id):
+    """Options of a choice question in the order a paper seeded by seed shows them"""
+    return seeded_permutation(options, seed, question_id)
+
+
+class QuestionContent:
+    """Immutable serialized question plus its grading data"""
+
+    __slots__ = (
+        'question_id', 'version', 'fragment', 'option_parts', 'question_type',
+        'negative_marks', 'correct_options', 'correct_bool', 'correct_answers', 'case_sensitive',
+    )
+
+    def __init__(self, question_id, version, fragment, option_parts, question_type, negative_marks,
+                 correct_options, correct_bool, correct_answers, case_sensitive):
+        self.question_id = question_id
+        self.version = version
+        self.fragment = fragment
+        # (head, option fragments, tail) for questions whose options can be shuffled
+        self.option_parts = option_parts
+        self.question_type = question_type
+        self.negative_marks = negative_marks
+        self.correct_options = correct_options
+        self.correct_bool = correct_bool
+        self.correct_answers = correct_answers
+        self.case_sensitive = case_sensitive
+
+    def key_entry(self, marks):
+        """AnswerKeyEntry for this question worth the given marks"""
+        return AnswerKeyEntry(
+            self.question_type, marks, self.negative_marks,
+            correct_options=self.correct_options, correct_bool=self.correct_bool,
+            correct_answers=self.correct_answers, case_sensitive=self.case_sensitive,
+        )
+
+    def render(self, seed=None):
+        """Question JSON bytes, with choice options permuted by seed when given"""
+        if seed is None or self.option_parts is None:
+            return self.fragment
+        head, options, tail = self.option_parts
+        options = shuffle_options(options, seed, self.question_id)
+        return head + b'[' + b','.join(options) + b']' + tail
+
+    @classmethod
+    def build_many(cls, versions):
+        """Serialize the questions in versions ({question_id: version}) in three queries"""
+        # Import here to avoid circular imports
+        from questions.serializers import CandidateQuestionSerializer
+
+        questions = Question.objects.filter(id__in=list(versions)).select_related(
+            'created_by'
+        ).prefetch_related('options')
+
+        contents = {}
+        for question in questions:
+            # Option correctness is write-only on the serializer, and the expected
+            # answer and explanation are left out, so no answer reaches the paper
+            question_data = CandidateQuestionSerializer(question).data
+            fragment = _encoder.encode(question_data).encode('utf-8')
+
+            option_parts = None
+            if question_data['question_type'] in SHUFFLED_OPTION_TYPES and len(question_data['options']) > 1:
+                options = [_encoder.encode(option).encode('utf-8') for option in question_data['options']]
+                question_data['options'] = _OPTIONS_PLACEHOLDER
+                head, tail = _encoder.encode(question_data).encode('utf-8').split(_PLACEHOLDER_BYTES)
+                option_parts = (head, options, tail)
+
+            correct = [option for option in question.options.all() if option.is_correct]
+            contents[question.id] = cls(
+                question_id=str(question.id),
+                version=versions[str(question.id)],
+                fragment=fragment,
+                option_parts=option_parts,
+                question_type=question.question_type,
+                negative_marks=question.negative_marks,
+                correct_options=[option.id for option in correct],
+                correct_bool=correct[0].option_text.strip().lower() == 'true' if correct else None,
+                correct_answers=[str(answer).strip() for answer in (question.correct_answers or [])],
+                case_sensitive=question.case_sensitive,
+            )
+        return contents
+
+
+def _as_uuid(question_id):
+    return question_id if isinstance(question_id, uuid.UUID) else uuid.UUID(str(question_id))
+
+
+_local_contents = LocalLRU(getattr(settings, 'QUESTION_CONTENT_LOCAL_CACHE_SIZE', 4096))
+
+
+def get_question_contents(question_ids):
+    """
+    Return {question UUID: QuestionContent} for the given question ids.
+
+    Lookup order is the process-local LRU, then the shared Django cache, and
+    finally the database for whatever is still missing.
+    """
+    versions = get_versions(QUESTION_SCOPE, question_ids)
+
+    contents = {}
+    pending = {}
+    for question_id, version in versions.items():
+        content = _local_contents.get((question_id, version))
+        if content is not None:
+            contents[_as_uuid(question_id)] = content
+        else:
+            pending[CONTENT_CACHE_KEY.format(question_id=question_id, version=version)] = question_id
+
+    if pending:
+        shared = cache.get_many(list(pending))
+        for key, content in shared.items():
+            contents[_as_uuid(pending.pop(key))] = content
+            _local_contents.set((content.question_id, content.version), content)
+
+    if pending:
+        built = QuestionContent.build_many({question_id: versions[question_id] for question_id in pending.values()})
+        cache.set_many(
+            {
+                CONTENT_CACHE_KEY.format(question_id=content.question_id, version=content.version): content
+                for content in built.values()
+            },
+            timeout=getattr(settings, 'QUESTION_CONTENT_CACHE_TIMEOUT', 60 * 60 * 6),
+        )
+        for question_id, content in built.items():
+            contents[question_id] = content
+            _local_contents.set((content.question_id, content.version), content)
+
+    return contents
+
+
+def invalidate_question_content(*question_ids):
+    """Bump the content version of the given questions"""
+    question_ids = [str(getattr(question_id, 'pk', question_id)) for question_id in question_ids]
+    bump_versions(QUESTION_SCOPE, question_ids)
+    for question_id in question_ids:
+        _local_contents.discard(question_id)
+
+
+def build_attempt_answer_key(attempt):
+    """Answer key of an attempt's own paper, with marks taken from the paper"""
+    contents = get_question_contents(attempt.question_ids)
+    entries = {}
+    for question_id, marks in zip(attempt.question_ids, attempt.question_marks or []):
+        content = contents.get(_as_uuid(question_id))
+        if content is not None:
+            entries[_as_uuid(question_id)] = content.key_entry(marks)
+    version = hashlib.sha1(
+        ','.join(f'{content.question_id}:{content.version}' for content in contents.values()).encode('utf-8')
+    ).hexdigest()
+    return AnswerKey(str(attempt.pk), version, entries)
+
+
+def render_own_paper(attempt):
+    """Return (body, etag) of an attempt that carries its own paper"""
+    contents = get_question_contents(attempt.question_ids)
+    seed = attempt.pk if attempt.test.randomize_questions else None
+
+    parts = []
+    for order, (question_id, marks) in enumerate(zip(attempt.question_ids, attempt.question_marks or []), start=1):
+        content = contents.get(_as_uuid(question_id))
+        if content is None:
+            continue
+        parts.append(
+            b'{"id":' + _encoder.encode(str(question_id)).encode('utf-8')
+            + b',"question":' + content.render(seed)
+            + b',"order":' + str(order).encode('utf-8')
+            + b',"marks":' + _encoder.encode(marks).encode('utf-8') + b'}'
+        )
+    body = b'[' + b','.join(parts) + b']'
+
+    fingerprint = ','.join(
+        [str(attempt.pk), str(seed)] + [f'{key}:{contents[key].version}' for key in sorted(contents)]
+    )
+    etag = '"%s"' % hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+    return body, etag
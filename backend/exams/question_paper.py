@@ -0,0 +1,139 @@
+"""
+Pre-rendered question papers for test attempts.
+A paper is serialized once per test content version (the same version token
+as the answer key) into JSON fragments, one per question, and cached. Every
+candidate is served the same bytes; randomized tests get a permutation of
+the cached fragments (and of choice options) seeded by the attempt id, so
+the order is stable across refreshes without re-serializing anything.
+"""
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.randomization import seeded_permutation
+from questions.models import TestQuestion
+from .answer_key import LocalLRU, get_test_version
+
+
+PAPER_CACHE_KEY = 'question_paper:candidate:{test_id}:{version}'
+
+# Choice questions whose option order is shuffled for randomized tests
+SHUFFLED_OPTION_TYPES = ('mcq', 'multi_select')
+
+_encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+_OPTIONS_PLACEHOLDER = '__options_%s__' % uuid.uuid4().hex
+_PLACEHOLDER_BYTES = _encoder.encode(_OPTIONS_PLACEHOLDER).encode('utf-8')
+
+
+class QuestionPaper:
+    """Immutable serialized question paper for a test"""
+
+    __slots__ = ('test_id', 'version', 'fragments', 'option_parts', 'etag')
+
+    def __init__(self, test_id, version, fragments, option_parts):
+        self.test_id = test_id
+        self.version = version
+        self.fragments = fragments
+        # index -> (question_id, head, option fragments, tail) for questions whose options can be shuffled
+        self.option_parts = option_parts
+        self.etag = '"%s"' % hashlib.sha1(b'\n'.join(fragments)).hexdigest()
+
+    def __len__(self):
+        return len(self.fragments)
+
+    @classmethod
+    def build(cls, test_id, version):
+        """Serialize every question of a test in three queries"""
+        # Import here to avoid circular imports
+        from questions.serializers import CandidateQuestionSerializer
+
+        test_questions = TestQuestion.objects.filter(test_id=test_id).select_related(
+            'question__created_by'
+        ).prefetch_related('question__options').order_by('order')
+
+        fragments = []
+        option_parts = {}
+        for index, test_question in enumerate(test_questions):
+            # Option correctness is write-only on the serializer, and the expected
+            # answer and explanation are left out, so no answer reaches the paper
+            question_data = CandidateQuestionSerializer(test_question.question).data
+            data = {
+                'id': str(test_question.id),
+                'question': question_data,
+                'order': test_question.order,
+                'marks': test_question.marks,
+            }
+            fragment = _encoder.encode(data).encode('utf-8')
+            fragments.append(fragment)
+
+            if question_data['question_type'] in SHUFFLED_OPTION_TYPES and len(question_data['options']) > 1:
+                options = [_encoder.encode(option).encode('utf-8') for option in question_data['options']]
+                question_data['options'] = _OPTIONS_PLACEHOLDER
+                head, tail = _encoder.encode(data).encode('utf-8').split(_PLACEHOLDER_BYTES)
+                option_parts[index] = (str(test_question.question_id), head, options, tail)
+        return cls(test_id, version, fragments, option_parts)
+
+    def render(self, seed=None):
+        """
+        Return (body, etag) for the paper, permuted by seed when given.
+        The unseeded body is identical for every candidate; a seed also
+        shuffles the options of choice questions.
+        """
+        if seed is None:
+            return b'[' + b','.join(self.fragments) + b']', self.etag
+
+        parts = []
+        for index in seeded_permutation(range(len(self.fragments)), seed):
+            if index in self.option_parts:
+                question_id, head, options, tail = self.option_parts[index]
+                options = seeded_permutation(options, seed, question_id)
+                parts.append(head + b'[' + b','.join(options) + b']' + tail)
+            else:
+                parts.append(self.fragments[index])
+        body = b'[' + b','.join(parts) + b']'
+        etag = '"%s"' % hashlib.sha1(self.etag.encode('utf-8') + str(seed).encode('utf-8')).hexdigest()
+        return body, etag
+
+
+_local_papers = LocalLRU(getattr(settings, 'QUESTION_PAPER_LOCAL_CACHE_SIZE', 64))
+
+
+def get_question_paper(test):
+    """
+    Return the QuestionPaper for a test or test id.
+
+    Lookup order is the process-local LRU, then the shared Django cache, and
+    finally the database.
+    """
+    test_id = str(getattr(test, 'pk', test))
+    version = get_test_version(test_id)
+    local_key = (test_id, version)
+
+    paper = _local_papers.get(local_key)
+    if paper is not None:
+        return paper
+
+    shared_key = PAPER_CACHE_KEY.format(test_id=test_id, version=version)
+    paper = cache.get(shared_key)
+    if paper is None:
+        paper = QuestionPaper.build(test_id, version)
+        cache.set(shared_key, paper, timeout=getattr(settings, 'QUESTION_PAPER_CACHE_TIMEOUT', 60 * 60 * 6))
+
+    _local_papers.set(local_key, paper)
+    return paper
+
+
+def render_attempt_paper(attempt):
+    """Return (body, etag) of the question paper as seen by an attempt"""
+    if attempt.question_ids is not None:
+        # Import here to avoid circular imports
+        from .question_content import render_own_paper
+        return render_own_paper(attempt)
+    
+    paper = get_question_paper(attempt.test_id)
+    seed = attempt.pk if attempt.test.randomize_questions else None
+    return paper.render(seed)
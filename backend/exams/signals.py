@@ -0,0 +1,59 @@
+"""
+Signal handlers keeping cached exam artifacts and the exam autocomplete
+index in sync with the database.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from questions.models import Question, QuestionOption, TestQuestion
+from . import autocomplete
+from .answer_key import invalidate_answer_key
+from .models import Exam, Organization
+from .question_content import invalidate_question_content
+
+
+def _tests_using_questions(*question_ids):
+    return set(
+        TestQuestion.objects.filter(question_id__in=question_ids)
+        .values_list('test_id', flat=True).distinct()
+    )
+
+
+@receiver([post_save, post_delete], sender=TestQuestion)
+def test_question_changed(sender, instance, **kwargs):
+    invalidate_answer_key(instance.test_id)
+
+
+@receiver([post_save, post_delete], sender=QuestionOption)
+def question_option_changed(sender, instance, **kwargs):
+    invalidate_answer_key(*_tests_using_questions(instance.question_id))
+    invalidate_question_content(instance.question_id)
+
+
+@receiver(post_save, sender=Question)
+def question_changed(sender, instance, created, **kwargs):
+    # A brand new question cannot be on any test paper yet
+    if not created:
+        invalidate_answer_key(*_tests_using_questions(instance.pk))
+        invalidate_question_content(instance.pk)
+
+
+@receiver(post_save, sender=Exam)
+def exam_saved(sender, instance, **kwargs):
+    autocomplete.exam_saved(instance)
+
+
+@receiver(post_delete, sender=Exam)
+def exam_deleted(sender, instance, **kwargs):
+    autocomplete.exam_deleted(instance)
+
+
+@receiver(post_save, sender=Organization)
+def organization_saved(sender, instance, **kwargs):
+    autocomplete.organization_saved(instance)
+
+
+@receiver(post_delete, sender=Organization)
+def organization_deleted(sender, instance, **kwargs):
+    autocomplete.organization_deleted(instance)
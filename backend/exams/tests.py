@@ -1,3 +1,340 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.question_selection import PaperDrawError, draw_attempt_paper
+from questions.exposure import record_all_pending_exposure
+from questions.models import Question, QuestionBank, QuestionOption, TestQuestion, UserAnswer
+from . import answer_buffer, deadlines, grading_queue
+from .models import Exam, GradingJob, Test, TestAttempt, TestSelectionRule
+
+User = get_user_model()
+
+
+class AnswerSaveTests(TestCase):
+    """Saving answers through auto_save and the answer writer"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='candidate')
+        exam = Exam.objects.create(name='Exam', description='Exam', created_by=self.user)
+        test = Test.objects.create(
+            exam=exam, title='Paper', description='Paper', duration_minutes=60, total_marks=4,
+            created_by=self.user,
+        )
+        bank = QuestionBank.objects.create(name='Bank', created_by=self.user)
+        self.question = Question.objects.create(
+            question_bank=bank, question_text='Pick one', question_type='mcq', marks=2,
+        )
+        self.options = [
+            QuestionOption.objects.create(
+                question=self.question, option_text=f'Option {order}', is_correct=order == 0, order=order
+            )
+            for order in range(4)
+        ]
+        TestQuestion.objects.create(test=test, question=self.question, order=1, marks=2)
+        self.attempt = TestAttempt.objects.create(test=test, user=self.user, total_questions=1)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/v1/exams/test-attempts/{self.attempt.id}/'
+
+    def _auto_save(self, option):
+        return self.client.post(self.url + 'auto_save/', {
+            'answers': {str(self.question.id): {'selected_options': [str(option.id)]}}
+        }, format='json')
+
+    def _selected(self):
+        answer = UserAnswer.objects.get(test_attempt=self.attempt, question=self.question)
+        return list(answer.selected_options.values_list('id', flat=True))
+
+    def test_changing_an_existing_answer(self):
+        self.assertEqual(self._auto_save(self.options[0]).status_code, 200)
+        self.assertEqual(self._selected(), [self.options[0].id])
+
+        response = self._auto_save(self.options[2])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['saved_answers'], 1)
+        self.assertEqual(self._selected(), [self.options[2].id])
+        self.assertEqual(UserAnswer.objects.filter(test_attempt=self.attempt).count(), 1)
+
+    def test_delta_on_older_state_conflicts_with_auto_save(self):
+        self.assertEqual(self._auto_save(self.options[0]).status_code, 200)
+        self.attempt.refresh_from_db()
+        base_revision = self.attempt.answer_revision
+        self.assertEqual(self._auto_save(self.options[1]).status_code, 200)
+
+        response = self.client.post(self.url + 'delta/', {
+            'base_revision': base_revision,
+            'answers': {str(self.question.id): {'selected_options': [str(self.options[3].id)]}},
+        }, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['revision'], base_revision + 1)
+        self.assertEqual(self._selected(), [self.options[1].id])
+
+    def test_unchanged_auto_save_keeps_the_revision(self):
+        self._auto_save(self.options[0])
+        self.attempt.refresh_from_db()
+        revision = self.attempt.answer_revision
+        response = self._auto_save(self.options[0])
+        self.assertEqual(response.json()['unchanged_answers'], 1)
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.answer_revision, revision)
+
+    @override_settings(ANSWER_WRITE_BEHIND=True)
+    def test_unchanged_buffered_auto_save_keeps_the_revision(self):
+        self._auto_save(self.options[0])
+        self.attempt.refresh_from_db()
+        revision = self.attempt.answer_revision
+        response = self._auto_save(self.options[0])
+        self.assertEqual(response.json()['unchanged_answers'], 1)
+
+        response = self.client.post(self.url + 'delta/', {
+            'base_revision': revision,
+            'answers': {str(self.question.id): {'selected_options': [str(self.options[3].id)]}},
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['revision'], revision + 1)
+
+
+class QuestionPaperTests(TestCase):
+    """Question papers served to candidates"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='candidate')
+        exam = Exam.objects.create(name='Exam', description='Exam', created_by=self.user)
+        self.test = Test.objects.create(
+            exam=exam, title='Paper', description='Paper', duration_minutes=60, total_marks=4,
+            created_by=self.user,
+        )
+        bank = QuestionBank.objects.create(name='Bank', created_by=self.user)
+        self.question = Question.objects.create(
+            question_bank=bank, question_text='Pick one', question_type='mcq', marks=2,
+            expected_answer='Option 0', explanation='Option 0 is right',
+        )
+        for order in range(2):
+            QuestionOption.objects.create(
+                question=self.question, option_text=f'Option {order}', is_correct=order == 0, order=order
+            )
+        TestQuestion.objects.create(test=self.test, question=self.question, order=1, marks=2)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _paper(self, attempt):
+        response = self.client.get(f'/api/v1/exams/test-attempts/{attempt.id}/questions/')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def assertNoAnswers(self, paper):
+        self.assertEqual(len(paper), 1)
+        question = paper[0]['question']
+        self.assertEqual(question['question_text'], 'Pick one')
+        self.assertNotIn('expected_answer', question)
+        self.assertNotIn('explanation', question)
+        for option in question['options']:
+            self.assertNotIn('is_correct', option)
+
+    def test_shared_paper_has_no_answers(self):
+        attempt = TestAttempt.objects.create(test=self.test, user=self.user, total_questions=1)
+        self.assertNoAnswers(self._paper(attempt))
+
+    def test_own_paper_has_no_answers(self):
+        attempt = TestAttempt.objects.create(
+            test=self.test, user=self.user, total_questions=1,
+            question_ids=[str(self.question.id)], question_marks=[2],
+        )
+        self.assertNoAnswers(self._paper(attempt))
+
+
+class AttemptPaperTests(TestCase):
+    """Papers drawn per attempt from the test's question banks"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='candidate')
+        exam = Exam.objects.create(name='Exam', description='Exam', created_by=self.user)
+        self.test = Test.objects.create(
+            exam=exam, title='Paper', description='Paper', duration_minutes=60, total_marks=8,
+            created_by=self.user,
+        )
+        bank = QuestionBank.objects.create(name='Bank', created_by=self.user)
+        for number in range(10):
+            Question.objects.create(
+                question_bank=bank, question_text=f'Question {number}', question_type='fill_blank', marks=2,
+            )
+        self.rule = TestSelectionRule.objects.create(
+            test=self.test, selection_mode='random', total_questions=4,
+            included_banks=[str(bank.id)], per_attempt_papers=True,
+        )
+
+    def test_served_questions_do_not_exhaust_the_bank(self):
+        for _ in range(5):
+            question_ids, question_marks = draw_attempt_paper(self.test)
+            self.assertEqual(len(set(question_ids)), 4)
+            TestAttempt.objects.create(
+                test=self.test, user=self.user, total_questions=4,
+                question_ids=question_ids, question_marks=question_marks,
+            )
+            record_all_pending_exposure()
+
+    def test_short_draw_is_rejected(self):
+        self.rule.total_questions = 12
+        self.rule.save()
+        with self.assertRaises(PaperDrawError):
+            draw_attempt_paper(self.test)
+
+
+class PaperVariantTests(TestCase):
+    """Candidates sit variants of a test they start"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='author')
+        self.exam = Exam.objects.create(name='Exam', description='Exam', created_by=self.user)
+        bank = QuestionBank.objects.create(name='Bank', created_by=self.user)
+        self.papers = {}
+        self.base = None
+        for number in range(3):
+            test = Test.objects.create(
+                exam=self.exam, title=f'Paper {number}', description='Paper', duration_minutes=60,
+                total_marks=2, created_by=self.user, status='active', max_attempts=2,
+                variant_of=self.base, variant_number=number,
+            )
+            self.base = self.base or test
+            question = Question.objects.create(
+                question_bank=bank, question_text=f'Question {number}', question_type='fill_blank', marks=2,
+            )
+            TestQuestion.objects.create(test=test, question=question, order=1, marks=2)
+            self.papers[test.pk] = [str(question.id)]
+
+    def _start(self, client):
+        response = client.post(f'/api/v1/exams/tests/{self.base.id}/start_attempt/')
+        self.assertEqual(response.status_code, 201)
+        attempt = TestAttempt.objects.get(pk=response.json()['id'])
+        self.assertEqual(attempt.test_id, self.base.pk)
+        return attempt.question_ids or self.papers[self.base.pk]
+
+    def test_candidates_keep_their_variant_across_attempts(self):
+        sat = set()
+        for number in range(12):
+            client = APIClient()
+            client.force_authenticate(User.objects.create(username=f'candidate{number}'))
+            paper = self._start(client)
+            self.assertIn(paper, list(self.papers.values()))
+            TestAttempt.objects.filter(test=self.base).update(status='completed')
+            self.assertEqual(self._start(client), paper)
+            sat.add(tuple(paper))
+        self.assertGreater(len(sat), 1)
+
+    def test_variants_are_not_listed(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='candidate'))
+        response = client.get(f'/api/v1/exams/exams/{self.exam.id}/tests/')
+        self.assertEqual([test['id'] for test in response.json()], [str(self.base.id)])
+
+
+class DeadlineTests(TestCase):
+    """Finalizing attempts whose time ran out"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='candidate')
+        exam = Exam.objects.create(name='Exam', description='Exam', created_by=self.user)
+        test = Test.objects.create(
+            exam=exam, title='Paper', description='Paper', duration_minutes=60, total_marks=4,
+            created_by=self.user,
+        )
+        self.attempts = []
+        for minutes in range(5):
+            attempt = TestAttempt.objects.create(test=test, user=self.user, attempt_number=minutes + 1)
+            start_time = timezone.now() - timedelta(hours=3) + timedelta(minutes=minutes)
+            TestAttempt.objects.filter(pk=attempt.pk).update(start_time=start_time)
+            self.attempts.append(attempt.pk)
+
+    def test_failing_attempts_do_not_block_later_ones(self):
+        finalize = deadlines.finalize_expired_attempt
+        failing = set(self.attempts[:2])
+
+        def finalize_or_fail(attempt, **kwargs):
+            if attempt.pk in failing:
+                raise ValueError('cannot grade')
+            return finalize(attempt, **kwargs)
+
+        with mock.patch.object(deadlines, 'finalize_expired_attempt', finalize_or_fail):
+            stats = deadlines.DeadlineScheduler(batch_size=2).expire_due()
+
+        self.assertEqual(stats, {'expired': 3, 'errors': 2})
+        statuses = dict(TestAttempt.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[pk] for pk in self.attempts], ['in_progress'] * 2 + ['submitted'] * 3)
+
+    @override_settings(ANSWER_WRITE_BEHIND=True)
+    def test_failed_finalize_keeps_buffered_answers(self):
+        attempt = TestAttempt.objects.get(pk=self.attempts[0])
+        bank = QuestionBank.objects.create(name='Bank', created_by=self.user)
+        question = Question.objects.create(
+            question_bank=bank, question_text='Capital of France', question_type='fill_blank', marks=2,
+        )
+        TestQuestion.objects.create(test=attempt.test, question=question, order=1, marks=2)
+        buffer = answer_buffer.AnswerBuffer(attempt)
+        buffer.add({question.id: {'text_answer': 'Paris'}})
+
+        with self.captureOnCommitCallbacks(execute=True), mock.patch.object(
+            deadlines.AttemptGrader, 'grade', side_effect=ValueError('cannot grade')
+        ):
+            stats = deadlines.DeadlineScheduler().expire_due()
+
+        self.assertEqual(stats, {'expired': 0, 'errors': 5})
+        self.assertEqual(list(buffer.pending()), [question.id])
+
+
+class GradingQueueTests(TestCase):
+    """Claiming jobs from the grading queue"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='candidate')
+        exam = Exam.objects.create(name='Exam', description='Exam', created_by=self.user)
+        self.test = Test.objects.create(
+            exam=exam, title='Paper', description='Paper', duration_minutes=60, total_marks=4,
+            created_by=self.user, max_attempts=10,
+        )
+
+    def _stale_job(self, tries):
+        attempt = TestAttempt.objects.create(test=self.test, user=self.user, status='submitted')
+        return GradingJob.objects.create(
+            attempt=attempt, status='running', tries=tries, worker='gone',
+            started_at=timezone.now() - timedelta(hours=1),
+        )
+
+    def test_stale_jobs_out_of_tries_are_failed(self):
+        retried = self._stale_job(tries=1)
+        given_up = [self._stale_job(tries=3) for _ in range(3)]
+
+        jobs = grading_queue.claim_jobs('worker', limit=2)
+
+        self.assertEqual([job.pk for job in jobs], [retried.pk])
+        statuses = dict(GradingJob.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[retried.pk], 'running')
+        self.assertEqual(sorted(statuses[job.pk] for job in given_up), ['failed', 'failed', 'running'])
+
+        grading_queue.claim_jobs('worker', limit=2)
+        self.assertEqual(GradingJob.objects.filter(status='failed').count(), 3)
+
+    @override_settings(ANSWER_WRITE_BEHIND=True)
+    def test_failed_grading_keeps_buffered_answers(self):
+        bank = QuestionBank.objects.create(name='Bank', created_by=self.user)
+        question = Question.objects.create(
+            question_bank=bank, question_text='Capital of France', question_type='fill_blank', marks=2,
+        )
+        TestQuestion.objects.create(test=self.test, question=question, order=1, marks=2)
+        attempt = TestAttempt.objects.create(test=self.test, user=self.user, status='submitted', total_questions=1)
+        buffer = answer_buffer.AnswerBuffer(attempt)
+        buffer.add({question.id: {'text_answer': 'Paris'}})
+        job = GradingJob.objects.create(attempt=attempt, status='running', worker='worker')
+
+        with mock.patch.object(grading_queue.AttemptGrader, 'grade', side_effect=ValueError('cannot grade')):
+            self.assertFalse(grading_queue.run_job(job))
+
+        self.assertFalse(UserAnswer.objects.filter(test_attempt=attempt).exists())
+        self.assertEqual(list(buffer.pending()), [question.id])
@@ -22,14 +22,29 @@ from .serializers import (
     ExamSerializer, TestSerializer, TestSectionSerializer,
     TestAttemptSerializer, TestDetailSerializer
 )
-from questions.models import UserAnswer, Question, TestQuestion
+from . import answer_buffer
+from .autocomplete import autocomplete
+from .answer_store import AnswerBatchWriter
+from .deadlines import finalize_expired_attempt
+from .grading import AttemptGrader
+from .question_content import shuffle_options
+from .question_paper import SHUFFLED_OPTION_TYPES
+from questions.models import UserAnswer, Question, QuestionOption, TestQuestion
 from core.decorators import (
     api_rate_limit, test_submission_rate_limit, require_role,
     security_check, validate_test_access, log_user_action, cache_control
 )
 from core.security import sanitize_user_input, validate_test_attempt_data, log_security_event
 from core.exam_utils import find_compatible_question_banks, get_exam_question_bank_suggestions
-from core.question_selection import QuestionSelectionEngine
+from core.paper_generation import variant_paper
+from core.question_selection import PaperDrawError, QuestionSelectionEngine, draw_attempt_paper, preview_selection
+from core.randomization import seeded_permutation
+from core.search import search_queryset
+
+
+def _organization_match(query):
+    """Filter for exams whose organization's name contains query (organizations are few)"""
+    return Q(organization_id__in=Organization.objects.filter(name__icontains=query).values('id'))
 
 
 # Template Views
@@ -45,12 +60,7 @@ def exam_list(request):
     # Search functionality with input sanitization
     search = sanitize_user_input(request.GET.get('search', ''))
     if search:
-        exams = exams.filter(
-            Q(name__icontains=search) | 
-            Q(description__icontains=search) |
-            Q(category__icontains=search) |
-            Q(organization__name__icontains=search)
-        )
+        exams = search_queryset(exams, search, also=_organization_match(search)).order_by('-search_rank')
     
     # Category filter with input sanitization
     category = sanitize_user_input(request.GET.get('category', ''))
@@ -111,14 +121,10 @@ def exam_management(request):
     # Search functionality
     search = sanitize_user_input(request.GET.get('search', ''))
     if search:
-        exams = exams.filter(
-            Q(name__icontains=search) | 
-            Q(description__icontains=search) |
-            Q(category__icontains=search)
-        )
-    
-    # Add ordering to prevent pagination warnings
-    exams = exams.order_by('-created_at')
+        exams = search_queryset(exams, search).order_by('-search_rank', '-created_at')
+    else:
+        # Add ordering to prevent pagination warnings
+        exams = exams.order_by('-created_at')
     
     paginator = Paginator(exams, 15)
     page = request.GET.get('page')
@@ -391,7 +397,7 @@ def delete_test(request, test_id):
 def exam_detail(request, exam_id):
     """Exam detail view with available tests"""
     exam = get_object_or_404(Exam, id=exam_id, is_active=True)
-    tests = exam.tests.filter(is_published=True).annotate(
+    tests = exam.tests.filter(is_published=True, variant_of__isnull=True).annotate(
         attempts_count=Count('attempts'),
         avg_score=Avg('attempts__percentage')
     )
@@ -480,7 +486,8 @@ def test_detail(request, test_id):
 @login_required
 def start_test(request, test_id):
     """Start a new test attempt"""
-    test = get_object_or_404(Test, id=test_id)
+    # Candidates start the base test and are assigned one of its variants
+    test = get_object_or_404(Test, id=test_id, variant_of__isnull=True)
     
     # Validation checks
     if not test.is_published and test.created_by != request.user:
@@ -517,17 +524,55 @@ def start_test(request, test_id):
     # Calculate attempt number
     attempt_number = TestAttempt.objects.filter(user=request.user, test=test).count() + 1
     
+    # Tests in per-attempt mode draw a separate paper for every attempt;
+    # tests with variants give each candidate one of them
+    try:
+        paper = draw_attempt_paper(test) or variant_paper(test, request.user)
+    except PaperDrawError as e:
+        messages.error(request, str(e))
+        return redirect('test-detail', test_id=test_id)
     attempt = TestAttempt.objects.create(
         test=test,
         user=request.user,
         attempt_number=attempt_number,
-        total_questions=test.test_questions.count()
+        total_questions=len(paper[0]) if paper else test.test_questions.count(),
+        question_ids=paper[0] if paper else None,
+        question_marks=paper[1] if paper else None
     )
     
     messages.success(request, f"Test started successfully! (Attempt {attempt_number} of {test.max_attempts})")
     return redirect('take-test', attempt_id=attempt.id)
 
 
+def _overlay_buffered_answers(attempt, answers_dict):
+    """Apply buffered, not yet flushed answers to the {question id: UserAnswer} map"""
+    pending = answer_buffer.AnswerBuffer(attempt).pending()
+    if not pending:
+        return
+    
+    option_ids = {
+        option_id for fields in pending.values() for option_id in fields.get('selected_options', [])
+    }
+    options = QuestionOption.objects.in_bulk(option_ids) if option_ids else {}
+    for question_id, fields in pending.items():
+        answer = answers_dict.get(question_id)
+        if answer is None:
+            answer = answers_dict[question_id] = UserAnswer(test_attempt=attempt, question_id=question_id)
+        for field in ('text_answer', 'boolean_answer', 'is_marked_for_review', 'time_spent_seconds'):
+            if field in fields:
+                setattr(answer, field, fields[field])
+        if 'selected_options' in fields:
+            # Serve the buffered selection from the prefetch cache, as if it were stored
+            selected = answer.selected_options.none()
+            selected._result_cache = [
+                options[option_id] for option_id in fields['selected_options'] if option_id in options
+            ]
+            selected._prefetch_done = True
+            answer._prefetched_objects_cache = {
+                **getattr(answer, '_prefetched_objects_cache', {}), 'selected_options': selected,
+            }
+
+
 @login_required
 @security_check
 @log_user_action('take_test')
@@ -544,21 +589,39 @@ def take_test(request, attempt_id):
     time_elapsed = timezone.now() - attempt.start_time
     
     if time_elapsed >= test_duration:
-        # Auto-submit the test
-        attempt.status = 'submitted'
-        attempt.end_time = timezone.now()
-        attempt.save()
+        # Auto-submit and grade the test
+        finalize_expired_attempt(attempt)
         messages.info(request, "Test time has expired. Your answers have been submitted.")
         return redirect('test-results', attempt_id=attempt_id)
     
     # Get test questions
-    test_questions = TestQuestion.objects.filter(
-        test=attempt.test
-    ).select_related('question').prefetch_related('question__options').order_by('order')
+    if attempt.question_ids is not None:
+        # The attempt's own paper, as unsaved TestQuestion rows in paper order
+        questions = Question.objects.prefetch_related('options').in_bulk(attempt.question_ids)
+        questions = {str(question_id): question for question_id, question in questions.items()}
+        test_questions = [
+            TestQuestion(test=attempt.test, question=questions[question_id], order=order, marks=marks)
+            for order, (question_id, marks) in enumerate(
+                zip(attempt.question_ids, attempt.question_marks or []), start=1
+            )
+            if question_id in questions
+        ]
+    else:
+        test_questions = TestQuestion.objects.filter(
+            test=attempt.test
+        ).select_related('question').prefetch_related('question__options').order_by('order')
+        
+        # Randomize if enabled, with an order that stays stable for this attempt
+        if attempt.test.randomize_questions:
+            test_questions = seeded_permutation(test_questions, attempt.pk)
     
-    # Randomize if enabled
+    # Shuffle choice options the way the API paper does
     if attempt.test.randomize_questions:
-        test_questions = test_questions.order_by('?')
+        for test_question in test_questions:
+            question = test_question.question
+            if question.question_type in SHUFFLED_OPTION_TYPES:
+                options = question.options.all()
+                options._result_cache = shuffle_options(list(options), attempt.pk, question.id)
     
     # Get user's existing answers
     user_answers = UserAnswer.objects.filter(
@@ -566,9 +629,11 @@ def take_test(request, attempt_id):
     ).select_related('question').prefetch_related('selected_options')
     
     answers_dict = {answer.question_id: answer for answer in user_answers}
+    if answer_buffer.is_enabled():
+        _overlay_buffered_answers(attempt, answers_dict)
     
     # Calculate progress
-    answered_count = user_answers.count()
+    answered_count = len(answers_dict)
     progress_percentage = (answered_count / attempt.total_questions * 100) if attempt.total_questions > 0 else 0
     
     # Calculate remaining time
@@ -602,42 +667,43 @@ def save_answer(request, attempt_id):
     question_id = request.POST.get('question_id')
     question = get_object_or_404(Question, id=question_id)
     
-    # Get or create user answer
-    user_answer, created = UserAnswer.objects.get_or_create(
-        test_attempt=attempt,
-        question=question,
-        defaults={'time_spent_seconds': 0}
-    )
-    
-    # Save answer based on question type
+    # Build the answer based on question type
+    answer_data = {'marked_for_review': request.POST.get('mark_for_review') == 'true'}
     if question.question_type == 'mcq':
         selected_option_id = request.POST.get('selected_option')
         if selected_option_id:
-            user_answer.selected_options.clear()
-            user_answer.selected_options.add(selected_option_id)
+            answer_data['selected_options'] = [selected_option_id]
     
     elif question.question_type == 'multi_select':
-        selected_options = request.POST.getlist('selected_options')
-        user_answer.selected_options.clear()
-        if selected_options:
-            user_answer.selected_options.add(*selected_options)
+        answer_data['selected_options'] = request.POST.getlist('selected_options')
     
     elif question.question_type == 'true_false':
         boolean_answer = request.POST.get('boolean_answer')
         if boolean_answer is not None:
-            user_answer.boolean_answer = boolean_answer.lower() == 'true'
+            answer_data['boolean_answer'] = boolean_answer.lower() == 'true'
     
     elif question.question_type in ['fill_blank', 'essay']:
         text_answer = request.POST.get('text_answer', '')
-        user_answer.text_answer = sanitize_user_input(text_answer)
+        answer_data['text_answer'] = sanitize_user_input(text_answer)
     
-    # Mark for review
-    user_answer.is_marked_for_review = request.POST.get('mark_for_review') == 'true'
-    user_answer.save()
+    writer = AnswerBatchWriter(attempt)
+    entries, rejected = writer.normalize({str(question.id): answer_data})
+    if rejected:
+        return JsonResponse({'error': 'Question is not part of this test'}, status=400)
     
-    # Update attempt stats
-    attempt.attempted_questions = UserAnswer.objects.filter(test_attempt=attempt).count()
-    attempt.save()
+    answered_ids = set(
+        UserAnswer.objects.filter(test_attempt=attempt).values_list('question_id', flat=True)
+    )
+    if answer_buffer.is_enabled():
+        buffer = answer_buffer.AnswerBuffer(attempt)
+        buffer.add(entries)
+        answered_ids.update(buffer.pending())
+    else:
+        writer.write(entries)
+        answered_ids.add(question.id)
+    
+    # Progress is reported without rewriting the attempt row on every save
+    attempt.attempted_questions = len(answered_ids)
     
     return JsonResponse({
         'success': True,
@@ -662,62 +728,10 @@ def submit_test(request, attempt_id):
     attempt.end_time = timezone.now()
     attempt.time_spent_seconds = int((attempt.end_time - attempt.start_time).total_seconds())
     
-    # Evaluate answers
-    user_answers = UserAnswer.objects.filter(test_attempt=attempt).prefetch_related('selected_options')
-    correct_answers = 0
-    total_marks = 0
-    
-    for answer in user_answers:
-        question = answer.question
-        is_correct = False
-        marks_obtained = 0
-        
-        if question.question_type == 'mcq':
-            correct_options = question.options.filter(is_correct=True)
-            selected_options = answer.selected_options.all()
-            
-            if len(selected_options) == 1 and len(correct_options) == 1:
-                if selected_options[0] in correct_options:
-                    is_correct = True
-                    marks_obtained = question.marks
-                else:
-                    marks_obtained = -question.negative_marks
-        
-        elif question.question_type == 'multi_select':
-            correct_options = set(question.options.filter(is_correct=True))
-            selected_options = set(answer.selected_options.all())
-            
-            if correct_options == selected_options:
-                is_correct = True
-                marks_obtained = question.marks
-            else:
-                marks_obtained = -question.negative_marks
-        
-        elif question.question_type == 'true_false':
-            # Simple true/false evaluation
-            if hasattr(answer, 'boolean_answer') and answer.boolean_answer is not None:
-                # This would need to be compared with the correct answer stored somewhere
-                # For now, assuming first option is correct answer
-                correct_option = question.options.filter(is_correct=True).first()
-                if correct_option:
-                    expected_answer = correct_option.option_text.lower() == 'true'
-                    if answer.boolean_answer == expected_answer:
-                        is_correct = True
-                        marks_obtained = question.marks
-                    else:
-                        marks_obtained = -question.negative_marks
-        
-        answer.is_correct = is_correct
-        answer.marks_obtained = marks_obtained
-        answer.save()
-        
-        if is_correct:
-            correct_answers += 1
-        total_marks += marks_obtained
-    
-    attempt.correct_answers = correct_answers
-    attempt.marks_obtained = max(0, total_marks)  # Don't allow negative total
-    attempt.percentage = (attempt.marks_obtained / attempt.test.total_marks * 100) if attempt.test.total_marks > 0 else 0
+    # Evaluate answers against the cached answer key
+    if answer_buffer.is_enabled():
+        answer_buffer.flush_attempt_answers(attempt)
+    AttemptGrader(attempt, negative_marking=True).grade()
     attempt.status = 'evaluated'
     attempt.save()
     
@@ -837,7 +851,7 @@ class TestViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(exam_id=exam_id)
         
         if self.request.user.role == 'student':
-            queryset = queryset.filter(is_published=True)
+            queryset = queryset.filter(is_published=True, variant_of__isnull=True)
         elif self.request.user.role == 'teacher':
             queryset = queryset.filter(
                 Q(created_by=self.request.user) | Q(is_published=True)
@@ -879,11 +893,21 @@ class TestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create new attempt
+        # Create new attempt, with its own paper when the test is in per-attempt
+        # mode or has variants
+        try:
+            paper = draw_attempt_paper(test) or variant_paper(test, user)
+        except PaperDrawError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         attempt = TestAttempt.objects.create(
             test=test,
             user=user,
-            total_questions=test.test_questions.count()
+            total_questions=len(paper[0]) if paper else test.test_questions.count(),
+            question_ids=paper[0] if paper else None,
+            question_marks=paper[1] if paper else None
         )
         
         serializer = TestAttemptSerializer(attempt)
@@ -909,21 +933,10 @@ class TestViewSet(viewsets.ModelViewSet):
         attempt.end_time = timezone.now()
         attempt.time_spent_seconds = (attempt.end_time - attempt.start_time).total_seconds()
         
-        # Get all answers
-        answers = UserAnswer.objects.filter(test_attempt=attempt)
-        attempt.attempted_questions = answers.count()
-        
-        correct_answers = 0
-        total_marks = 0
-        
-        for answer in answers:
-            if answer.is_correct:
-                correct_answers += 1
-                total_marks += answer.marks_obtained
-        
-        attempt.correct_answers = correct_answers
-        attempt.marks_obtained = total_marks
-        attempt.percentage = (total_marks / test.total_marks) * 100 if test.total_marks > 0 else 0
+        # Grade all answers against the cached answer key
+        if answer_buffer.is_enabled():
+            answer_buffer.flush_attempt_answers(attempt)
+        AttemptGrader(attempt).grade()
         attempt.status = 'submitted'
         attempt.save()
         
@@ -1158,11 +1171,11 @@ def enhanced_exam_management(request):
         
         search = request.GET.get('search', '')
         if search:
-            exams = exams.filter(
-                Q(name__icontains=search) | 
-                Q(organization__name__icontains=search) |
-                Q(category__icontains=search)
+            exams = search_queryset(exams, search, also=_organization_match(search)).order_by(
+                '-search_rank', '-created_at'
             )
+        else:
+            exams = exams.order_by('-created_at')
         
         # Get filter options
         organizations = Organization.objects.filter(is_active=True)
@@ -1170,7 +1183,7 @@ def enhanced_exam_management(request):
         categories = Exam.objects.values_list('category', flat=True).distinct().order_by('category')
         
         context = {
-            'exams': exams.order_by('-created_at'),
+            'exams': exams,
             'organizations': organizations,
             'years': [y for y in years if y],
             'categories': [c for c in categories if c],
@@ -1248,44 +1261,13 @@ def exam_metadata_edit(request, exam_id):
 
 @login_required
 def ajax_exam_search(request):
-    """AJAX endpoint for exam search autocomplete"""
+    """AJAX endpoint for exam search autocomplete, answered from the in-memory prefix index"""
     query = request.GET.get('q', '')
     if len(query) < 2:
         return JsonResponse({'results': []})
     
-    # Search in exams and organizations
-    exams = Exam.objects.filter(
-        Q(name__icontains=query) | 
-        Q(organization__name__icontains=query) |
-        Q(category__icontains=query)
-    ).select_related('organization')[:10]
-    
-    results = []
-    for exam in exams:
-        results.append({
-            'id': str(exam.id),
-            'text': exam.name,
-            'organization': exam.organization.name if exam.organization else 'N/A',
-            'category': exam.category,
-            'year': exam.year or 'N/A',
-            'url': f'/exams/{exam.id}/'
-        })
-    
-    # Also search organizations
-    orgs = Organization.objects.filter(
-        Q(name__icontains=query) | Q(short_name__icontains=query)
-    )[:5]
-    
-    for org in orgs:
-        results.append({
-            'id': f'org_{org.id}',
-            'text': org.name,
-            'type': 'organization',
-            'exams_count': org.exams.count(),
-            'url': f'/exams/organization/{org.id}/'
-        })
-    
-    return JsonResponse({'results': results})
+    # Exams first, then organizations with their precomputed exam counts
+    return JsonResponse({'results': autocomplete(query)})
 
 
 @login_required
@@ -1470,6 +1452,8 @@ def save_selection_rules(request, test_id):
         selection_rule.year_range = data.get('year_range', {})
         selection_rule.included_topics = data.get('included_topics', [])
         selection_rule.excluded_topics = data.get('excluded_topics', [])
+        selection_rule.included_tags = data.get('included_tags', [])
+        selection_rule.excluded_tags = data.get('excluded_tags', [])
         selection_rule.included_banks = data.get('included_banks', [])
         selection_rule.excluded_questions = data.get('excluded_questions', [])
         
@@ -1477,6 +1461,8 @@ def save_selection_rules(request, test_id):
         selection_rule.ensure_topic_coverage = data.get('ensure_topic_coverage', True)
         selection_rule.avoid_duplicates_from_attempts = data.get('avoid_duplicates_from_attempts', True)
         selection_rule.priority_new_questions = data.get('priority_new_questions', False)
+        selection_rule.max_exposure = data.get('max_exposure') or None
+        selection_rule.prefer_less_exposed = data.get('prefer_less_exposed', False)
         
         selection_rule.save()
         
@@ -1554,34 +1540,12 @@ def preview_question_selection(request, test_id):
         from .models import TestSelectionRule
         selection_rule = TestSelectionRule.objects.get(test=test)
         
-        # Run selection engine
-        engine = QuestionSelectionEngine(test.exam, selection_rule)
-        selected_questions = engine.select_questions()
-        
-        # Get distribution preview
-        preview = engine.get_distribution_preview()
-        
-        # Validate selection
-        is_valid, errors = engine.validate_selection()
-        
-        # Serialize questions for response
-        questions_data = []
-        for q in selected_questions[:10]:  # Show first 10 as preview
-            questions_data.append({
-                'id': str(q.id),
-                'text': q.question_text[:100] + '...' if len(q.question_text) > 100 else q.question_text,
-                'type': q.question_type,
-                'difficulty': q.difficulty,
-                'category': q.question_bank.category if q.question_bank else 'N/A',
-                'bank': q.question_bank.name if q.question_bank else 'N/A',
-            })
+        # Memoized per rule fingerprint, so repeated previews while tuning are cheap
+        payload = preview_selection(test, selection_rule)
         
         return JsonResponse({
             'success': True,
-            'preview': preview,
-            'sample_questions': questions_data,
-            'is_valid': is_valid,
-            'validation_errors': errors
+            **payload
         })
         
     except Exception as e:
@@ -1671,9 +1635,13 @@ def save_selection_template(request):
             year_range=data.get('year_range', {}),
             included_topics=data.get('included_topics', []),
             excluded_topics=data.get('excluded_topics', []),
+            included_tags=data.get('included_tags', []),
+            excluded_tags=data.get('excluded_tags', []),
             ensure_topic_coverage=data.get('ensure_topic_coverage', True),
             avoid_duplicates_from_attempts=data.get('avoid_duplicates_from_attempts', True),
             priority_new_questions=data.get('priority_new_questions', False),
+            max_exposure=data.get('max_exposure') or None,
+            prefer_less_exposed=data.get('prefer_less_exposed', False),
             is_public=data.get('is_public', False)
         )
         
@@ -1713,9 +1681,13 @@ def load_selection_template(request, template_id):
         'year_range': template.year_range,
         'included_topics': template.included_topics,
         'excluded_topics': template.excluded_topics,
+        'included_tags': template.included_tags,
+        'excluded_tags': template.excluded_tags,
         'ensure_topic_coverage': template.ensure_topic_coverage,
         'avoid_duplicates_from_attempts': template.avoid_duplicates_from_attempts,
         'priority_new_questions': template.priority_new_questions,
+        'max_exposure': template.max_exposure,
+        'prefer_less_exposed': template.prefer_less_exposed,
     })
 
 
@@ -2,12 +2,13 @@ from django.contrib import admin
 from django.urls import path, reverse
 from django.utils.html import format_html
 from django.http import HttpResponseRedirect
-from .models import QuestionBank, Question, ContentUpload
+from core.search import SearchIndexAdminMixin
+from .models import QuestionBank, Question, ContentUpload, ImportJob
 from .views import ContentUploadView, ContentProcessingView, content_upload_status, content_upload_delete
 
 
 @admin.register(QuestionBank)
-class QuestionBankAdmin(admin.ModelAdmin):
+class QuestionBankAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
     list_display = ['name', 'category', 'exam_type', 'question_count', 'imported_from_json', 'created_at']
     list_filter = ['category', 'exam_type', 'imported_from_json', 'created_at']
     search_fields = ['name', 'description', 'category', 'exam_type']
@@ -19,14 +20,14 @@ class QuestionBankAdmin(admin.ModelAdmin):
 
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
     list_display = ['text_preview', 'question_bank', 'question_type', 'difficulty', 'marks', 'imported_from_json']
     list_filter = ['question_type', 'difficulty', 'question_bank__category', 'imported_from_json', 'created_at']
-    search_fields = ['text', 'question_bank__name']
+    search_fields = ['question_text', 'topic', 'subtopic']
     readonly_fields = ['created_at', 'updated_at', 'imported_from_json', 'json_import_batch']
     
     def text_preview(self, obj):
-        return obj.text[:100] + '...' if len(obj.text) > 100 else obj.text
+        return obj.question_text[:100] + '...' if len(obj.question_text) > 100 else obj.question_text
     text_preview.short_description = 'Question Text'
 
 
@@ -76,3 +77,14 @@ class ContentUploadAdmin(admin.ModelAdmin):
 admin.site.site_header = "247Exams Admin"
 admin.site.site_title = "247Exams Admin Portal"
 admin.site.index_title = "Welcome to 247Exams Administration"
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['upload', 'status', 'records_processed', 'records_total', 'attempts', 'worker', 'heartbeat_at', 'created_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = [
+        'upload', 'requested_by', 'worker', 'attempts', 'heartbeat_at', 'checkpoint', 'records_total',
+        'records_processed', 'records_created', 'records_failed', 'records_skipped', 'records_at_start',
+        'error', 'created_at', 'started_at', 'finished_at'
+    ]
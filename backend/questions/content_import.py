@@ -0,0 +1,436 @@
+"""
+Streaming import of question bank JSON.
+An uploaded question bank file is kept on disk and read incrementally: the
+top-level fields (name, description, ...) are decoded whole, while the
+questions array is decoded one record at a time. Each record is validated on
+its own and written in chunks of CONTENT_IMPORT_CHUNK_SIZE questions with one
+bulk_create for the questions and one for their options, so memory stays
+flat whatever the file size and a 50k-question bank takes a few hundred
+statements instead of a quarter of a million.
+
+ijson parses when installed; otherwise a small incremental reader on top of
+json.JSONDecoder.raw_decode walks the same document.
+
+bulk_create skips model signals, so the importer does what the signals would
+have: tag links per chunk, and the bank's counters and question pool version
+once at the end.
+"""
+
+import codecs
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from core.question_pool import invalidate_question_pool
+from .models import Question, QuestionOption
+from .question_counts import refresh_question_counts
+from .tagging import reindex_tags
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+    IJSON_AVAILABLE = True
+except ImportError:
+    ijson = None
+    ObjectBuilder = None
+    IJSON_AVAILABLE = False
+
+
+QUESTIONS_KEY = 'questions'
+READ_SIZE = 64 * 1024
+NUMBER_CHARACTERS = set('0123456789+-.eE')
+MAX_LOGGED_ERRORS = 50
+
+QUESTION_TYPES = {value for value, _ in Question.QUESTION_TYPES}
+DIFFICULTY_LEVELS = {value for value, _ in Question.DIFFICULTY_LEVELS}
+SHORT_TEXT_FIELDS = ('topic', 'subtopic')
+
+# Errors a malformed document raises while it is walked
+DOCUMENT_ERRORS = (json.JSONDecodeError, UnicodeDecodeError) + ((ijson.JSONError,) if IJSON_AVAILABLE else ())
+
+
+class _DocumentReader:
+    """Incremental reader of a top-level JSON object from a binary stream"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.scanner = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        data = self.stream.read(READ_SIZE)
+        self.eof = not data
+        text = self.utf8.decode(data, final=self.eof)
+        if not text:
+            return not self.eof
+        self.buffer = self.buffer[self.position:] + text
+        self.position = 0
+        return True
+
+    def _error(self, message):
+        return json.JSONDecodeError(message, self.buffer, self.position)
+
+    def _peek(self):
+        """Next non-whitespace character, '' at the end of the stream"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n':
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ''
+
+    def _expect(self, characters):
+        character = self._peek()
+        if not character or character not in characters:
+            raise self._error(f'Expecting one of {characters!r}')
+        self.position += 1
+        return character
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.scanner.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number cut off by the end of the buffer ("1." of "1.5") may go on in the next chunk
+            cut = end == len(self.buffer) or (
+                isinstance(value, (int, float)) and self.buffer[end] in NUMBER_CHARACTERS
+            )
+            if cut and self._fill():
+                continue
+            self.position = end
+            return value
+
+    def events(self, array_key):
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise self._error('Expecting property name')
+            self._expect(':')
+            if key == array_key and self._peek() == '[':
+                self.position += 1
+                if self._peek() == ']':
+                    self.position += 1
+                else:
+                    while True:
+                        yield 'item', self._value()
+                        if self._expect(',]') == ']':
+                            break
+                yield 'field', key, []
+            else:
+                yield 'field', key, self._value()
+            if self._expect(',}') == '}':
+                return
+
+
+def _build(parser, event, value):
+    """The value starting at this ijson event, consuming the parser up to its end"""
+    if event not in ('start_map', 'start_array'):
+        return value
+    builder = ObjectBuilder()
+    depth = 0
+    while True:
+        builder.event(event, value)
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+        if depth == 0:
+            return builder.value
+        _, event, value = next(parser)
+
+
+def _ijson_events(stream, array_key):
+    parser = ijson.parse(stream, use_float=True)
+    for prefix, event, value in parser:
+        # Anything else at the top is the document's own start and end
+        if prefix != '' or event != 'map_key':
+            continue
+        key = value
+        _, event, value = next(parser)
+        if key == array_key and event == 'start_array':
+            for _, event, value in parser:
+                if event == 'end_array':
+                    break
+                yield 'item', _build(parser, event, value)
+            yield 'field', key, []
+        else:
+            yield 'field', key, _build(parser, event, value)
+
+
+def iter_document(stream, array_key=QUESTIONS_KEY):
+    """
+    Walk a JSON object in a binary stream, yielding ('field', key, value)
+    for each top-level field and ('item', value) for each element of the
+    array_key array, whose own field event carries an empty list.
+    """
+    if IJSON_AVAILABLE:
+        return _ijson_events(stream, array_key)
+    return _DocumentReader(stream).events(array_key)
+
+
+def iter_questions(stream):
+    """Question records of a question bank document, one at a time"""
+    for event in iter_document(stream):
+        if event[0] == 'item':
+            yield event[1]
+
+
+def _decimal(value, field):
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f'{field} must be a number')
+    if not number.is_finite() or abs(number) >= 1000:
+        raise ValueError(f'{field} must be a number below 1000')
+    return number.quantize(Decimal('0.01'))
+
+
+def clean_question(record):
+    """
+    Validate a question record and return (Question field values, option
+    texts, correct option indexes). Raises ValueError naming the problem.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('question must be an object')
+
+    text = record.get('text', record.get('question_text', ''))
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError('question text is required')
+
+    question_type = record.get('question_type', 'mcq')
+    if question_type not in QUESTION_TYPES:
+        raise ValueError(f'unknown question_type {question_type!r}')
+    difficulty = record.get('difficulty', 'intermediate')
+    if difficulty not in DIFFICULTY_LEVELS:
+        raise ValueError(f'unknown difficulty {difficulty!r}')
+
+    tags = record.get('tags', [])
+    if not isinstance(tags, list):
+        raise ValueError('tags must be a list')
+
+    fields = {
+        'question_text': text,
+        'question_type': question_type,
+        'difficulty': difficulty,
+        'marks': _decimal(record.get('marks', 1), 'marks'),
+        'negative_marks': _decimal(record.get('negative_marks', 0), 'negative_marks'),
+        'explanation': str(record.get('explanation') or ''),
+        'tags': tags,
+    }
+    for field in SHORT_TEXT_FIELDS:
+        value = str(record.get(field) or '')
+        if len(value) > Question._meta.get_field(field).max_length:
+            raise ValueError(f'{field} is too long')
+        fields[field] = value
+
+    options = record.get('options') or []
+    if not isinstance(options, list) or any(
+        isinstance(option, (dict, list, bool)) or option is None for option in options
+    ):
+        raise ValueError('options must be a list of texts')
+
+    correct = record.get('correct_answer')
+    correct = correct if isinstance(correct, list) else [] if correct is None else [correct]
+    if any(isinstance(answer, bool) or not isinstance(answer, int) for answer in correct):
+        raise ValueError('correct_answer must be an option index or a list of them')
+
+    return fields, [str(option) for option in options], set(correct)
+
+
+class ImportStats:
+    """
+    Outcome of an import: records written, rejected and skipped, and the
+    time taken. A resumed import starts from the counts of earlier attempts;
+    processed and the rate cover this attempt only.
+    """
+
+    def __init__(self, created=0, failed=0, skipped=0):
+        self.created = created
+        self.failed = failed
+        self.skipped = skipped
+        self.initial = self.records
+        self.started = time.monotonic()
+        self.seconds = 0.0
+
+    @property
+    def records(self):
+        return self.created + self.failed + self.skipped
+
+    @property
+    def processed(self):
+        return self.records - self.initial
+
+    @property
+    def records_per_second(self):
+        return round(self.processed / self.seconds, 1) if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'records': self.records,
+            'processed': self.processed,
+            'created': self.created,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'seconds': round(self.seconds, 3),
+            'records_per_second': self.records_per_second,
+        }
+
+
+class QuestionImporter:
+    """
+    Writes question records into a bank in chunks. log is a list that
+    receives at most MAX_LOGGED_ERRORS messages about individual records.
+
+    To resume, resume_from is the number of records already done and stats
+    their counts. on_chunk(position, stats) runs in the transaction of every
+    chunk with the number of records done so far, so a checkpoint it writes
+    commits together with the chunk's rows.
+    """
+
+    def __init__(self, question_bank, batch_name, created_by=None, log=None, chunk_size=None,
+                 resume_from=0, stats=None, on_chunk=None):
+        self.question_bank = question_bank
+        self.batch_name = batch_name
+        self.created_by = created_by
+        self.log = log if log is not None else []
+        self.chunk_size = max(1, chunk_size or getattr(settings, 'CONTENT_IMPORT_CHUNK_SIZE', 1000))
+        self.resume_from = resume_from
+        self.stats = stats or ImportStats()
+        self.on_chunk = on_chunk
+        self._logged = 0
+
+    def _note(self, message):
+        if self._logged < MAX_LOGGED_ERRORS:
+            self.log.append(message)
+        elif self._logged == MAX_LOGGED_ERRORS:
+            self.log.append('Further messages about individual questions omitted')
+        self._logged += 1
+
+    def _build(self, number, record):
+        fields, options, correct = clean_question(record)
+        question = Question(
+            question_bank=self.question_bank,
+            imported_from_json=True,
+            json_import_batch=self.batch_name,
+            created_by=self.created_by,
+            **fields,
+        )
+        return number, question, [
+            QuestionOption(question=question, option_text=text, is_correct=order in correct, order=order)
+            for order, text in enumerate(options)
+        ]
+
+    def _write(self, rows):
+        """Insert a chunk of (number, question, options); a failing chunk is retried a row at a time"""
+        try:
+            with transaction.atomic():
+                Question.objects.bulk_create([question for _, question, _ in rows])
+                QuestionOption.objects.bulk_create([option for _, _, options in rows for option in options])
+            written = rows
+        except DatabaseError:
+            written = []
+            for number, question, options in rows:
+                try:
+                    with transaction.atomic():
+                        Question.objects.bulk_create([question])
+                        QuestionOption.objects.bulk_create(options)
+                    written.append((number, question, options))
+                except DatabaseError as e:
+                    self.stats.failed += 1
+                    self._note(f'Failed to create question {number}: {str(e)}')
+
+        self.stats.created += len(written)
+        tagged = [question.pk for _, question, _ in written if question.tags]
+        if tagged:
+            reindex_tags(Question, tagged)
+
+    def _flush(self, chunk, position):
+        with transaction.atomic():
+            self._write(chunk)
+            if self.on_chunk is not None:
+                self.on_chunk(position, self.stats)
+
+    def run(self, records, skip=()):
+        """Import records (any iterable of dicts), leaving out the 1-based record numbers in skip"""
+        chunk = []
+        position = self.resume_from
+        for number, record in enumerate(records, start=1):
+            if number <= self.resume_from:
+                continue
+            position = number
+            if number in skip:
+                self.stats.skipped += 1
+                self._note(f'Skipped potential duplicate question {number}')
+                continue
+            try:
+                chunk.append(self._build(number, record))
+            except ValueError as e:
+                self.stats.failed += 1
+                self._note(f'Failed to create question {number}: {str(e)}')
+                continue
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk, position)
+                chunk = []
+        self._flush(chunk, position)
+
+        invalidate_question_pool(self.question_bank.pk)
+        self.question_bank.total_questions = refresh_question_counts(self.question_bank)
+        self.stats.seconds = time.monotonic() - self.stats.started
+        return self.stats
+
+
+def scan_question_bank(stream, on_chunk=None, chunk_size=None):
+    """
+    Validate a question bank document in one pass without keeping its
+    questions. Returns (top-level fields without the questions, number of
+    questions or None without a questions array, [(record number, error)]
+    for at most MAX_LOGGED_ERRORS invalid records, number invalid).
+    on_chunk, if given, is called with lists of (record number, record) of
+    the valid records, chunk_size at a time.
+    """
+    chunk_size = max(1, chunk_size or getattr(settings, 'CONTENT_IMPORT_CHUNK_SIZE', 1000))
+    header = {}
+    count = None
+    errors = []
+    invalid = 0
+    chunk = []
+    number = 0
+    for event in iter_document(stream):
+        if event[0] == 'field':
+            if event[1] == QUESTIONS_KEY:
+                count = number
+            else:
+                header[event[1]] = event[2]
+            continue
+        number += 1
+        try:
+            clean_question(event[1])
+        except ValueError as e:
+            invalid += 1
+            if len(errors) < MAX_LOGGED_ERRORS:
+                errors.append((number, str(e)))
+            continue
+        if on_chunk is not None:
+            chunk.append((number, event[1]))
+            if len(chunk) >= chunk_size:
+                on_chunk(chunk)
+                chunk = []
+    if chunk:
+        on_chunk(chunk)
+    return header, count, errors, invalid
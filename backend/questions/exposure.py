@@ -0,0 +1,193 @@
+"""
+Question exposure ledger.
+Every paper issued to a candidate adds one to the served count of each of
+its questions, overall and in the cohort of the attempt's exam. Selection
+reads one cohort's counts with an indexed lookup instead of joining test
+questions against all attempts.
+
+Starting an attempt writes nothing here: every attempt on a popular test
+would update the same rows. New attempts are flagged as not yet counted,
+and `manage.py record_question_exposure` adds their papers in batches, so
+many attempts become one update per row. Reads never write: counts lag
+behind by at most one recording cycle.
+"""
+
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Question, QuestionExposure, TestQuestion
+
+ALL_COHORT = ''
+
+
+def exam_cohort(exam):
+    """Cohort key of the candidates of an exam"""
+    return f'exam:{getattr(exam, "pk", exam)}'
+
+
+def get_exposure_version(cohort):
+    """Version of a cohort's counts, advanced whenever they change"""
+    # Import here to avoid circular imports
+    from exams.cache_versions import EXPOSURE_SCOPE, get_version
+
+    return get_version(EXPOSURE_SCOPE, cohort)
+
+
+def _bump_exposure_versions(cohorts):
+    # Import here to avoid circular imports
+    from exams.cache_versions import EXPOSURE_SCOPE, bump_versions
+
+    bump_versions(EXPOSURE_SCOPE, cohorts)
+
+
+def add_exposure(counts, now=None):
+    """Add n servings for each (question id, cohort): n in counts"""
+    keys = sorted((str(question_id), cohort) for question_id, cohort in counts)
+    if not keys:
+        return
+    counts = {(str(question_id), cohort): n for (question_id, cohort), n in counts.items()}
+    question_ids = sorted({question_id for question_id, cohort in keys})
+    cohorts = sorted({cohort for question_id, cohort in keys})
+
+    QuestionExposure.objects.bulk_create(
+        [QuestionExposure(question_id=question_id, cohort=cohort) for question_id, cohort in keys],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    # Lock the rows in key order first, so concurrent batches queue up
+    # behind each other instead of deadlocking in the updates below
+    list(
+        QuestionExposure.objects.select_for_update().filter(
+            question_id__in=question_ids, cohort__in=cohorts
+        ).order_by('question_id', 'cohort').values_list('pk', flat=True)
+    )
+
+    groups = defaultdict(list)
+    for question_id, cohort in keys:
+        groups[(counts[(question_id, cohort)], cohort)].append(question_id)
+    now = now or timezone.now()
+    for (n, cohort), group in sorted(groups.items()):
+        QuestionExposure.objects.filter(question_id__in=group, cohort=cohort).update(
+            served_count=F('served_count') + n,
+            last_served_at=now,
+        )
+    _bump_exposure_versions(cohorts)
+
+
+def record_pending_exposure(limit=None):
+    """
+    Count the papers of a batch of attempts not yet in the ledger and
+    return the number of attempts counted. Attempts another process is
+    counting are skipped, not waited for.
+    """
+    # Import here to avoid circular imports
+    from exams.models import TestAttempt
+
+    limit = limit or getattr(settings, 'EXPOSURE_BATCH_SIZE', 1000)
+    with transaction.atomic():
+        pending = list(
+            TestAttempt.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                exposure_recorded=False
+            ).order_by('pk').values_list('pk', 'test_id', 'test__exam_id', 'question_ids')[:limit]
+        )
+        if not pending:
+            return 0
+
+        shared_tests = {test_id for _, test_id, _, question_ids in pending if not question_ids}
+        shared_papers = defaultdict(set)
+        for test_id, question_id in TestQuestion.objects.filter(test_id__in=shared_tests).values_list(
+            'test_id', 'question_id'
+        ):
+            shared_papers[test_id].add(str(question_id))
+
+        counts = Counter()
+        for _, test_id, exam_id, question_ids in pending:
+            paper = {str(question_id) for question_id in question_ids} if question_ids else shared_papers[test_id]
+            for question_id in paper:
+                counts[(question_id, ALL_COHORT)] += 1
+                counts[(question_id, exam_cohort(exam_id))] += 1
+
+        # Papers can outlive their questions
+        existing = {
+            str(question_id)
+            for question_id in Question.objects.filter(pk__in={key[0] for key in counts}).values_list('pk', flat=True)
+        }
+        add_exposure({key: n for key, n in counts.items() if key[0] in existing})
+        TestAttempt.objects.filter(pk__in=[row[0] for row in pending]).update(exposure_recorded=True)
+    return len(pending)
+
+
+def record_all_pending_exposure():
+    """Count every attempt not yet in the ledger, one batch at a time"""
+    limit = getattr(settings, 'EXPOSURE_BATCH_SIZE', 1000)
+    total = 0
+    while True:
+        counted = record_pending_exposure(limit)
+        total += counted
+        if counted < limit:
+            return total
+
+
+def get_exposure_counts(cohort, min_count=1):
+    """{question UUID: served count} of the questions served at least min_count times in a cohort"""
+    return dict(
+        QuestionExposure.objects.filter(cohort=cohort, served_count__gte=min_count).values_list(
+            'question_id', 'served_count'
+        )
+    )
+
+
+@transaction.atomic
+def rebuild_question_exposure():
+    """
+    Recount the ledger from attempt history and return the number of rows
+    written. Attempts with their own paper count its questions; the others
+    count their test's shared paper.
+    """
+    # Import here to avoid circular imports
+    from exams.models import TestAttempt
+
+    # Attempts started from here on are left to record_pending_exposure
+    TestAttempt.objects.filter(exposure_recorded=False).update(exposure_recorded=True)
+    attempts = TestAttempt.objects.filter(exposure_recorded=True)
+
+    counts = defaultdict(Counter)
+
+    shared = dict(
+        attempts.filter(question_ids__isnull=True).order_by().values('test_id').annotate(
+            n=Count('id')
+        ).values_list('test_id', 'n')
+    )
+    papers = TestQuestion.objects.filter(test_id__in=list(shared)).values_list(
+        'test_id', 'test__exam_id', 'question_id'
+    ).distinct()
+    for test_id, exam_id, question_id in papers.iterator(chunk_size=2000):
+        counts[str(question_id)][ALL_COHORT] += shared[test_id]
+        counts[str(question_id)][exam_cohort(exam_id)] += shared[test_id]
+
+    own = attempts.filter(question_ids__isnull=False).values_list('question_ids', 'test__exam_id')
+    for question_ids, exam_id in own.iterator(chunk_size=2000):
+        for question_id in set(question_ids or []):
+            counts[str(question_id)][ALL_COHORT] += 1
+            counts[str(question_id)][exam_cohort(exam_id)] += 1
+
+    # Papers can outlive their questions
+    existing = {
+        str(question_id)
+        for question_id in Question.objects.filter(pk__in=list(counts)).values_list('pk', flat=True)
+    }
+
+    previous_cohorts = set(QuestionExposure.objects.values_list('cohort', flat=True).distinct())
+    QuestionExposure.objects.all().delete()
+    rows = [
+        QuestionExposure(question_id=question_id, cohort=cohort, served_count=n)
+        for question_id, cohorts in counts.items() if question_id in existing
+        for cohort, n in cohorts.items()
+    ]
+    QuestionExposure.objects.bulk_create(rows, batch_size=1000)
+    _bump_exposure_versions(previous_cohorts | {row.cohort for row in rows})
+    return len(rows)
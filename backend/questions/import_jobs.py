@@ -0,0 +1,245 @@
+"""
+Background import jobs.
+Processing a content upload used to run inside the HTTP request, so large
+uploads outlived the gunicorn timeout and were left in 'processing'. Now
+api_content_process creates an ImportJob and runs it inline. With
+IMPORT_BACKGROUND_JOBS set, uploads over IMPORT_INLINE_MAX_RECORDS are
+left queued instead and the run_import_workers command runs them on a
+pool of worker threads.
+
+A worker claims a job with a compare-and-set update and sends a heartbeat
+with every chunk of questions. A job whose heartbeat is older than
+IMPORT_JOB_STALE_AFTER seconds is claimed again, up to
+IMPORT_JOB_MAX_ATTEMPTS attempts. Question bank imports write a checkpoint
+(the bank and the number of records done) in the same transaction as each
+chunk, so the next attempt picks up after the last committed chunk; other
+content is small and is processed in one transaction.
+
+The processing log of an upload is a bounded, append-only table
+(ContentUploadLog) that ProcessingLog presents as a list.
+"""
+
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .content_import import ImportStats
+from .models import ContentUpload, ContentUploadLog, ImportJob
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class JobLost(Exception):
+    """The job was claimed by another worker after this one stopped sending heartbeats"""
+
+
+class ProcessingLog:
+    """
+    List-like log of an upload. append() inserts a ContentUploadLog row at
+    once; reading loads the rows. Past CONTENT_UPLOAD_LOG_LIMIT entries one
+    last note is written and later entries are dropped.
+    """
+
+    def __init__(self, upload):
+        self.upload = upload
+        self.job = None
+        self._count = None
+
+    def append(self, entry):
+        limit = getattr(settings, 'CONTENT_UPLOAD_LOG_LIMIT', 500)
+        if self._count is None:
+            self._count = ContentUploadLog.objects.filter(upload_id=self.upload.pk).count()
+        if self._count > limit:
+            return
+        if self._count == limit:
+            entry = f'Log limit of {limit} entries reached; later entries are not kept'
+
+        data = entry if isinstance(entry, dict) else None
+        message = str(entry.get('error') or entry.get('step') or '') if data is not None else str(entry)
+        ContentUploadLog.objects.create(upload_id=self.upload.pk, job=self.job, message=message, data=data)
+        self._count += 1
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def entries(self, last=None):
+        """Logged entries, oldest first (only the last ones when last is set)"""
+        rows = ContentUploadLog.objects.filter(upload_id=self.upload.pk).order_by('-id').values_list('message', 'data')
+        if last is not None:
+            rows = rows[:last]
+        return [data if data is not None else message for message, data in reversed(list(rows))]
+
+    def __iter__(self):
+        return iter(self.entries())
+
+    def __len__(self):
+        return ContentUploadLog.objects.filter(upload_id=self.upload.pk).count()
+
+    def __getitem__(self, index):
+        return self.entries()[index]
+
+
+def enqueue_import(upload, options, batch_name, requested_by=None):
+    """
+    Queue processing of an upload and return its job, or the upload's job
+    already queued or running. A new job takes over the checkpoint of a
+    failed one, so retrying resumes the import.
+    """
+    with transaction.atomic():
+        active = upload.import_jobs.filter(status__in=ACTIVE_STATUSES).first()
+        if active is not None:
+            return active
+
+        previous = upload.import_jobs.filter(status='failed').exclude(checkpoint={}).order_by('-created_at').first()
+        job = ImportJob.objects.create(
+            upload=upload,
+            options=options,
+            batch_name=previous.batch_name if previous else batch_name,
+            requested_by=requested_by,
+            records_total=upload.validation_results.get('items_count') if upload.content_type == 'question_bank' else None,
+            checkpoint=previous.checkpoint if previous else {},
+            records_processed=previous.records_processed if previous else 0,
+            records_created=previous.records_created if previous else 0,
+            records_failed=previous.records_failed if previous else 0,
+            records_skipped=previous.records_skipped if previous else 0,
+        )
+        upload.status = 'processing'
+        ContentUpload.objects.filter(pk=upload.pk).update(status='processing')
+    return job
+
+
+def worker_name(label):
+    """Identifies a worker in ImportJob.worker: host, process and label"""
+    return f'{socket.gethostname()}:{os.getpid()}:{label}'[:100]
+
+
+def claim_job(worker, job_id=None, stale_after=None):
+    """
+    Claim the oldest queued job, or a running one whose worker stopped
+    sending heartbeats, for worker (only job_id when given). Returns the
+    claimed job or None. Stale jobs out of attempts are failed instead.
+    """
+    stale_after = stale_after or getattr(settings, 'IMPORT_JOB_STALE_AFTER', 300)
+    max_attempts = getattr(settings, 'IMPORT_JOB_MAX_ATTEMPTS', 3)
+    now = timezone.now()
+
+    candidates = ImportJob.objects.filter(
+        Q(status='queued') | Q(status='running', heartbeat_at__lt=now - timedelta(seconds=stale_after))
+    ).order_by('created_at')
+    if job_id is not None:
+        candidates = candidates.filter(pk=job_id)
+
+    for candidate in candidates.only('pk', 'status', 'heartbeat_at', 'attempts')[:10]:
+        # Compare-and-set on the state read, so only one worker wins a job
+        unchanged = ImportJob.objects.filter(
+            pk=candidate.pk, status=candidate.status, heartbeat_at=candidate.heartbeat_at
+        )
+        if candidate.status == 'running' and candidate.attempts >= max_attempts:
+            if unchanged.update(
+                status='failed', finished_at=now,
+                error=f'Worker stopped responding; gave up after {candidate.attempts} attempts',
+            ):
+                ContentUpload.objects.filter(import_jobs=candidate.pk, status='processing').update(status='completed')
+            continue
+        claimed = unchanged.update(
+            status='running',
+            worker=worker,
+            attempts=F('attempts') + 1,
+            started_at=now,
+            heartbeat_at=now,
+            finished_at=None,
+            records_at_start=F('records_processed'),
+        )
+        if claimed:
+            return ImportJob.objects.select_related('upload').get(pk=candidate.pk)
+    return None
+
+
+def _owned(job):
+    # Rows of this attempt; none once another worker has claimed the job
+    return ImportJob.objects.filter(pk=job.pk, worker=job.worker, attempts=job.attempts, status='running')
+
+
+def save_checkpoint(job, **values):
+    """Merge values into the job's checkpoint and send a heartbeat"""
+    job.checkpoint = {**job.checkpoint, **values}
+    if not _owned(job).update(checkpoint=job.checkpoint, heartbeat_at=timezone.now()):
+        raise JobLost(str(job.pk))
+
+
+def job_stats(job):
+    """ImportStats seeded with the counts of the job's earlier attempts"""
+    return ImportStats(created=job.records_created, failed=job.records_failed, skipped=job.records_skipped)
+
+
+def record_progress(job, position, stats):
+    """Checkpoint a committed chunk: position records done, with stats' counts"""
+    job.checkpoint = {**job.checkpoint, 'position': position}
+    job.records_processed = position
+    job.records_created = stats.created
+    job.records_failed = stats.failed
+    job.records_skipped = stats.skipped
+    if not _owned(job).update(
+        checkpoint=job.checkpoint,
+        records_processed=position,
+        records_created=stats.created,
+        records_failed=stats.failed,
+        records_skipped=stats.skipped,
+        heartbeat_at=timezone.now(),
+    ):
+        raise JobLost(str(job.pk))
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    return _owned(job).update(status=status, error=error, finished_at=job.finished_at, heartbeat_at=job.finished_at)
+
+
+def run_job(job):
+    """Process a claimed job's upload and record the outcome on the job and the upload"""
+    # Import here to avoid circular imports
+    from .views import ContentProcessor
+
+    upload = job.upload
+    upload.processing_log.job = job
+    resumable = upload.content_type == 'question_bank'
+    try:
+        if resumable:
+            ContentProcessor().process_content(upload, upload.json_data, job.batch_name, job.options, job=job)
+        else:
+            with transaction.atomic():
+                ContentProcessor().process_content(upload, upload.json_data, job.batch_name, job.options)
+    except JobLost:
+        # The attempt now running owns the job and the upload
+        return job
+    except Exception as e:
+        if not resumable:
+            # The entry process_content wrote was rolled back with everything else
+            upload.processing_log.append(f"Processing failed: {str(e)}")
+        if _finish(job, 'failed', str(e)):
+            ContentUpload.objects.filter(pk=upload.pk).update(status='completed')
+        return job
+
+    if _finish(job, 'completed'):
+        upload.status = 'completed'
+        upload.is_processed = True
+        upload.save()
+    return job
+
+
+def records_per_second(job):
+    """Processing rate of the job's current (or last) attempt"""
+    if job.started_at is None:
+        return 0.0
+    end = job.finished_at or job.heartbeat_at or timezone.now()
+    seconds = (end - job.started_at).total_seconds()
+    processed = job.records_processed - job.records_at_start
+    return round(processed / seconds, 1) if seconds > 0 else 0.0
@@ -0,0 +1,22 @@
+"""
+Rebuild the question exposure ledger from attempt history.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from questions.exposure import rebuild_question_exposure
+
+
+class Command(BaseCommand):
+    help = 'Recount how often every question was served, overall and per exam, from past attempts'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_question_exposure()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt question exposure ledger in {time.perf_counter() - started:.2f}s '
+            f'({written} rows written)'
+        ))
@@ -0,0 +1,42 @@
+"""
+Rebuild the normalized tag index from the JSON tags fields.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from questions.tagging import TAG_LINKS, reindex_tags
+
+
+class Command(BaseCommand):
+    help = 'Rebuild tag links of exams, question banks, questions, exam metadata and syllabus nodes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            default=[],
+            help='Model to reindex, e.g. Question (repeatable, default all tagged models)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows reindexed per transaction'
+        )
+
+    def handle(self, *args, **options):
+        models = [
+            model for model in TAG_LINKS
+            if not options['model'] or model.__name__ in options['model']
+        ]
+
+        started = time.perf_counter()
+        for model in models:
+            written = reindex_tags(model, batch_size=max(1, options['batch_size']))
+            self.stdout.write(f'{model.__name__}: {written} tag links')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt tag index for {len(models)} models in {time.perf_counter() - started:.2f}s'
+        ))
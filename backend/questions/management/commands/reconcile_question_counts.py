@@ -0,0 +1,42 @@
+"""
+Rebuild the denormalized question counts from the questions table.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from questions.models import QuestionBank
+from questions.question_counts import reconcile_question_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount questions per bank, difficulty, type and topic and repair any drifted counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bank',
+            action='append',
+            default=[],
+            help='Question bank id to reconcile (repeatable, default all banks)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Banks reconciled per transaction'
+        )
+
+    def handle(self, *args, **options):
+        bank_ids = options['bank'] or list(QuestionBank.objects.order_by('pk').values_list('pk', flat=True))
+        batch_size = max(1, options['batch_size'])
+
+        started = time.perf_counter()
+        repaired = 0
+        for start in range(0, len(bank_ids), batch_size):
+            repaired += reconcile_question_counts(bank_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled {len(bank_ids)} banks in {time.perf_counter() - started:.2f}s '
+            f'({repaired} counter rows repaired)'
+        ))
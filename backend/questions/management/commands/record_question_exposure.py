@@ -0,0 +1,40 @@
+"""
+Background recorder for the question exposure ledger.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from questions.exposure import record_all_pending_exposure
+
+
+class Command(BaseCommand):
+    help = 'Add the papers of newly started attempts to the question exposure ledger every N seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=getattr(settings, 'EXPOSURE_RECORD_INTERVAL', 10),
+            help='Seconds between recording cycles'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run a single recording cycle and exit'
+        )
+
+    def handle(self, *args, **options):
+        interval = max(1, options['interval'])
+
+        while True:
+            started = time.monotonic()
+            counted = record_all_pending_exposure()
+            if counted:
+                self.stdout.write(f'Recorded the papers of {counted} attempts')
+
+            if options['once']:
+                break
+            time.sleep(max(0, interval - (time.monotonic() - started)))
@@ -0,0 +1,95 @@
+"""
+Run queued content import jobs on a pool of worker threads.
+"""
+
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from questions.import_jobs import claim_job, run_job, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Process queued content imports, resuming imports whose worker stopped responding'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'IMPORT_WORKERS', 2),
+            help='Number of worker threads (default IMPORT_WORKERS, 2)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no job is waiting instead of polling for new ones'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds an idle worker waits before looking for jobs again'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=None,
+            help='Seconds without a heartbeat after which a running job is taken over '
+                 '(default IMPORT_JOB_STALE_AFTER, 300)'
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        done = []
+
+        def request_stop(signum, frame):
+            self.stdout.write('Stopping after the current jobs...')
+            stop.set()
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, request_stop)
+            signal.signal(signal.SIGINT, request_stop)
+
+        def work(label):
+            name = worker_name(label)
+            try:
+                while not stop.is_set():
+                    try:
+                        job = claim_job(name, stale_after=options['stale_after'])
+                        if job is None:
+                            if options['once']:
+                                return
+                            stop.wait(options['poll_interval'])
+                            continue
+                        job = run_job(job)
+                    except Exception as e:
+                        # Database errors; a job that was running is taken over once stale
+                        self.stderr.write(f'{name}: {str(e)}')
+                        connections.close_all()
+                        stop.wait(options['poll_interval'])
+                        continue
+                    done.append(job.status)
+                    self.stdout.write(f'{name}: import job {job.id} {job.status}')
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=work, args=(f'worker-{number}',), daemon=True)
+            for number in range(max(1, options['workers']))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # Joined in short waits so signals are handled
+            while thread.is_alive():
+                thread.join(0.5)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Ran {len(done)} import jobs on {len(threads)} workers in {time.perf_counter() - started:.2f}s '
+            f'({done.count("completed")} completed, {done.count("failed")} failed)'
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0005_add_permission_system'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useranswer',
+            name='answer_hash',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+    ]
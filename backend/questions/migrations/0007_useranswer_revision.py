@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0006_useranswer_answer_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useranswer',
+            name='revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-17 14:10
+
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_question_counts(apps, schema_editor):
+    Question = apps.get_model('questions', 'Question')
+    QuestionCount = apps.get_model('questions', 'QuestionCount')
+
+    counts = Counter()
+    rows = Question.objects.filter(question_bank__isnull=False).order_by().values_list(
+        'question_bank_id', 'difficulty', 'question_type', 'topic'
+    ).annotate(n=Count('id'))
+    for bank_id, difficulty, question_type, topic, n in rows:
+        topic = (topic or '').lower()
+        for dimension, value in (
+            ('total', ''),
+            ('difficulty', difficulty or ''),
+            ('question_type', question_type or ''),
+            ('topic', topic),
+            ('difficulty_topic', f'{difficulty or ""}:{topic}'),
+        ):
+            counts[(bank_id, dimension, value)] += n
+
+    QuestionCount.objects.bulk_create(
+        [
+            QuestionCount(question_bank_id=bank_id, dimension=dimension, value=value, count=n)
+            for (bank_id, dimension, value), n in counts.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0007_useranswer_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('difficulty', 'Difficulty'), ('question_type', 'Question Type'), ('topic', 'Topic'), ('difficulty_topic', 'Difficulty and Topic')], max_length=20)),
+                ('value', models.CharField(blank=True, max_length=150)),
+                ('count', models.IntegerField(default=0)),
+                ('question_bank', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_counts', to='questions.questionbank')),
+            ],
+            options={
+                'db_table': 'question_counts',
+                'unique_together': {('question_bank', 'dimension', 'value')},
+            },
+        ),
+        migrations.RunPython(backfill_question_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_compatibility(apps, schema_editor):
+    from core.exam_compatibility import rebuild_compatibility_matrix
+
+    rebuild_compatibility_matrix(
+        exams=apps.get_model('exams', 'Exam').objects.all(),
+        banks=apps.get_model('questions', 'QuestionBank').objects.filter(is_public=True),
+        model=apps.get_model('questions', 'ExamBankCompatibility'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0014_per_attempt_papers'),
+        ('questions', '0008_questioncount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamBankCompatibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0.0)),
+                ('reasons', models.JSONField(blank=True, default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bank_compatibilities', to='exams.exam')),
+                ('question_bank', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_compatibilities', to='questions.questionbank')),
+            ],
+            options={
+                'db_table': 'exam_bank_compatibility',
+                'indexes': [models.Index(fields=['exam', '-score', 'question_bank'], name='exam_bank_c_exam_id_3c2db4_idx'), models.Index(fields=['question_bank', '-score'], name='exam_bank_c_questio_139fb9_idx')],
+                'unique_together': {('exam', 'question_bank')},
+            },
+        ),
+        migrations.RunPython(backfill_compatibility, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,151 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# (app, tagged model, link model, link foreign key, tagged table)
+TAGGED = [
+    ('exams', 'Exam', 'ExamTag', 'exam', 'exams'),
+    ('questions', 'QuestionBank', 'QuestionBankTag', 'question_bank', 'question_banks'),
+    ('questions', 'Question', 'QuestionTag', 'question', 'questions'),
+    ('exams', 'ExamMetadata', 'ExamMetadataTag', 'exam_metadata', 'exam_metadata'),
+    ('exams', 'SyllabusNode', 'SyllabusNodeTag', 'syllabus_node', 'syllabus_nodes'),
+]
+
+
+def backfill_tags(apps, schema_editor):
+    Tag = apps.get_model('questions', 'Tag')
+
+    tag_ids = {}
+    for app_label, model_name, link_name, field, _ in TAGGED:
+        model = apps.get_model(app_label, model_name)
+        link_model = apps.get_model('questions', link_name)
+
+        links = set()
+        for pk, tags in model.objects.values_list('pk', 'tags').iterator(chunk_size=1000):
+            if not isinstance(tags, list):
+                continue
+            for tag in tags:
+                name = str(tag).strip().lower()[:100]
+                if not name:
+                    continue
+                if name not in tag_ids:
+                    tag_ids[name] = Tag.objects.get_or_create(
+                        name=name, defaults={'label': str(tag).strip()[:100]}
+                    )[0].pk
+                links.add((pk, tag_ids[name]))
+
+        link_model.objects.bulk_create(
+            [link_model(**{f'{field}_id': pk, 'tag_id': tag_id}) for pk, tag_id in links],
+            batch_size=1000,
+        )
+
+
+def create_gin_indexes(apps, schema_editor):
+    # Only PostgreSQL has jsonb GIN indexes; other backends use the link tables
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for *_, table in TAGGED:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{table}_tags_gin" ON "{table}" '
+            f'USING gin ((lower("tags"::text)::jsonb) jsonb_path_ops)'
+        )
+
+
+def drop_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for *_, table in TAGGED:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{table}_tags_gin"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0014_per_attempt_papers'),
+        ('questions', '0009_exambankcompatibility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('label', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'tags',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExamTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='exams.exam')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_links', to='questions.tag')),
+            ],
+            options={
+                'db_table': 'exam_tags',
+                'indexes': [models.Index(fields=['tag', 'exam'], name='exam_tags_tag_id_5c7cfb_idx')],
+                'unique_together': {('exam', 'tag')},
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionBankTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_bank', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='questions.questionbank')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_bank_links', to='questions.tag')),
+            ],
+            options={
+                'db_table': 'question_bank_tags',
+                'indexes': [models.Index(fields=['tag', 'question_bank'], name='question_ba_tag_id_384cb8_idx')],
+                'unique_together': {('question_bank', 'tag')},
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='questions.question')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_links', to='questions.tag')),
+            ],
+            options={
+                'db_table': 'question_tags',
+                'indexes': [models.Index(fields=['tag', 'question'], name='question_ta_tag_id_e0c68e_idx')],
+                'unique_together': {('question', 'tag')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ExamMetadataTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exam_metadata', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='exams.exammetadata')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_metadata_links', to='questions.tag')),
+            ],
+            options={
+                'db_table': 'exam_metadata_tags',
+                'indexes': [models.Index(fields=['tag', 'exam_metadata'], name='exam_metada_tag_id_5e99ac_idx')],
+                'unique_together': {('exam_metadata', 'tag')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SyllabusNodeTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('syllabus_node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='exams.syllabusnode')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='syllabus_node_links', to='questions.tag')),
+            ],
+            options={
+                'db_table': 'syllabus_node_tags',
+                'indexes': [models.Index(fields=['tag', 'syllabus_node'], name='syllabus_no_tag_id_1aef1a_idx')],
+                'unique_together': {('syllabus_node', 'tag')},
+            },
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+        migrations.RunPython(create_gin_indexes, drop_gin_indexes),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:05
+
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_exposure(apps, schema_editor):
+    TestAttempt = apps.get_model('exams', 'TestAttempt')
+    TestQuestion = apps.get_model('questions', 'TestQuestion')
+    Question = apps.get_model('questions', 'Question')
+    QuestionExposure = apps.get_model('questions', 'QuestionExposure')
+
+    counts = Counter()
+    shared = dict(
+        TestAttempt.objects.filter(question_ids__isnull=True).order_by().values('test_id').annotate(
+            n=Count('id')
+        ).values_list('test_id', 'n')
+    )
+    papers = TestQuestion.objects.filter(test_id__in=list(shared)).values_list(
+        'test_id', 'test__exam_id', 'question_id'
+    ).distinct()
+    for test_id, exam_id, question_id in papers.iterator(chunk_size=2000):
+        counts[(str(question_id), '')] += shared[test_id]
+        counts[(str(question_id), f'exam:{exam_id}')] += shared[test_id]
+
+    own = TestAttempt.objects.filter(question_ids__isnull=False).values_list('question_ids', 'test__exam_id')
+    for question_ids, exam_id in own.iterator(chunk_size=2000):
+        for question_id in set(question_ids or []):
+            counts[(str(question_id), '')] += 1
+            counts[(str(question_id), f'exam:{exam_id}')] += 1
+
+    existing = {
+        str(pk) for pk in Question.objects.filter(
+            pk__in=list({question_id for question_id, _ in counts})
+        ).values_list('pk', flat=True)
+    }
+    QuestionExposure.objects.bulk_create(
+        [
+            QuestionExposure(question_id=question_id, cohort=cohort, served_count=n)
+            for (question_id, cohort), n in counts.items()
+            if question_id in existing
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0014_per_attempt_papers'),
+        ('questions', '0010_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionExposure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cohort', models.CharField(blank=True, max_length=64)),
+                ('served_count', models.IntegerField(default=0)),
+                ('last_served_at', models.DateTimeField(blank=True, null=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exposures', to='questions.question')),
+            ],
+            options={
+                'db_table': 'question_exposures',
+                'indexes': [models.Index(fields=['cohort', 'served_count'], name='question_ex_cohort_19aed8_idx')],
+                'unique_together': {('question', 'cohort')},
+            },
+        ),
+        migrations.RunPython(backfill_exposure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:10
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from core.search import install_search_index
+
+    install_search_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    from core.search import uninstall_search_index
+
+    uninstall_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0016_selection_rule_exposure'),
+        ('questions', '0011_questionexposure'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:50
+
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    # Other backends search an in-memory trigram index instead
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS "questions_question_text_trgm" ON "questions" '
+        'USING gin ("question_text" gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS "questions_question_text_trgm"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0012_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:10
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def sync_content_uploads_table(apps, schema_editor):
+    # content_uploads was created outside of migrations on existing databases:
+    # create it where it is missing, otherwise bring its columns up to date
+    ContentUpload = apps.get_model('questions', 'ContentUpload')
+    connection = schema_editor.connection
+    table = ContentUpload._meta.db_table
+    with connection.cursor() as cursor:
+        if table not in connection.introspection.table_names(cursor):
+            schema_editor.create_model(ContentUpload)
+            return
+        columns = {column.name for column in connection.introspection.get_table_description(cursor, table)}
+
+    # The processing log moved to content_upload_logs
+    if 'processing_log' in columns:
+        processing_log = models.JSONField(default=list, blank=True)
+        processing_log.set_attributes_from_name('processing_log')
+        processing_log.model = ContentUpload
+        schema_editor.remove_field(ContentUpload, processing_log)
+
+    for field in ContentUpload._meta.local_fields:
+        if field.column not in columns:
+            schema_editor.add_field(ContentUpload, field)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0013_question_text_trgm'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ContentUpload',
+                    fields=[
+                        ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                        ('file_name', models.CharField(max_length=255)),
+                        ('content_type', models.CharField(choices=[('exam', 'Exam'), ('test', 'Test'), ('question_bank', 'Question Bank'), ('mixed', 'Mixed Content')], max_length=20)),
+                        ('file_size', models.BigIntegerField(help_text='File size in bytes')),
+                        ('file_hash', models.CharField(help_text='SHA-256 hash of file content', max_length=64)),
+                        ('uploaded_at', models.DateTimeField(auto_now_add=True)),
+                        ('status', models.CharField(choices=[('uploaded', 'Uploaded'), ('validating', 'Validating'), ('valid', 'Valid'), ('invalid', 'Invalid'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='uploaded', max_length=20)),
+                        ('validation_results', models.JSONField(blank=True, default=dict)),
+                        ('processing_logs', models.TextField(blank=True)),
+                        ('json_data', models.JSONField(blank=True, default=dict, help_text='Stored JSON content for processing')),
+                        ('source_file', models.FileField(blank=True, help_text='Uploaded JSON file; question banks are imported from it', upload_to='content_uploads/%Y/%m/')),
+                        ('is_processed', models.BooleanField(default=False, help_text='Whether content has been processed into database')),
+                        ('content_summary', models.JSONField(blank=True, default=dict, help_text='Summary of content to be imported')),
+                        ('items_imported', models.IntegerField(default=0)),
+                        ('items_failed', models.IntegerField(default=0)),
+                        ('validation_started_at', models.DateTimeField(blank=True, null=True)),
+                        ('validation_completed_at', models.DateTimeField(blank=True, null=True)),
+                        ('processing_started_at', models.DateTimeField(blank=True, null=True)),
+                        ('processing_completed_at', models.DateTimeField(blank=True, null=True)),
+                        ('uploaded_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='content_uploads', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'content_uploads',
+                        'ordering': ['-uploaded_at'],
+                    },
+                ),
+            ],
+            database_operations=[],
+        ),
+        migrations.RunPython(sync_content_uploads_table, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('options', models.JSONField(blank=True, default=dict)),
+                ('batch_name', models.CharField(max_length=255)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('checkpoint', models.JSONField(blank=True, default=dict, help_text='Question bank and last committed record of the import')),
+                ('records_total', models.IntegerField(blank=True, null=True)),
+                ('records_processed', models.IntegerField(default=0)),
+                ('records_created', models.IntegerField(default=0)),
+                ('records_failed', models.IntegerField(default=0)),
+                ('records_skipped', models.IntegerField(default=0)),
+                ('records_at_start', models.IntegerField(default=0, help_text='Records processed before the current attempt')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to=settings.AUTH_USER_MODEL)),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='questions.contentupload')),
+            ],
+            options={
+                'db_table': 'import_jobs',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='import_jobs_status_aedc42_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ContentUploadLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField()),
+                ('data', models.JSONField(blank=True, help_text='Entries logged as dicts', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='log_entries', to='questions.contentupload')),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='log_entries', to='questions.importjob')),
+            ],
+            options={
+                'db_table': 'content_upload_logs',
+                'ordering': ['id'],
+            },
+        ),
+    ]
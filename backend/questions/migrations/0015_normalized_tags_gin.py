@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:20
+
+from django.db import migrations
+
+
+TAGGED_TABLES = ['exams', 'question_banks', 'questions', 'exam_metadata', 'syllabus_nodes']
+
+# Tags spelled as the tag index spells them (questions.tagging.normalize_tag):
+# stripped, lower-cased and cut to the tag name length
+NORMALIZED_TAGS_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION normalized_tags(tags jsonb) RETURNS jsonb
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE WHEN jsonb_typeof(tags) = 'array' THEN (
+        SELECT coalesce(jsonb_agg(left(lower(btrim(tag, E' \t\n\r\f\x0b')), 100)), '[]'::jsonb)
+        FROM jsonb_array_elements_text(tags) AS tag
+    ) ELSE '[]'::jsonb END
+$$
+"""
+
+
+def normalize_gin_indexes(apps, schema_editor):
+    # Only PostgreSQL has jsonb GIN indexes; other backends use the link tables
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(NORMALIZED_TAGS_FUNCTION)
+    for table in TAGGED_TABLES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{table}_tags_gin"')
+        schema_editor.execute(
+            f'CREATE INDEX "{table}_tags_gin" ON "{table}" '
+            f'USING gin ((normalized_tags("tags")) jsonb_path_ops)'
+        )
+
+
+def lower_case_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TAGGED_TABLES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{table}_tags_gin"')
+        schema_editor.execute(
+            f'CREATE INDEX "{table}_tags_gin" ON "{table}" '
+            f'USING gin ((lower("tags"::text)::jsonb) jsonb_path_ops)'
+        )
+    schema_editor.execute('DROP FUNCTION IF EXISTS normalized_tags(jsonb)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0014_import_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_gin_indexes, lower_case_gin_indexes),
+    ]
@@ -365,6 +365,150 @@ class Question(models.Model):
         db_table = 'questions'
 
 
+class QuestionCount(models.Model):
+    """
+    Denormalized number of questions in a bank, overall and per difficulty,
+    question type, topic and difficulty+topic. Kept current by signals and
+    import hooks, and rebuilt by the reconcile_question_counts command.
+    """
+    DIMENSIONS = [
+        ('total', 'Total'),
+        ('difficulty', 'Difficulty'),
+        ('question_type', 'Question Type'),
+        ('topic', 'Topic'),
+        ('difficulty_topic', 'Difficulty and Topic'),
+    ]
+    
+    question_bank = models.ForeignKey(QuestionBank, on_delete=models.CASCADE, related_name='question_counts')
+    dimension = models.CharField(max_length=20, choices=DIMENSIONS)
+    # Difficulty or type code, lower-cased topic, or "difficulty:topic"; empty for the total
+    value = models.CharField(max_length=150, blank=True)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'question_counts'
+        unique_together = ['question_bank', 'dimension', 'value']
+    
+    def __str__(self):
+        return f"{self.question_bank_id} {self.dimension}={self.value}: {self.count}"
+
+
+class ExamBankCompatibility(models.Model):
+    """
+    Precomputed match between an exam and a public question bank, with the
+    score and reasons of core.exam_utils.calculate_match_score and
+    get_match_reasons. Refreshed by signals when either side is saved and
+    rebuilt by the rebuild_compatibility_matrix command.
+    """
+    exam = models.ForeignKey('exams.Exam', on_delete=models.CASCADE, related_name='bank_compatibilities')
+    question_bank = models.ForeignKey(QuestionBank, on_delete=models.CASCADE, related_name='exam_compatibilities')
+    score = models.FloatField(default=0.0)
+    reasons = models.JSONField(default=list, blank=True)
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'exam_bank_compatibility'
+        unique_together = ['exam', 'question_bank']
+        indexes = [
+            models.Index(fields=['exam', '-score', 'question_bank']),
+            models.Index(fields=['question_bank', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.exam_id} ~ {self.question_bank_id}: {self.score:.2f}"
+
+
+class QuestionExposure(models.Model):
+    """
+    How many papers issued to candidates contained a question, overall
+    (empty cohort) and per cohort ("exam:<id>"). Written in bulk when an
+    attempt's paper is issued; selection rules read it to cap over-exposed
+    questions and prefer under-used ones.
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='exposures')
+    cohort = models.CharField(max_length=64, blank=True)
+    served_count = models.IntegerField(default=0)
+    last_served_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'question_exposures'
+        unique_together = ['question', 'cohort']
+        indexes = [models.Index(fields=['cohort', 'served_count'])]
+    
+    def __str__(self):
+        return f"{self.question_id} [{self.cohort or 'all'}]: {self.served_count}"
+
+
+class Tag(models.Model):
+    """
+    Normalized tag shared by exams, question banks, questions, exam metadata
+    and syllabus nodes. The JSON tags fields stay the source of truth; the
+    per-model link tables below index them for joins.
+    """
+    # Stripped, lower-cased spelling
+    name = models.CharField(max_length=100, unique=True)
+    # Spelling the tag was first seen with
+    label = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'tags'
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.label
+
+
+class ExamTag(models.Model):
+    exam = models.ForeignKey('exams.Exam', on_delete=models.CASCADE, related_name='tag_links')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='exam_links')
+    
+    class Meta:
+        db_table = 'exam_tags'
+        unique_together = ['exam', 'tag']
+        indexes = [models.Index(fields=['tag', 'exam'])]
+
+
+class QuestionBankTag(models.Model):
+    question_bank = models.ForeignKey(QuestionBank, on_delete=models.CASCADE, related_name='tag_links')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='question_bank_links')
+    
+    class Meta:
+        db_table = 'question_bank_tags'
+        unique_together = ['question_bank', 'tag']
+        indexes = [models.Index(fields=['tag', 'question_bank'])]
+
+
+class QuestionTag(models.Model):
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='tag_links')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='question_links')
+    
+    class Meta:
+        db_table = 'question_tags'
+        unique_together = ['question', 'tag']
+        indexes = [models.Index(fields=['tag', 'question'])]
+
+
+class ExamMetadataTag(models.Model):
+    exam_metadata = models.ForeignKey('exams.ExamMetadata', on_delete=models.CASCADE, related_name='tag_links')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='exam_metadata_links')
+    
+    class Meta:
+        db_table = 'exam_metadata_tags'
+        unique_together = ['exam_metadata', 'tag']
+        indexes = [models.Index(fields=['tag', 'exam_metadata'])]
+
+
+class SyllabusNodeTag(models.Model):
+    syllabus_node = models.ForeignKey('exams.SyllabusNode', on_delete=models.CASCADE, related_name='tag_links')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='syllabus_node_links')
+    
+    class Meta:
+        db_table = 'syllabus_node_tags'
+        unique_together = ['syllabus_node', 'tag']
+        indexes = [models.Index(fields=['tag', 'syllabus_node'])]
+
+
 class QuestionOption(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='options')
@@ -414,8 +558,8 @@ class ContentUpload(models.Model):
     
     # JSON data storage
     json_data = models.JSONField(default=dict, blank=True, help_text="Stored JSON content for processing")
+    source_file = models.FileField(upload_to='content_uploads/%Y/%m/', blank=True, help_text="Uploaded JSON file; question banks are imported from it")
     is_processed = models.BooleanField(default=False, help_text="Whether content has been processed into database")
-    processing_log = models.JSONField(default=list, blank=True, help_text="Processing log entries")
     
     # Content summary
     content_summary = models.JSONField(default=dict, blank=True, help_text="Summary of content to be imported")
@@ -434,6 +578,84 @@ class ContentUpload(models.Model):
     
     def __str__(self):
         return f"{self.file_name} - {self.status}"
+    
+    @property
+    def processing_log(self):
+        """Append-only processing log, kept as ContentUploadLog rows"""
+        # Import here to avoid circular imports
+        from .import_jobs import ProcessingLog
+        if getattr(self, '_processing_log', None) is None:
+            self._processing_log = ProcessingLog(self)
+        return self._processing_log
+
+
+class ImportJob(models.Model):
+    """
+    Background processing of a content upload. Workers (the
+    run_import_workers command) claim queued jobs and jobs whose worker
+    stopped sending heartbeats. Question bank imports checkpoint after every
+    chunk of questions, so a claimed job resumes where the last attempt stopped.
+    """
+    
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    upload = models.ForeignKey(ContentUpload, on_delete=models.CASCADE, related_name='import_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    options = models.JSONField(default=dict, blank=True)
+    batch_name = models.CharField(max_length=255)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='import_jobs')
+    
+    # Claiming
+    worker = models.CharField(max_length=100, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    
+    # Progress
+    checkpoint = models.JSONField(default=dict, blank=True, help_text="Question bank and last committed record of the import")
+    records_total = models.IntegerField(null=True, blank=True)
+    records_processed = models.IntegerField(default=0)
+    records_created = models.IntegerField(default=0)
+    records_failed = models.IntegerField(default=0)
+    records_skipped = models.IntegerField(default=0)
+    records_at_start = models.IntegerField(default=0, help_text="Records processed before the current attempt")
+    error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'import_jobs'
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+    
+    def __str__(self):
+        return f"{self.upload_id} [{self.status}]"
+
+
+class ContentUploadLog(models.Model):
+    """
+    One entry of a content upload's processing log. Entries are only ever
+    appended, at most CONTENT_UPLOAD_LOG_LIMIT per upload.
+    """
+    upload = models.ForeignKey(ContentUpload, on_delete=models.CASCADE, related_name='log_entries')
+    job = models.ForeignKey(ImportJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='log_entries')
+    message = models.TextField()
+    data = models.JSONField(null=True, blank=True, help_text="Entries logged as dicts")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'content_upload_logs'
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.upload_id}: {self.message[:50]}"
 
 
 class TestQuestion(models.Model):
@@ -467,6 +689,11 @@ class UserAnswer(models.Model):
     is_marked_for_review = models.BooleanField(default=False)
     time_spent_seconds = models.IntegerField(default=0)
     
+    # Content hash of the last saved payload, used to skip unchanged auto-saves
+    answer_hash = models.CharField(max_length=40, blank=True)
+    # Attempt answer revision at which this answer last changed
+    revision = models.PositiveIntegerField(default=0)
+    
     # Evaluation
     is_correct = models.BooleanField(null=True, blank=True)
     marks_obtained = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -0,0 +1,179 @@
+"""
+Denormalized question counts per bank.
+Every question contributes one to its bank's total and to the buckets of its
+difficulty, question type, topic and difficulty+topic. Saves and deletes
+adjust those rows incrementally, bulk imports refresh whole banks, and the
+reconcile_question_counts command repairs any drift. Readiness checks and
+admin listings read the table instead of counting questions.
+"""
+
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from .models import Question, QuestionCount
+
+
+TOTAL = 'total'
+DIFFICULTY = 'difficulty'
+QUESTION_TYPE = 'question_type'
+TOPIC = 'topic'
+DIFFICULTY_TOPIC = 'difficulty_topic'
+
+
+def normalize_topic(topic):
+    return (topic or '').lower()
+
+
+def count_keys(difficulty, question_type, topic):
+    """(dimension, value) buckets a question with these attributes counts towards"""
+    topic = normalize_topic(topic)
+    return [
+        (TOTAL, ''),
+        (DIFFICULTY, difficulty or ''),
+        (QUESTION_TYPE, question_type or ''),
+        (TOPIC, topic),
+        (DIFFICULTY_TOPIC, f'{difficulty or ""}:{topic}'),
+    ]
+
+
+class BankCounts:
+    """Read-only view of one bank's counters"""
+
+    __slots__ = ('counts',)
+
+    def __init__(self, counts=None):
+        self.counts = counts or {}
+
+    @property
+    def total(self):
+        return self.counts.get((TOTAL, ''), 0)
+
+    def get(self, dimension, value=''):
+        return self.counts.get((dimension, value), 0)
+
+    def available(self, difficulty_filter='', topic_filter=''):
+        """Questions matching TestQuestionBank-style difficulty and topic filters"""
+        difficulty = (difficulty_filter or '').strip().lower()
+        topic = (topic_filter or '').strip().lower()
+        if difficulty and topic:
+            return self.get(DIFFICULTY_TOPIC, f'{difficulty}:{topic}')
+        if difficulty:
+            return self.get(DIFFICULTY, difficulty)
+        if topic:
+            return self.get(TOPIC, topic)
+        return self.total
+
+
+def get_bank_counts(bank_ids=None):
+    """
+    Return {bank_id: BankCounts} for the given banks (all banks when None) in
+    one query. Banks without counters read as empty.
+    """
+    counts = defaultdict(BankCounts)
+    rows = QuestionCount.objects.all()
+    if bank_ids is not None:
+        bank_ids = list(bank_ids)
+        if not bank_ids:
+            return counts
+        rows = rows.filter(question_bank_id__in=bank_ids)
+
+    for bank_id, dimension, value, count in rows.values_list('question_bank_id', 'dimension', 'value', 'count'):
+        counts[bank_id].counts[(dimension, value)] = count
+    return counts
+
+
+def apply_delta(bank_id, keys, delta):
+    """Add delta to the given buckets of a bank, creating missing rows for increments"""
+    if bank_id is None or not keys or not delta:
+        return
+    keys = list(dict.fromkeys(keys))
+    match = Q()
+    for dimension, value in keys:
+        match |= Q(dimension=dimension, value=value)
+
+    rows = QuestionCount.objects.filter(match, question_bank_id=bank_id)
+    updated = rows.update(count=F('count') + delta)
+    if updated == len(keys) or delta < 0:
+        # Missing rows on a decrement mean drift, which reconcile repairs
+        return
+
+    existing = set(rows.values_list('dimension', 'value'))
+    for dimension, value in keys:
+        if (dimension, value) in existing:
+            continue
+        try:
+            with transaction.atomic():
+                QuestionCount.objects.create(
+                    question_bank_id=bank_id, dimension=dimension, value=value, count=delta
+                )
+        except IntegrityError:
+            # Created concurrently; the update now finds the row
+            QuestionCount.objects.filter(
+                question_bank_id=bank_id, dimension=dimension, value=value
+            ).update(count=F('count') + delta)
+
+
+def compute_bank_counts(bank_ids=None):
+    """Count questions from scratch: {bank_id: Counter of (dimension, value)}"""
+    questions = Question.objects.filter(question_bank__isnull=False)
+    if bank_ids is not None:
+        questions = questions.filter(question_bank_id__in=list(bank_ids))
+
+    counts = defaultdict(Counter)
+    rows = questions.order_by().values_list('question_bank_id', 'difficulty', 'question_type', 'topic').annotate(
+        n=Count('id')
+    )
+    for bank_id, difficulty, question_type, topic, n in rows:
+        for key in count_keys(difficulty, question_type, topic):
+            counts[bank_id][key] += n
+    return counts
+
+
+@transaction.atomic
+def reconcile_question_counts(bank_ids=None):
+    """
+    Rewrite the counters of the given banks (all banks when None) from the
+    questions table. Returns the number of rows created, changed or removed.
+    """
+    actual = compute_bank_counts(bank_ids)
+    stored = QuestionCount.objects.select_for_update()
+    if bank_ids is not None:
+        bank_ids = list(bank_ids)
+        stored = stored.filter(question_bank_id__in=bank_ids)
+
+    changed, stale = [], []
+    seen = set()
+    for row in stored:
+        key = (row.dimension, row.value)
+        expected = actual.get(row.question_bank_id, {}).get(key, 0)
+        seen.add((row.question_bank_id, key))
+        if not expected:
+            stale.append(row.pk)
+        elif row.count != expected:
+            row.count = expected
+            changed.append(row)
+
+    missing = [
+        QuestionCount(question_bank_id=bank_id, dimension=dimension, value=value, count=n)
+        for bank_id, counter in actual.items()
+        for (dimension, value), n in counter.items()
+        if (bank_id, (dimension, value)) not in seen
+    ]
+
+    if stale:
+        QuestionCount.objects.filter(pk__in=stale).delete()
+    if changed:
+        QuestionCount.objects.bulk_update(changed, ['count'], batch_size=500)
+    if missing:
+        QuestionCount.objects.bulk_create(missing, batch_size=500)
+    return len(stale) + len(changed) + len(missing)
+
+
+def refresh_question_counts(bank_id):
+    """Rebuild one bank's counters after a bulk write and return its question total"""
+    reconcile_question_counts([getattr(bank_id, 'pk', bank_id)])
+    return QuestionCount.objects.filter(
+        question_bank_id=getattr(bank_id, 'pk', bank_id), dimension=TOTAL
+    ).values_list('count', flat=True).first() or 0
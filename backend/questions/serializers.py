@@ -47,6 +47,15 @@ class QuestionSerializer(serializers.ModelSerializer):
         return instance
 
 
+class CandidateQuestionSerializer(QuestionSerializer):
+    """A question as shown on a candidate's paper, without the expected answer or explanation"""
+    
+    class Meta(QuestionSerializer.Meta):
+        fields = tuple(
+            field for field in QuestionSerializer.Meta.fields if field not in ('expected_answer', 'explanation')
+        )
+
+
 class QuestionBankSerializer(serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     questions_count = serializers.IntegerField(source='questions.count', read_only=True)
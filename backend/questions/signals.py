@@ -0,0 +1,85 @@
+"""
+Signal handlers keeping the denormalized question counts and the tag index
+in sync.
+"""
+
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Question
+from .question_counts import apply_delta, count_keys, refresh_question_counts
+from .tagging import TAG_LINKS, sync_tags
+
+COUNTED_FIELDS = ('question_bank_id', 'difficulty', 'question_type', 'topic')
+
+
+def _counted_state(instance):
+    """Bank and counted attributes of a question, or None if any were deferred"""
+    data = instance.__dict__
+    if any(field not in data for field in COUNTED_FIELDS):
+        return None
+    return tuple(data[field] for field in COUNTED_FIELDS)
+
+
+@receiver(post_init, sender=Question)
+def remember_counted_state(sender, instance, **kwargs):
+    # For rows loaded from the database this is the stored state
+    instance._counted_state = _counted_state(instance)
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_counted_state', None)
+    current = _counted_state(instance)
+    instance._counted_state = current
+
+    if created:
+        apply_delta(instance.question_bank_id, count_keys(*current[1:]), 1)
+    elif previous is None or current is None:
+        # Unknown previous state (deferred fields); recount the bank
+        if instance.question_bank_id:
+            refresh_question_counts(instance.question_bank_id)
+    elif previous != current:
+        old_keys = count_keys(*previous[1:])
+        new_keys = count_keys(*current[1:])
+        if previous[0] == current[0]:
+            apply_delta(current[0], [key for key in old_keys if key not in new_keys], -1)
+            apply_delta(current[0], [key for key in new_keys if key not in old_keys], 1)
+        else:
+            apply_delta(previous[0], old_keys, -1)
+            apply_delta(current[0], new_keys, 1)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    state = instance._counted_state or _counted_state(instance)
+    if state is not None:
+        apply_delta(state[0], count_keys(*state[1:]), -1)
+
+
+def _tags_state(instance):
+    """Copy of the JSON tags, or None if they were deferred"""
+    if 'tags' not in instance.__dict__:
+        return None
+    tags = instance.__dict__['tags']
+    return tuple(tags) if isinstance(tags, list) else tags
+
+
+def remember_tags(sender, instance, **kwargs):
+    instance._tags_state = _tags_state(instance)
+
+
+def tags_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_tags_state', None)
+    current = _tags_state(instance)
+    instance._tags_state = current
+    # Deferred tags were not written by this save
+    if current is None:
+        return
+    if (created and current) or (not created and previous != current):
+        sync_tags(instance)
+
+
+for tagged_model in TAG_LINKS:
+    post_init.connect(remember_tags, sender=tagged_model)
+    post_save.connect(tags_saved, sender=tagged_model)
@@ -0,0 +1,197 @@
+"""
+Trigram similarity search over question text.
+Finds the questions most like a piece of text, within some banks or across
+all of them, scored like pg_trgm's similarity(): trigrams the two texts
+share over all distinct trigrams of either.
+
+On PostgreSQL the migration adds a pg_trgm GIN index on question_text and
+the search is one indexed query per text. Elsewhere each bank gets an
+in-memory inverted index (trigram -> question rows) built with one query
+and cached under the bank's question pool version, so edits to a bank's
+questions rebuild it on next use. Scoring a text is then one pass over the
+posting lists of its trigrams.
+
+A search stops after SIMILARITY_SEARCH_TIMEOUT_MS and reports a partial
+result rather than blocking an editor or an import.
+"""
+
+import heapq
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+from core.question_pool import get_pool_versions
+from exams.answer_key import LocalLRU
+from .models import Question, QuestionBank
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+DEFAULT_THRESHOLD = 0.3
+DUPLICATE_THRESHOLD = 0.7
+
+_WORD_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def trigrams(text):
+    """pg_trgm trigram set of text: per lower-cased word padded with two spaces before and one after"""
+    grams = set()
+    for word in _WORD_RE.findall((text or '').lower()):
+        padded = f'  {word} '
+        grams.update(padded[start:start + 3] for start in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Inverted trigram index of the question texts of one bank"""
+
+    __slots__ = ('ids', 'sizes', 'postings')
+
+    def __init__(self, ids, texts):
+        self.ids = list(ids)
+        sizes = []
+        postings = {}
+        for row, text in enumerate(texts):
+            grams = trigrams(text)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(row)
+
+        if NUMPY_AVAILABLE:
+            self.sizes = np.array(sizes, dtype=np.float64)
+            self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        else:
+            self.sizes = sizes
+            self.postings = postings
+
+    @classmethod
+    def load(cls, bank_id):
+        rows = list(Question.objects.filter(question_bank_id=bank_id).values_list('id', 'question_text'))
+        return cls([row[0] for row in rows], [row[1] for row in rows])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, grams, limit, threshold, exclude=()):
+        """
+        [(similarity, question UUID)] of the best matches at or above
+        threshold, best first. exclude holds question ids as strings.
+        """
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists or not self.ids:
+            return []
+
+        wanted = limit + len(exclude)
+        if NUMPY_AVAILABLE:
+            common = np.bincount(np.concatenate(lists), minlength=len(self.ids)).astype(np.float64)
+            scores = common / (len(grams) + self.sizes - common)
+            rows = np.flatnonzero(scores >= threshold)
+            if len(rows) > wanted:
+                rows = rows[np.argpartition(-scores[rows], wanted - 1)[:wanted]]
+            best = [(float(scores[row]), self.ids[row]) for row in rows.tolist()]
+        else:
+            common = Counter(row for rows in lists for row in rows)
+            best = [
+                (score, self.ids[row])
+                for row, shared in common.items()
+                for score in [shared / (len(grams) + self.sizes[row] - shared)]
+                if score >= threshold
+            ]
+
+        best = [match for match in heapq.nlargest(wanted, best) if str(match[1]) not in exclude]
+        return best[:limit]
+
+
+_local_indexes = LocalLRU(getattr(settings, 'SIMILARITY_INDEX_CACHE_SIZE', 64))
+
+
+def get_trigram_index(bank_id):
+    """Trigram index of a bank's current questions"""
+    bank_id = str(bank_id)
+    key = (bank_id, get_pool_versions([bank_id])[0])
+    index = _local_indexes.get(key)
+    if index is None:
+        index = TrigramIndex.load(bank_id)
+        _local_indexes.set(key, index)
+    return index
+
+
+def _use_pg_trgm(using):
+    return connections[using].vendor == 'postgresql'
+
+
+def _search_postgres(text, bank_ids, limit, threshold, exclude, timeout_ms, using):
+    # psycopg is only needed once PostgreSQL is actually in use
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    questions = Question.objects.using(using).exclude(pk__in=list(exclude))
+    if bank_ids is not None:
+        questions = questions.filter(question_bank_id__in=list(bank_ids))
+    # The % operator is what the GIN index serves; its cut-off is the session's threshold
+    column = f'"{Question._meta.db_table}"."question_text"'
+    questions = questions.extra(where=[f'{column} %% %s'], params=[text]).annotate(
+        similarity=TrigramSimilarity('question_text', text)
+    ).order_by('-similarity').values_list('similarity', 'id')[:limit]
+
+    try:
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", [str(threshold)])
+                if timeout_ms:
+                    cursor.execute("SELECT set_config('statement_timeout', %s, true)", [str(int(timeout_ms))])
+            return [(float(score), question_id) for score, question_id in questions], False
+    except OperationalError:
+        # statement_timeout cancelled the query
+        return [], True
+
+
+def similar_questions(text, bank_ids=None, limit=10, threshold=DEFAULT_THRESHOLD, exclude=(),
+                      timeout_ms=None, using='default'):
+    """
+    Return ([(similarity, question UUID)] best first, partial) for the
+    questions most similar to text, in the given banks (all banks when None).
+    partial is True when the time budget ran out before every bank was searched.
+    """
+    return similar_questions_bulk([text], bank_ids, limit, threshold, exclude, timeout_ms, using)[0]
+
+
+def similar_questions_bulk(texts, bank_ids=None, limit=10, threshold=DEFAULT_THRESHOLD, exclude=(),
+                           timeout_ms=None, using='default'):
+    """similar_questions() for many texts at once, sharing one time budget and the bank indexes"""
+    if timeout_ms is None:
+        timeout_ms = getattr(settings, 'SIMILARITY_SEARCH_TIMEOUT_MS', 200) * max(1, len(texts))
+    deadline = time.monotonic() + timeout_ms / 1000 if timeout_ms else None
+    exclude = {str(question_id) for question_id in exclude}
+
+    if _use_pg_trgm(using):
+        results = []
+        for text in texts:
+            remaining = (deadline - time.monotonic()) * 1000 if deadline else None
+            if remaining is not None and remaining <= 0:
+                results.append(([], True))
+                continue
+            results.append(_search_postgres(text, bank_ids, limit, threshold, exclude, remaining, using))
+        return results
+
+    if bank_ids is None:
+        bank_ids = QuestionBank.objects.using(using).values_list('id', flat=True)
+    queries = [trigrams(text) for text in texts]
+    found = [[] for _ in texts]
+    partial = False
+    for bank_id in bank_ids:
+        if deadline and time.monotonic() > deadline:
+            partial = True
+            break
+        index = get_trigram_index(bank_id)
+        for position, grams in enumerate(queries):
+            if grams:
+                found[position].extend(index.search(grams, limit, threshold, exclude))
+    return [(heapq.nlargest(limit, matches), partial) for matches in found]
@@ -0,0 +1,174 @@
+"""
+Normalized tag index.
+The JSON tags of exams, question banks, questions, exam metadata and
+syllabus nodes are mirrored into the Tag table and one link table per model,
+so tag filters are indexed joins on exact tag names instead of icontains
+scans of serialized JSON (where "math" also matched "mathematics"). Saves
+resync a row's links, and the rebuild_tag_index command rebuilds them all.
+
+On PostgreSQL the migrations also add GIN indexes over the JSON tags
+normalized like the tag index (normalized_tags()). With TAG_INDEX_USE_GIN
+enabled, filter_by_tags answers from those with jsonb containment instead of
+joining the link tables.
+"""
+
+import json
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count
+
+from exams.models import Exam, ExamMetadata, SyllabusNode
+from .models import (
+    ExamMetadataTag, ExamTag, Question, QuestionBank, QuestionBankTag, QuestionTag,
+    SyllabusNodeTag, Tag,
+)
+
+
+# Tagged model -> (link model, name of the link's foreign key to it)
+TAG_LINKS = {
+    Exam: (ExamTag, 'exam'),
+    QuestionBank: (QuestionBankTag, 'question_bank'),
+    Question: (QuestionTag, 'question'),
+    ExamMetadata: (ExamMetadataTag, 'exam_metadata'),
+    SyllabusNode: (SyllabusNodeTag, 'syllabus_node'),
+}
+
+MAX_TAG_LENGTH = Tag._meta.get_field('name').max_length
+
+
+def normalize_tag(tag):
+    """Index spelling of a tag: stripped and lower-cased"""
+    return str(tag).strip().lower()[:MAX_TAG_LENGTH]
+
+
+def normalize_tags(tags):
+    """{normalized name: first spelling} of a JSON tags value, in order"""
+    names = {}
+    if not isinstance(tags, (list, tuple)):
+        return names
+    for tag in tags:
+        name = normalize_tag(tag)
+        if name and name not in names:
+            names[name] = str(tag).strip()[:MAX_TAG_LENGTH]
+    return names
+
+
+def get_tag_ids(names):
+    """
+    Return {name: Tag id} for a {normalized name: label} mapping, creating
+    missing tags.
+    """
+    if not names:
+        return {}
+    tag_ids = dict(Tag.objects.filter(name__in=list(names)).values_list('name', 'id'))
+    missing = [name for name in names if name not in tag_ids]
+    if missing:
+        Tag.objects.bulk_create(
+            [Tag(name=name, label=names[name]) for name in missing],
+            ignore_conflicts=True,
+        )
+        tag_ids.update(Tag.objects.filter(name__in=missing).values_list('name', 'id'))
+    return tag_ids
+
+
+def sync_tags(instance):
+    """Bring one row's tag links in line with its JSON tags"""
+    link_model, field = TAG_LINKS[type(instance)]
+    wanted = set(get_tag_ids(normalize_tags(instance.tags)).values())
+    existing = dict(link_model.objects.filter(**{f'{field}_id': instance.pk}).values_list('tag_id', 'pk'))
+
+    stale = [pk for tag_id, pk in existing.items() if tag_id not in wanted]
+    if stale:
+        link_model.objects.filter(pk__in=stale).delete()
+    added = [link_model(**{f'{field}_id': instance.pk, 'tag_id': tag_id}) for tag_id in wanted if tag_id not in existing]
+    if added:
+        link_model.objects.bulk_create(added, ignore_conflicts=True)
+
+
+def reindex_tags(model, pks=None, batch_size=1000):
+    """
+    Rebuild the tag links of a model (only the given rows when pks is set).
+    Returns the number of links written.
+    """
+    link_model, field = TAG_LINKS[model]
+    rows = model.objects.order_by('pk')
+    if pks is not None:
+        rows = rows.filter(pk__in=list(pks))
+
+    written = 0
+    batch = []
+    for row in rows.values_list('pk', 'tags').iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            written += _write_links(link_model, field, batch)
+            batch = []
+    if batch:
+        written += _write_links(link_model, field, batch)
+    return written
+
+
+@transaction.atomic
+def _write_links(link_model, field, rows):
+    names = {}
+    row_names = []
+    for pk, tags in rows:
+        normalized = normalize_tags(tags)
+        row_names.append((pk, normalized))
+        for name, label in normalized.items():
+            names.setdefault(name, label)
+    tag_ids = get_tag_ids(names)
+
+    link_model.objects.filter(**{f'{field}_id__in': [pk for pk, _ in rows]}).delete()
+    links = [
+        link_model(**{f'{field}_id': pk, 'tag_id': tag_ids[name]})
+        for pk, normalized in row_names
+        for name in normalized
+    ]
+    link_model.objects.bulk_create(links, batch_size=1000)
+    return len(links)
+
+
+def _use_gin(queryset):
+    return (
+        getattr(settings, 'TAG_INDEX_USE_GIN', False)
+        and connections[queryset.db].vendor == 'postgresql'
+    )
+
+
+def filter_by_tags(queryset, tags, match='any'):
+    """
+    Restrict a queryset of a tagged model to rows carrying any (or, with
+    match='all', every) of the given tags. Tags compare by their normalized
+    spelling, never by substring.
+    """
+    names = list(normalize_tags(tags))
+    if not names:
+        return queryset
+
+    if _use_gin(queryset):
+        table = queryset.model._meta.db_table
+        clause = f'normalized_tags("{table}"."tags") @> %s::jsonb'
+        if match == 'all':
+            return queryset.extra(where=[clause], params=[json.dumps(names)])
+        return queryset.extra(
+            where=['(' + ' OR '.join([clause] * len(names)) + ')'],
+            params=[json.dumps([name]) for name in names],
+        )
+
+    link_model, field = TAG_LINKS[queryset.model]
+    links = link_model.objects.filter(tag__name__in=names)
+    if match == 'all':
+        links = links.values(field).annotate(matched=Count('tag', distinct=True)).filter(matched=len(names))
+    return queryset.filter(pk__in=links.values(field))
+
+
+def tagged_question_ids(tags, bank_ids=None):
+    """Ids of questions carrying any of the given tags, optionally within some banks"""
+    names = list(normalize_tags(tags))
+    if not names:
+        return set()
+    links = QuestionTag.objects.filter(tag__name__in=names)
+    if bank_ids is not None:
+        links = links.filter(question__question_bank_id__in=list(bank_ids))
+    return set(links.values_list('question_id', flat=True))
@@ -8,9 +8,12 @@ urlpatterns = [
     path('admin/content-status/<uuid:upload_id>/', views.api_content_status, name='api_content_status'),
     path('admin/content-delete/<uuid:upload_id>/', views.api_content_delete, name='api_content_delete'),
     path('admin/content-process/<uuid:upload_id>/', views.api_content_process, name='api_content_process'),
+    path('admin/import-jobs/<uuid:job_id>/', views.api_import_job_status, name='api_import_job_status'),
     path('admin/all-content/', views.api_all_content, name='api_all_content'),
     path('admin/existing-banks/', views.api_existing_banks, name='api_existing_banks'),
     path('admin/dashboard-stats/', views.api_dashboard_stats, name='api_dashboard_stats'),
+    path('admin/content-search/', views.api_content_search, name='api_content_search'),
+    path('similar/', views.api_similar_questions, name='api_similar_questions'),
     # Content deletion endpoints
     path('admin/delete-question-bank/<uuid:bank_id>/', views.api_delete_question_bank, name='api_delete_question_bank'),
     path('admin/delete-exam/<uuid:exam_id>/', views.api_delete_exam, name='api_delete_exam'),
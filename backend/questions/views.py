@@ -5,14 +5,25 @@ from django.views.decorators.csrf import csrf_exempt
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
 from django.views import View
+from django.conf import settings
 from django.db import transaction
+from django.core.paginator import Paginator
+from django.db.models import Count
 from django.views.decorators.http import require_http_methods
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from .models import ContentUpload, QuestionBank, Question
+from .models import ContentUpload, ImportJob, QuestionBank, Question
+from .question_counts import get_bank_counts
+from .content_import import DOCUMENT_ERRORS, QuestionImporter, iter_questions, scan_question_bank
+from .import_jobs import (
+    ACTIVE_STATUSES, claim_job, enqueue_import, job_stats, record_progress, records_per_second, run_job,
+    save_checkpoint, worker_name,
+)
+from .similarity import DEFAULT_THRESHOLD, DUPLICATE_THRESHOLD, similar_questions, similar_questions_bulk
 from exams.models import Exam, Test
+from core.search import search_queryset
 from .forms import JSONContentUploadForm, ContentProcessingForm
 import json
 import uuid
@@ -210,7 +221,7 @@ class ContentProcessingView(View):
         elif upload.content_type == 'mixed':
             self._process_mixed_content(data, batch_name, processing_log, options)
         
-        upload.processing_log = processing_log
+        upload.processing_log.extend(processing_log)
         upload.save()
     
     def _process_question_bank(self, data, batch_name, log, options):
@@ -302,7 +313,7 @@ def content_upload_status(request, upload_id):
         'items_count': upload.items_count,
         'error_message': upload.error_message,
         'validation_results': upload.validation_results,
-        'processing_log': upload.processing_log,
+        'processing_log': list(upload.processing_log),
     })
 
 
@@ -311,6 +322,8 @@ def content_upload_delete(request, upload_id):
     """Delete content upload"""
     if request.method == 'POST':
         upload = get_object_or_404(ContentUpload, id=upload_id)
+        if upload.source_file:
+            upload.source_file.delete(save=False)
         upload.delete()
         messages.success(request, 'Content upload deleted successfully')
     
@@ -359,18 +372,45 @@ def api_content_upload(request):
                     'message': 'Selected question bank not found'
                 }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Read and validate JSON
+        # Hash the file in chunks; it is kept as uploaded and parsed from disk
+        hasher = hashlib.sha256()
+        for chunk in json_file.chunks():
+            hasher.update(chunk)
+        file_hash = hasher.hexdigest()
+        
+        # Question banks are validated in one streaming pass that keeps only
+        # the top-level fields; other content is small enough to load whole
+        check_duplicates = target_bank is not None and import_mode in ['append_existing', 'merge_update']
+        duplicates = []
+        partial_duplicates = []
+        
+        def find_duplicates(chunk):
+            found, partial = match_duplicates([(number - 1, record) for number, record in chunk], target_bank)
+            duplicates.extend(found)
+            partial_duplicates.append(partial)
+        
         try:
-            file_content = json_file.read()
-            json_data = json.loads(file_content.decode('utf-8'))
-        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            json_file.seek(0)
+            if content_type == 'question_bank':
+                json_data, items_count, item_errors, invalid_items = scan_question_bank(
+                    json_file, on_chunk=find_duplicates if check_duplicates else None
+                )
+            else:
+                json_data = json.load(json_file)
+        except DOCUMENT_ERRORS as e:
             return Response({
                 'success': False,
                 'message': f'Invalid JSON file: {str(e)}'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        if not isinstance(json_data, dict):
+            return Response({
+                'success': False,
+                'message': 'Invalid JSON file: expected an object'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
         # Extract file name from JSON data if not provided or use JSON name as priority
-        extracted_file_name = json_data.get('name', '').strip()
+        extracted_file_name = str(json_data.get('name', '')).strip()
         if extracted_file_name:
             file_name = extracted_file_name
         elif not file_name:
@@ -379,18 +419,16 @@ def api_content_upload(request):
                 'message': 'File name not found in JSON data and not provided manually'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Calculate file hash
-        file_hash = hashlib.sha256(file_content).hexdigest()
-        
         # Create ContentUpload record
         upload = ContentUpload.objects.create(
             file_name=file_name,
             content_type=content_type,
-            file_size=len(file_content),
+            file_size=json_file.size,
             file_hash=file_hash,
             uploaded_by=request.user,
             status='validating',
-            json_data=json_data  # Store the JSON data
+            json_data=json_data,  # Top-level fields only for question banks
+            source_file=json_file
         )
         
         # Store import mode and target info in validation_results for later use
@@ -401,12 +439,30 @@ def api_content_upload(request):
             upload.validation_results['target_bank_name'] = target_bank.name
         
         # Basic validation
-        validation_results = validate_json_structure(json_data, content_type)
+        if content_type == 'question_bank':
+            if items_count is None:
+                validation_results = {
+                    'valid': False,
+                    'error': 'Question bank must contain a questions array',
+                    'items_count': 0
+                }
+            else:
+                validation_results = {
+                    'valid': True,
+                    'items_count': items_count,
+                    'invalid_items': invalid_items,
+                    'item_errors': [f'Question {number}: {error}' for number, error in item_errors],
+                    'summary': (
+                        f'Content validated successfully. {items_count} items found'
+                        + (f', {invalid_items} of them invalid and will be skipped.' if invalid_items else '.')
+                    )
+                }
+        else:
+            validation_results = validate_json_structure(json_data, content_type)
         
-        # For merge modes, detect duplicates if validation passed
-        if validation_results['valid'] and import_mode in ['append_existing', 'merge_update'] and target_bank:
-            duplicate_info = detect_duplicates(json_data, target_bank, import_mode)
-            validation_results['duplicates'] = duplicate_info
+        # For merge modes, report the duplicates found while validating
+        if validation_results['valid'] and check_duplicates:
+            validation_results['duplicates'] = duplicates_summary(duplicates, items_count, any(partial_duplicates))
             validation_results['import_mode'] = import_mode
             validation_results['target_bank_name'] = target_bank.name
         
@@ -477,6 +533,7 @@ def api_content_status(request, upload_id):
     """API endpoint to get upload status"""
     try:
         upload = get_object_or_404(ContentUpload, id=upload_id)
+        import_job = upload.import_jobs.order_by('-created_at').first()
         
         return Response({
             'success': True,
@@ -495,7 +552,8 @@ def api_content_status(request, upload_id):
                 'processingStartedAt': upload.processing_started_at.isoformat() if upload.processing_started_at else None,
                 'processingCompletedAt': upload.processing_completed_at.isoformat() if upload.processing_completed_at else None,
                 'isProcessed': upload.is_processed,
-                'processingLog': upload.processing_log
+                'processingLog': list(upload.processing_log),
+                'importJobId': str(import_job.id) if import_job else None
             }
         })
         
@@ -512,6 +570,8 @@ def api_content_delete(request, upload_id):
     """API endpoint to delete uploaded content"""
     try:
         upload = get_object_or_404(ContentUpload, id=upload_id)
+        if upload.source_file:
+            upload.source_file.delete(save=False)
         upload.delete()
         
         return Response({
@@ -533,6 +593,16 @@ def api_content_process(request, upload_id):
     try:
         upload = get_object_or_404(ContentUpload, id=upload_id)
         
+        active_job = upload.import_jobs.filter(status__in=ACTIVE_STATUSES).first()
+        if active_job is not None:
+            return Response({
+                'success': True,
+                'queued': True,
+                'job_id': str(active_job.id),
+                'message': 'Content is already being processed',
+                'created_count': 0,
+            }, status=status.HTTP_202_ACCEPTED)
+        
         if upload.status != 'completed':
             return Response({
                 'success': False,
@@ -545,16 +615,15 @@ def api_content_process(request, upload_id):
                 'message': 'Content has already been processed'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Load the JSON data that was stored during upload
+        # Load the JSON data that was stored during upload; question bank
+        # questions are read from the uploaded file while processing
         data = upload.json_data
-        if not data:
+        if not data and not upload.source_file:
             return Response({
                 'success': False,
                 'message': 'No JSON data found for this upload'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Process the content
-        processor = ContentProcessor()
         batch_name = f"{upload.file_name}_{upload.uploaded_at.strftime('%Y%m%d_%H%M%S')}"
         
         # Default processing options
@@ -565,41 +634,60 @@ def api_content_process(request, upload_id):
             'overwrite_existing': False
         }
         
-        try:
-            processor.process_content(upload, data, batch_name, options)
-            
-            # Mark as processed
-            upload.is_processed = True
-            upload.save()
-            
-            # Count created items
-            created_questions = Question.objects.filter(json_import_batch=batch_name).count()
-            created_banks = QuestionBank.objects.filter(json_import_batch=batch_name).count()
-            total_created = created_questions + created_banks
-            
-            # Check if nothing was created and provide helpful message
-            if total_created == 0 and upload.processing_log:
-                last_log = upload.processing_log[-1] if upload.processing_log else ""
-                if "already exists, skipping" in last_log:
-                    message = f"Content not processed: {last_log}. Try using 'Append to Existing' or 'Replace Existing' mode, or rename the content in your JSON file."
-                else:
-                    message = f"No items were created. {last_log}"
-            else:
-                message = 'Content processed successfully'
-            
+        # Processing runs as an import job; a retry after a failure resumes from its checkpoint
+        job = enqueue_import(upload, options, batch_name, request.user)
+        
+        # With IMPORT_BACKGROUND_JOBS, large question banks are left to the import workers
+        queue_large = getattr(settings, 'IMPORT_BACKGROUND_JOBS', False)
+        inline_limit = getattr(settings, 'IMPORT_INLINE_MAX_RECORDS', 2000)
+        claimed = None
+        if not queue_large or (job.records_total or 0) <= inline_limit:
+            claimed = claim_job(worker_name('inline'), job_id=job.id)
+        if claimed is None:
             return Response({
                 'success': True,
-                'message': message,
-                'created_count': total_created,
-                'questions_created': created_questions,
-                'question_banks_created': created_banks,
-                'processing_log': upload.processing_log
-            })
-            
-        except Exception as process_error:
-            upload.processing_log.append(f"Processing failed: {str(process_error)}")
-            upload.save()
-            raise process_error
+                'queued': True,
+                'job_id': str(job.id),
+                'message': f'Import queued ({job.records_total or 0} records); follow its progress at the import job status endpoint',
+                'created_count': 0,
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        job = run_job(claimed)
+        upload.refresh_from_db()
+        if job.status == 'failed':
+            return Response({
+                'success': False,
+                'job_id': str(job.id),
+                'message': f'Failed to process content: {job.error}',
+                'processing_log': list(upload.processing_log)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        # Count created items
+        created_questions = Question.objects.filter(json_import_batch=batch_name).count()
+        created_banks = QuestionBank.objects.filter(json_import_batch=batch_name).count()
+        total_created = created_questions + created_banks
+        
+        # Check if nothing was created and provide helpful message
+        last_log = upload.processing_log.entries(last=1)
+        if total_created == 0 and last_log:
+            last_log = str(last_log[0])
+            if "already exists, skipping" in last_log:
+                message = f"Content not processed: {last_log}. Try using 'Append to Existing' or 'Replace Existing' mode, or rename the content in your JSON file."
+            else:
+                message = f"No items were created. {last_log}"
+        else:
+            message = 'Content processed successfully'
+        
+        return Response({
+            'success': True,
+            'message': message,
+            'job_id': str(job.id),
+            'created_count': total_created,
+            'questions_created': created_questions,
+            'question_banks_created': created_banks,
+            'import_stats': upload.content_summary.get('imports', []),
+            'processing_log': list(upload.processing_log)
+        })
         
     except Exception as e:
         return Response({
@@ -608,6 +696,54 @@ def api_content_process(request, upload_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def api_import_job_status(request, job_id):
+    """API endpoint to get the progress of an import job"""
+    try:
+        job = get_object_or_404(ImportJob.objects.select_related('upload'), id=job_id)
+        
+        rate = records_per_second(job)
+        percent = None
+        eta_seconds = None
+        if job.records_total:
+            percent = round(min(100.0, job.records_processed * 100.0 / job.records_total), 1)
+            if job.status == 'running' and rate:
+                eta_seconds = round(max(0, job.records_total - job.records_processed) / rate)
+        
+        return Response({
+            'success': True,
+            'data': {
+                'id': str(job.id),
+                'uploadId': str(job.upload_id),
+                'fileName': job.upload.file_name,
+                'status': job.status,
+                'attempts': job.attempts,
+                'worker': job.worker,
+                'recordsTotal': job.records_total,
+                'recordsProcessed': job.records_processed,
+                'recordsCreated': job.records_created,
+                'recordsFailed': job.records_failed,
+                'recordsSkipped': job.records_skipped,
+                'percent': percent,
+                'recordsPerSecond': rate,
+                'etaSeconds': eta_seconds,
+                'createdAt': job.created_at.isoformat(),
+                'startedAt': job.started_at.isoformat() if job.started_at else None,
+                'heartbeatAt': job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+                'finishedAt': job.finished_at.isoformat() if job.finished_at else None,
+                'error': job.error,
+                'recentLog': job.upload.processing_log.entries(last=20)
+            }
+        })
+        
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': f'Failed to get import job status: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def api_all_content(request):
@@ -615,8 +751,11 @@ def api_all_content(request):
     try:
         from exams.models import Exam, Test
         
+        # Question totals come from the denormalized counters in one query
+        counts = get_bank_counts()
+        
         # Get question banks
-        question_banks = QuestionBank.objects.all().order_by('-updated_at')
+        question_banks = QuestionBank.objects.select_related('created_by').order_by('-updated_at')
         banks_data = []
         for bank in question_banks:
             banks_data.append({
@@ -627,7 +766,7 @@ def api_all_content(request):
                 'subject': bank.subject,
                 'topic': bank.topic,
                 'difficulty': bank.difficulty_level,
-                'questionCount': bank.questions.count(),
+                'questionCount': counts[bank.id].total,
                 'createdBy': bank.created_by.username,
                 'createdAt': bank.created_at.isoformat(),
                 'updatedAt': bank.updated_at.isoformat(),
@@ -641,12 +780,12 @@ def api_all_content(request):
             })
         
         # Get exams
-        exams = Exam.objects.all().order_by('-updated_at')
+        exams = Exam.objects.select_related('created_by').annotate(
+            tests_count=Count('tests')
+        ).order_by('-updated_at')
         exams_data = []
         for exam in exams:
-            # Count tests for this exam
-            tests_count = Test.objects.filter(exam=exam).count()
-            
+
             exams_data.append({
                 'id': str(exam.id),
                 'name': exam.name,
@@ -658,7 +797,7 @@ def api_all_content(request):
                 'duration': 0,  # Exams don't have duration, tests do
                 'totalMarks': 0,  # Will be calculated from tests
                 'passingMarks': 0,  # Will be calculated from tests
-                'testsCount': tests_count,
+                'testsCount': exam.tests_count,
                 'status': exam.status,  # Add status field
                 'createdBy': exam.created_by.username if hasattr(exam.created_by, 'username') else str(exam.created_by),
                 'createdAt': exam.created_at.isoformat(),
@@ -670,7 +809,9 @@ def api_all_content(request):
             })
         
         # Get tests
-        tests = Test.objects.all().order_by('-updated_at')
+        tests = Test.objects.select_related('exam', 'created_by').prefetch_related(
+            'test_question_banks'
+        ).order_by('-updated_at')
         tests_data = []
         for test in tests:
             # Calculate passing marks from percentage
@@ -688,7 +829,12 @@ def api_all_content(request):
                 'totalMarks': test.total_marks,
                 'passingMarks': passing_marks,
                 'questionsCount': sum(
-                    min(test_question_bank.question_count, test_question_bank.question_bank.questions.count())
+                    min(
+                        test_question_bank.question_count,
+                        counts[test_question_bank.question_bank_id].available(
+                            test_question_bank.difficulty_filter, test_question_bank.topic_filter
+                        )
+                    )
                     for test_question_bank in test.test_question_banks.all()
                 ),
                 'status': test.status,  # Add status field
@@ -728,7 +874,8 @@ def api_all_content(request):
 def api_existing_banks(request):
     """API endpoint to get list of existing question banks for merging"""
     try:
-        banks = QuestionBank.objects.all().order_by('-updated_at')
+        banks = QuestionBank.objects.select_related('created_by').order_by('-updated_at')
+        counts = get_bank_counts()
         
         data = []
         for bank in banks:
@@ -737,7 +884,7 @@ def api_existing_banks(request):
                 'name': bank.name,
                 'description': bank.description,
                 'category': bank.category,
-                'questionCount': bank.questions.count(),
+                'questionCount': counts[bank.id].total,
                 'difficulty': bank.difficulty_level,
                 'createdBy': bank.created_by.username,
                 'createdAt': bank.created_at.isoformat(),
@@ -810,18 +957,179 @@ def api_dashboard_stats(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# Searchable content type -> (model, title column)
+SEARCHABLE_CONTENT = {
+    'exam': (Exam, 'name'),
+    'question_bank': (QuestionBank, 'name'),
+    'question': (Question, 'question_text'),
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def api_content_search(request):
+    """API endpoint for ranked full-text search over exams, question banks or questions"""
+    content_type = request.GET.get('type', 'question')
+    if content_type not in SEARCHABLE_CONTENT:
+        return Response({
+            'success': False,
+            'message': f'Unknown content type: {content_type}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        model, title = SEARCHABLE_CONTENT[content_type]
+        query = request.GET.get('q', '').strip()
+        try:
+            page_size = min(max(int(request.GET.get('page_size', 20)), 1), 100)
+        except ValueError:
+            page_size = 20
+        
+        hits = search_queryset(model.objects.all(), query).order_by('-search_rank', '-created_at')
+        page = Paginator(hits.values('id', title, 'search_rank'), page_size).get_page(request.GET.get('page'))
+        
+        return Response({
+            'success': True,
+            'data': {
+                'count': page.paginator.count,
+                'page': page.number,
+                'numPages': page.paginator.num_pages,
+                'results': [
+                    {'id': str(hit['id']), 'title': hit[title][:200], 'rank': hit['search_rank']}
+                    for hit in page
+                ]
+            }
+        })
+        
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': f'Search failed: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _similarity_options(params):
+    """(bank ids or None, limit, threshold) from request parameters"""
+    bank_ids = params.get('bank_ids') or params.get('bank') or None
+    if isinstance(bank_ids, str):
+        bank_ids = [bank_id.strip() for bank_id in bank_ids.split(',') if bank_id.strip()]
+    if bank_ids is not None:
+        bank_ids = [str(uuid.UUID(str(bank_id))) for bank_id in bank_ids]
+    limit = min(max(int(params.get('limit', 10)), 1), 50)
+    threshold = min(max(float(params.get('threshold', DEFAULT_THRESHOLD)), 0.0), 1.0)
+    return bank_ids, limit, threshold
+
+
+def _similarity_matches(found):
+    questions = {
+        question.id: question
+        for question in Question.objects.filter(id__in=[question_id for _, question_id in found]).only(
+            'id', 'question_text', 'question_type', 'difficulty', 'question_bank_id'
+        )
+    }
+    return [
+        {
+            'id': str(question_id),
+            'text': questions[question_id].question_text[:200],
+            'bankId': str(questions[question_id].question_bank_id),
+            'type': questions[question_id].question_type,
+            'difficulty': questions[question_id].difficulty,
+            'similarity': round(similarity, 4),
+        }
+        for similarity, question_id in found
+        if question_id in questions
+    ]
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def api_similar_questions(request):
+    """
+    API endpoint for questions similar to a text (trigram similarity).
+    GET takes text (or question, an existing question's id) plus optional
+    bank, limit and threshold; POST takes texts, a list, for bulk checks.
+    """
+    params = request.data if request.method == 'POST' else request.query_params
+    try:
+        bank_ids, limit, threshold = _similarity_options(params)
+    except (TypeError, ValueError) as e:
+        return Response({
+            'success': False,
+            'message': f'Invalid parameters: {str(e)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    question = None
+    if request.method == 'GET' and params.get('question'):
+        try:
+            question_id = uuid.UUID(str(params.get('question')))
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'Invalid question id'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        question = get_object_or_404(Question, id=question_id)
+    
+    try:
+        if request.method == 'POST':
+            texts = params.get('texts')
+            if not isinstance(texts, list) or not texts:
+                return Response({
+                    'success': False,
+                    'message': 'texts must be a non-empty list'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            matches = similar_questions_bulk([str(text) for text in texts], bank_ids, limit, threshold)
+            return Response({
+                'success': True,
+                'data': {
+                    'results': [
+                        {'index': i, 'matches': _similarity_matches(found), 'partial': partial}
+                        for i, (found, partial) in enumerate(matches)
+                    ]
+                }
+            })
+        
+        text = params.get('text', '')
+        exclude = []
+        if question is not None:
+            text = question.question_text
+            exclude = [question.id]
+        if not text.strip():
+            return Response({
+                'success': False,
+                'message': 'text or question is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        found, partial = similar_questions(text, bank_ids, limit, threshold, exclude=exclude)
+        return Response({
+            'success': True,
+            'data': {
+                'results': _similarity_matches(found),
+                'partial': partial
+            }
+        })
+        
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': f'Similarity search failed: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class ContentProcessor:
     """Class to handle processing of JSON content into database objects"""
     
-    def process_content(self, upload, data, batch_name, options):
-        """Main method to process JSON content based on content type"""
-        upload.processing_log = []
+    def process_content(self, upload, data, batch_name, options, job=None):
+        """
+        Main method to process JSON content based on content type. Given the
+        ImportJob running it, a question bank import checkpoints every chunk
+        and resumes from the job's last checkpoint.
+        """
         upload.processing_started_at = timezone.now()
         upload.save()
         
         try:
             if upload.content_type == 'question_bank':
-                self._process_question_bank(upload, data, batch_name, options)
+                self._process_question_bank(upload, data, batch_name, options, job=job)
             elif upload.content_type == 'exam':
                 self._process_exam(upload, data, batch_name, options)
             elif upload.content_type == 'test':
@@ -837,7 +1145,7 @@ class ContentProcessor:
             upload.save()
             raise e
     
-    def _process_question_bank(self, upload, data, batch_name, options):
+    def _process_question_bank(self, upload, data, batch_name, options, job=None):
         """Process question bank JSON data with support for different import modes"""
         if not options.get('create_question_banks', True):
             upload.processing_log.append("Skipped question bank creation (disabled in options)")
@@ -845,106 +1153,66 @@ class ContentProcessor:
         
         # Get import mode from validation results
         import_mode = upload.validation_results.get('import_mode', 'create_new')
-        target_bank_id = upload.validation_results.get('target_bank_id')
         
-        if import_mode == 'create_new':
-            # Original logic for creating new question bank
-            existing = None
-            if not options.get('overwrite_existing', False):
-                existing = QuestionBank.objects.filter(name=data.get('name', '')).first()
-            
-            if existing and not options.get('overwrite_existing', False):
-                upload.processing_log.append(f"Question bank '{data.get('name', '')}' already exists, skipping")
-                upload.items_imported = 0
-                upload.items_failed = 0
-                upload.save()
-                return
-            
-            question_bank = self._create_new_question_bank(upload, data, batch_name)
-            
-        elif import_mode in ['append_existing', 'merge_update', 'replace_existing']:
-            # Use existing question bank
-            try:
-                question_bank = QuestionBank.objects.get(id=target_bank_id)
-                upload.processing_log.append(f"Using existing question bank: {question_bank.name}")
-                
-                if import_mode == 'replace_existing':
-                    # Delete existing questions first
-                    deleted_count = question_bank.questions.count()
-                    question_bank.questions.all().delete()
-                    upload.processing_log.append(f"Deleted {deleted_count} existing questions")
-                    
-            except QuestionBank.DoesNotExist:
-                upload.processing_log.append(f"Target question bank not found, creating new one")
-                question_bank = self._create_new_question_bank(upload, data, batch_name)
+        checkpoint = job.checkpoint if job is not None else {}
+        if checkpoint.get('question_bank_id'):
+            # An earlier attempt already set up the bank and committed some chunks
+            question_bank = QuestionBank.objects.filter(id=checkpoint['question_bank_id']).first()
+            if question_bank is None:
+                raise ValueError("Question bank of the interrupted import no longer exists")
+            upload.processing_log.append(
+                f"Resuming import into {question_bank.name} after record {checkpoint.get('position', 0)}"
+            )
         else:
-            upload.processing_log.append(f"Unknown import mode: {import_mode}")
-            return
-        
-        # Process questions with duplicate handling for merge modes
-        questions_created = 0
-        questions_skipped = 0
-        
-        if 'questions' in data and isinstance(data['questions'], list):
+            # Bank setup (including replace_existing's delete) commits with the first checkpoint
+            with transaction.atomic():
+                question_bank = self._resolve_question_bank(upload, data, batch_name, options, import_mode)
+                if question_bank is None:
+                    return
+                if job is not None:
+                    save_checkpoint(job, question_bank_id=str(question_bank.id), position=0)
+        
+        # Process questions in chunks, skipping duplicates in merge_update mode
+        # (user can manually handle conflicts)
+        skip = set()
+        if import_mode == 'merge_update':
             duplicates_info = upload.validation_results.get('duplicates', {})
-            duplicate_indices = [dup['new_question_index'] for dup in duplicates_info.get('details', [])]
-            
-            for i, q_data in enumerate(data['questions']):
-                try:
-                    # Handle duplicates based on import mode
-                    if import_mode == 'merge_update' and i in duplicate_indices:
-                        # For merge_update mode, skip duplicates (user can manually handle conflicts)
-                        upload.processing_log.append(f"Skipped potential duplicate question {i+1}")
-                        questions_skipped += 1
-                        continue
-                    
-                    question = Question.objects.create(
-                        question_bank=question_bank,
-                        question_text=q_data.get('text', q_data.get('question_text', '')),
-                        question_type=q_data.get('question_type', 'mcq'),
-                        difficulty=q_data.get('difficulty', 'intermediate'),
-                        marks=q_data.get('marks', 1),
-                        negative_marks=q_data.get('negative_marks', 0),
-                        explanation=q_data.get('explanation', ''),
-                        topic=q_data.get('topic', ''),
-                        subtopic=q_data.get('subtopic', ''),
-                        tags=q_data.get('tags', []),
-                        imported_from_json=True,
-                        json_import_batch=batch_name,
-                        created_by=upload.uploaded_by
-                    )
-                    
-                    # Create options for MCQ questions
-                    if q_data.get('options'):
-                        from .models import QuestionOption
-                        for j, option in enumerate(q_data['options']):
-                            is_correct = False
-                            if isinstance(q_data.get('correct_answer'), list):
-                                is_correct = j in q_data['correct_answer']
-                            else:
-                                is_correct = (j == q_data.get('correct_answer'))
-                            
-                            QuestionOption.objects.create(
-                                question=question,
-                                option_text=option,
-                                is_correct=is_correct,
-                                order=j
-                            )
-                    
-                    questions_created += 1
-                    
-                except Exception as e:
-                    upload.processing_log.append(f"Failed to create question {i+1}: {str(e)}")
+            skip = {dup['new_question_index'] + 1 for dup in duplicates_info.get('details', [])}
+        
+        importer = QuestionImporter(
+            question_bank, batch_name, upload.uploaded_by, log=upload.processing_log,
+            resume_from=job.checkpoint.get('position', 0) if job is not None else 0,
+            stats=job_stats(job) if job is not None else None,
+            on_chunk=(lambda position, stats: record_progress(job, position, stats)) if job is not None else None,
+        )
+        if isinstance(data.get('questions'), list):
+            stats = importer.run(data['questions'], skip=skip)
+        elif upload.content_type == 'question_bank' and upload.source_file:
+            # Question bank uploads store only the top-level fields; stream the questions from the file
+            with upload.source_file.open('rb') as stream:
+                stats = importer.run(iter_questions(stream), skip=skip)
+        else:
+            stats = importer.run([])
         
-        # Update question bank total count
-        question_bank.total_questions = question_bank.questions.count()
+        # The importer rebuilt the bank's counters and set its total
         question_bank.save()
         
-        upload.processing_log.append(f"Created {questions_created} questions in {question_bank.name}")
-        if questions_skipped > 0:
-            upload.processing_log.append(f"Skipped {questions_skipped} potential duplicate questions")
+        upload.processing_log.append(f"Created {stats.created} questions in {question_bank.name}")
+        if stats.skipped > 0:
+            upload.processing_log.append(f"Skipped {stats.skipped} potential duplicate questions")
+        if stats.failed > 0:
+            upload.processing_log.append(f"Failed to create {stats.failed} questions")
+        upload.processing_log.append(
+            f"Processed {stats.records} questions in {stats.seconds:.2f}s ({stats.records_per_second} records/s)"
+        )
+        upload.content_summary = upload.content_summary or {}
+        upload.content_summary.setdefault('imports', []).append({
+            'question_bank': str(question_bank.id),
+            **stats.as_dict()
+        })
         
-        upload.items_imported += questions_created
+        upload.items_imported += stats.created
+        upload.items_failed += stats.failed
         if import_mode == 'create_new':
             upload.items_imported += 1  # +1 for the question bank itself
     
@@ -1135,6 +1403,45 @@ class ContentProcessor:
                 elif item_type == 'test':
                     self._process_test(upload, item, batch_name, options)
     
+    def _resolve_question_bank(self, upload, data, batch_name, options, import_mode):
+        """Question bank an import writes to, or None when there is nothing to import"""
+        target_bank_id = upload.validation_results.get('target_bank_id')
+        
+        if import_mode == 'create_new':
+            # Original logic for creating new question bank
+            existing = None
+            if not options.get('overwrite_existing', False):
+                existing = QuestionBank.objects.filter(name=data.get('name', '')).first()
+            
+            if existing and not options.get('overwrite_existing', False):
+                upload.processing_log.append(f"Question bank '{data.get('name', '')}' already exists, skipping")
+                upload.items_imported = 0
+                upload.items_failed = 0
+                upload.save()
+                return None
+            
+            return self._create_new_question_bank(upload, data, batch_name)
+        
+        if import_mode in ['append_existing', 'merge_update', 'replace_existing']:
+            # Use existing question bank
+            try:
+                question_bank = QuestionBank.objects.get(id=target_bank_id)
+                upload.processing_log.append(f"Using existing question bank: {question_bank.name}")
+                
+                if import_mode == 'replace_existing':
+                    # Delete existing questions first
+                    deleted_count = question_bank.questions.count()
+                    question_bank.questions.all().delete()
+                    upload.processing_log.append(f"Deleted {deleted_count} existing questions")
+                return question_bank
+                
+            except QuestionBank.DoesNotExist:
+                upload.processing_log.append(f"Target question bank not found, creating new one")
+                return self._create_new_question_bank(upload, data, batch_name)
+        
+        upload.processing_log.append(f"Unknown import mode: {import_mode}")
+        return None
+    
     def _create_new_question_bank(self, upload, data, batch_name):
         """Helper method to create a new question bank"""
         question_bank = QuestionBank.objects.create(
@@ -1228,62 +1535,60 @@ class ContentProcessor:
             return None
 
 
-def detect_duplicates(json_data, target_bank, import_mode):
-    """Detect potential duplicate questions when merging with existing content"""
-    try:
-        from difflib import SequenceMatcher
-        
-        duplicates = []
-        new_questions = []
-        
-        if 'questions' in json_data:
-            new_questions = json_data['questions']
-        
-        # Get existing questions from target bank
-        existing_questions = target_bank.questions.all()
-        
-        for i, new_q in enumerate(new_questions):
-            new_text = new_q.get('text', '').strip().lower()
-            potential_duplicates = []
-            
-            for existing_q in existing_questions:
-                existing_text = existing_q.question_text.strip().lower()
-                
-                # Calculate similarity ratio
-                similarity = SequenceMatcher(None, new_text, existing_text).ratio()
-                
-                if similarity > 0.8:  # 80% similarity threshold
-                    potential_duplicates.append({
-                        'existing_id': str(existing_q.id),
-                        'existing_text': existing_q.question_text[:100] + '...',
-                        'similarity': round(similarity * 100, 1),
-                        'existing_type': existing_q.question_type,
-                        'existing_difficulty': existing_q.difficulty
-                    })
-            
-            if potential_duplicates:
-                duplicates.append({
-                    'new_question_index': i,
-                    'new_text': new_q.get('text', '')[:100] + '...',
-                    'new_type': new_q.get('question_type', 'mcq'),
-                    'potential_matches': potential_duplicates
-                })
+def match_duplicates(indexed_questions, target_bank):
+    """
+    Find existing questions of a bank that may duplicate new questions, given
+    as (index, question record) pairs. Returns (details, partial).
+    """
+    # One trigram search per new question against the target bank's index
+    texts = [str(new_q.get('text', '')).strip() for _, new_q in indexed_questions]
+    matches = similar_questions_bulk(texts, [target_bank.id], threshold=DUPLICATE_THRESHOLD)
+    partial = any(is_partial for _, is_partial in matches)
+    
+    matched_ids = {question_id for found, _ in matches for _, question_id in found}
+    existing = {
+        question.id: question
+        for question in Question.objects.filter(id__in=matched_ids).only(
+            'id', 'question_text', 'question_type', 'difficulty'
+        )
+    }
+    
+    duplicates = []
+    for (i, new_q), (found, _) in zip(indexed_questions, matches):
+        potential_duplicates = []
         
-        return {
-            'found': len(duplicates),
-            'total_new_questions': len(new_questions),
-            'details': duplicates,
-            'summary': f"Found {len(duplicates)} potential duplicates out of {len(new_questions)} new questions"
-        }
+        for similarity, question_id in found:
+            existing_q = existing.get(question_id)
+            if existing_q is None:
+                continue
+            potential_duplicates.append({
+                'existing_id': str(existing_q.id),
+                'existing_text': existing_q.question_text[:100] + '...',
+                'similarity': round(similarity * 100, 1),
+                'existing_type': existing_q.question_type,
+                'existing_difficulty': existing_q.difficulty
+            })
         
-    except Exception as e:
-        return {
-            'found': 0,
-            'total_new_questions': 0,
-            'details': [],
-            'error': str(e),
-            'summary': f"Error detecting duplicates: {str(e)}"
-        }
+        if potential_duplicates:
+            duplicates.append({
+                'new_question_index': i,
+                'new_text': new_q.get('text', '')[:100] + '...',
+                'new_type': new_q.get('question_type', 'mcq'),
+                'potential_matches': potential_duplicates
+            })
+    
+    return duplicates, partial
+
+
+def duplicates_summary(duplicates, total, partial):
+    """Duplicate detection results as stored in validation_results"""
+    return {
+        'found': len(duplicates),
+        'total_new_questions': total,
+        'details': duplicates,
+        'partial': partial,
+        'summary': f"Found {len(duplicates)} potential duplicates out of {total} new questions"
+    }
 
 
 def validate_json_structure(data, content_type):